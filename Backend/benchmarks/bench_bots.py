@@ -0,0 +1,78 @@
+"""Đo bộ đoán nước của bot (bots.BotBrain): một tick phải ra nước cho n phòng bot cùng lúc.
+
+Mỗi lần đo = n lần observe (ván vừa xong) + một lần choose cho cả lô n người chơi,
+đúng như run_bots() của server làm trong một tick. So sánh NumPy (vector hóa) với
+vòng lặp Python, và với cách gọi choose từng phòng một (không gom lô).
+
+Chạy:  python benchmarks/bench_bots.py
+       python benchmarks/bench_bots.py --sizes 1000 10000 --out benchmarks/results/bots.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import bots  # noqa: E402
+from bench_hotpaths import measure  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def warm_brain(n: int, use_numpy: bool) -> bots.BotBrain:
+    """BotBrain đã có mô hình cho n người chơi, mỗi người vài ván"""
+    brain = bots.BotBrain(max_models=n, use_numpy=use_numpy, seed=1)
+    keys = list(range(n))
+    for _ in range(5):
+        moves = brain.choose(keys)
+        for key, move in zip(keys, moves):
+            brain.observe(key, random.choice(bots.MOVES), move)
+    return brain
+
+
+def tick(brain: bots.BotBrain, keys: list, batched: bool):
+    human = bots.MOVES[random.randrange(3)]
+    if batched:
+        moves = brain.choose(keys)
+    else:
+        moves = [brain.choose([key])[0] for key in keys]
+    for key, move in zip(keys, moves):
+        brain.observe(key, human, move)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Đo bộ đoán nước của bot theo lô')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='số phòng bot trong một tick')
+    parser.add_argument('--min-time', type=float, default=0.5, help='giây tối thiểu mỗi lô đo')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help='ghi kết quả ra file JSON')
+    args = parser.parse_args()
+
+    variants = [('python', False, True), ('python/từng phòng', False, False)]
+    if bots.np is not None:
+        variants[:0] = [('numpy', True, True), ('numpy/từng phòng', True, False)]
+    else:
+        print('(không có NumPy: chỉ đo vòng lặp Python)')
+
+    results = {}
+    print(f"{'phòng':>8}  {'cách chạy':<20}{'ms / tick':>12}{'µs / phòng':>14}")
+    for n in args.sizes:
+        keys = list(range(n))
+        for name, use_numpy, batched in variants:
+            brain = warm_brain(n, use_numpy)
+            r = measure(lambda: tick(brain, keys, batched), args.min_time, args.repeat)
+            results[f'{n}/{name}'] = {'ms_per_tick': r['ns_min'] / 1e6, 'us_per_room': r['ns_min'] / n / 1e3}
+            print(f"{n:>8,}  {name:<20}{r['ns_min'] / 1e6:>12.2f}{r['ns_min'] / n / 1e3:>14.2f}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
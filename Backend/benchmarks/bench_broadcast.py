@@ -0,0 +1,115 @@
+"""Benchmark broadcast sảnh chờ với nhiều client (mặc định 10k).
+
+So sánh cách cũ (dựng lại toàn bộ rooms_list, json.dumps cho từng client,
+await tuần tự) với cách mới (delta của LobbyFeed, mã hóa một lần, gửi song song).
+
+Chạy:  python benchmarks/bench_broadcast.py --clients 10000 --rooms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from server import GameServer  # noqa: E402
+from bench_hotpaths import connect  # noqa: E402
+
+
+class FakeSocket:
+    """Socket giả: đếm byte, có thể giả lập client chậm bằng delay."""
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.bytes_sent = 0
+
+    async def send(self, frame):
+        self.bytes_sent += len(frame)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+
+def build_server(n_clients: int, n_rooms: int, slow_every: int, slow_delay: float) -> GameServer:
+    gs = GameServer()
+    sockets = []
+    for i in range(n_clients):
+        sockets.append(connect(gs, FakeSocket(slow_delay if slow_every and i % slow_every == 0 else 0.0)))
+    # Mỗi phòng 2 người chơi lấy từ đầu danh sách client
+    for r in range(n_rooms):
+        room_id = gs.create_room(f'Phòng {r}', 2)
+        room = gs.get_room(room_id)
+        for ws in sockets[2 * r:2 * r + 2]:
+            room.add_player(ws, gs.clients[ws]['name'])
+        gs.lobby.publish(room_id, gs.get_lobby_summary(room))
+    return gs
+
+
+async def legacy_broadcast_rooms_update(gs: GameServer):
+    """Bản sao hành vi cũ của broadcast_rooms_update (trước lobby feed/fan-out)."""
+    rooms_list = []
+    for room in gs.rooms.values():
+        room_info = room.get_room_info()
+        for player in room_info['players']:
+            for websocket, client_info in gs.clients.items():
+                if websocket in room.players and room.seats[websocket].name == player['name']:
+                    player['player_id'] = client_info['id']
+                    player['player_name'] = player['name']
+                    break
+        room_info['is_full'] = room.is_full()
+        rooms_list.append(room_info)
+    for client in list(gs.clients.keys()):
+        try:
+            await client.send(json.dumps({'type': 'rooms_list', 'rooms': rooms_list}))
+        except:
+            pass
+
+
+async def new_broadcast(gs: GameServer, room_id: str, flip: list):
+    # Đổi trạng thái phòng để luôn có delta cần gửi
+    room = gs.get_room(room_id)
+    room.game_state = 'playing' if flip[0] else 'waiting'
+    flip[0] = not flip[0]
+    await gs.broadcast_room_change(room_id)
+
+
+async def run(args):
+    gs = build_server(args.clients, args.rooms, args.slow_every, args.slow_delay)
+    room_id = next(iter(gs.rooms))
+    results = {}
+
+    for label, fn in (('before', lambda: legacy_broadcast_rooms_update(gs)),
+                      ('after', lambda flip=[True]: new_broadcast(gs, room_id, flip))):
+        for ws in gs.clients:
+            ws.bytes_sent = 0
+        start = time.perf_counter()
+        for _ in range(args.events):
+            await fn()
+        elapsed = time.perf_counter() - start
+        sent = sum(ws.bytes_sent for ws in gs.clients)
+        results[label] = {
+            'ms_per_event': elapsed * 1000 / args.events,
+            'bytes_per_event': sent // args.events,
+        }
+
+    print(f"clients={args.clients} rooms={args.rooms} events={args.events} "
+          f"slow_every={args.slow_every} slow_delay={args.slow_delay}s")
+    for label, r in results.items():
+        print(f"  {label:<6} {r['ms_per_event']:10.2f} ms/event  {r['bytes_per_event']:>12,} bytes/event")
+    print(f"  speedup x{results['before']['ms_per_event'] / results['after']['ms_per_event']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--events', type=int, default=3)
+    parser.add_argument('--slow-every', type=int, default=0,
+                        help='cứ N client thì có 1 client chậm (0 = không có)')
+    parser.add_argument('--slow-delay', type=float, default=0.002,
+                        help='độ trễ mỗi lần gửi của client chậm (giây)')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
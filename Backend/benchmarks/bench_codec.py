@@ -0,0 +1,81 @@
+"""So sánh hai codec của giao thức WebSocket: JSON (mặc định) và nhị phân (wire.py).
+
+Với game_result, room_updated và rooms_list (sảnh 10 / 1k / 100k phòng) dựng từ
+GameServer thật, đo số byte mỗi frame, thời gian mã hóa và giải mã của từng codec.
+
+Chạy:  python benchmarks/bench_codec.py
+       python benchmarks/bench_codec.py --max-rooms 1000 --out benchmarks/results/codec.json
+"""
+import argparse
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import wire  # noqa: E402
+from bench_hotpaths import ROOM_SCALES, build_server, measure  # noqa: E402
+
+CODECS = {
+    'json': (json.dumps, json.loads),
+    'binary': (wire.encode, wire.decode),
+}
+
+
+def sample_messages(max_rooms: int):
+    """Các message như server gửi thật sau một ván (Bo3, ván 2) và snapshot sảnh chờ"""
+    gs = build_server(10)
+    room = next(iter(gs.rooms.values()))
+    a, b = room.players
+    room.choose(a, 'rock')
+    room.choose(b, 'scissors')
+    _, _, results = gs.resolve_round(room.choices())
+    gs.update_scores(room, results)
+    room.seats[a].series_wins = 1
+    yield 'game_result', {
+        'type': 'game_result',
+        'choices': {gs.clients[p]['name']: c for p, c in room.choices().items()},
+        'results': {gs.clients[p]['name']: r for p, r in results.items()},
+        'scores': {gs.clients[p]['name']: seat.score() for p, seat in room.seats.items()},
+        'series': {'best_of': room.series_best_of, 'wins': gs.series_wins_by_id(room),
+                   'over': False, 'winner_id': None},
+        **gs.room_diff(room, game_state='waiting', ready={gs.clients[p]['id']: False for p in room.players})
+    }
+    yield 'room_updated', {'type': 'room_updated', 'room': gs.get_room_info_with_player_ids(room)}
+    for n in ROOM_SCALES:
+        if n > max_rooms:
+            continue
+        big = build_server(n)
+        yield f'rooms_list/{n}', big.lobby.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='So sánh codec JSON và nhị phân')
+    parser.add_argument('--out', help='ghi kết quả ra file JSON')
+    parser.add_argument('--min-time', type=float, default=0.2, help='giây tối thiểu mỗi lô đo')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-rooms', type=int, default=max(ROOM_SCALES))
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'message':<20}{'codec':<8}{'byte':>12}{'mã hóa ns':>16}{'giải mã ns':>16}")
+    for name, message in sample_messages(args.max_rooms):
+        for codec, (encode, decode) in CODECS.items():
+            frame = encode(message)
+            assert decode(frame) == json.loads(json.dumps(message)), f'{codec} làm sai {name}'
+            size = len(frame.encode('utf-8')) if isinstance(frame, str) else len(frame)
+            enc = measure(lambda: encode(message), args.min_time, args.repeat)
+            dec = measure(lambda: decode(frame), args.min_time, args.repeat)
+            results[f'{name}/{codec}'] = {'bytes': size, 'encode_ns': enc['ns_min'], 'decode_ns': dec['ns_min']}
+            print(f"{name:<20}{codec:<8}{size:>12,}{enc['ns_min']:>16,.0f}{dec['ns_min']:>16,.0f}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""Microbenchmark các đường nóng thuần CPU của GameServer (không cần mạng).
+
+Đo: resolve_round (đếm lựa chọn và gán kết quả trong process_game_result),
+winning_choice, update_scores, get_room_info, get_room_info_with_player_ids,
+danh sách phòng cho sảnh chờ (snapshot + JSON như handle_get_rooms gửi) ở 10 / 1k / 100k phòng,
+series_wins_by_id, hàng đợi quick_match
+(10k người vào hàng đợi, ghép theo trình độ), ghi một ván vào nhật ký ván đấu và
+quét (mmap) 1 triệu bản ghi nhật ký lọc theo người chơi.
+
+Kết quả ghi ra JSON để so sánh giữa các commit:
+    python benchmarks/bench_hotpaths.py --out benchmarks/results/latest.json
+So với baseline và trả mã lỗi 1 nếu chậm hơn ngưỡng:
+    python benchmarks/bench_hotpaths.py --compare benchmarks/baseline.json --max-regression 1.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+from server import GameServer  # noqa: E402
+from matchmaking import MatchQueue  # noqa: E402
+from match_log import MatchLog, MatchLogReader, RECORD, HEADER, segment_path  # noqa: E402
+
+ROOM_SCALES = (10, 1_000, 100_000)
+QUEUED_PLAYERS = 10_000
+LOG_RECORDS = 1_000_000
+
+
+class FakeSocket:
+    """Socket giả, chỉ cần hashable; send không làm gì."""
+    async def send(self, frame):
+        pass
+
+
+def connect(gs: GameServer, ws=None):
+    """Đăng ký một kết nối giả như handle_client (mặc định FakeSocket không gửi gì)"""
+    if ws is None:
+        ws = FakeSocket()
+    pid = gs.get_next_player_id()
+    gs.clients[ws] = {'id': pid, 'room_id': None, 'name': f'Player_{pid}'}
+    return ws
+
+
+def build_server(n_rooms: int) -> GameServer:
+    """n_rooms phòng đủ 2 người, đã có trong sảnh chờ"""
+    gs = GameServer()
+    for r in range(n_rooms):
+        room_id = gs.create_room(f'Phòng {r}', 2)
+        room = gs.get_room(room_id)
+        for _ in range(2):
+            ws = connect(gs)
+            room.add_player(ws, gs.clients[ws]['name'])
+        gs.lobby.publish(room_id, gs.get_lobby_summary(room))
+    return gs
+
+
+def match_queue_run(skills: list):
+    """10k người vào hàng đợi trong 10 giây (giả lập), quét mỗi 0.5 giây như server"""
+    queue = MatchQueue()
+    step = 10.0 / len(skills)
+    next_sweep = 0.5
+    for i, skill in enumerate(skills):
+        now = i * step
+        queue.push(i, skill, now)
+        if now >= next_sweep:
+            queue.sweep(now)
+            next_sweep += 0.5
+    return queue
+
+
+def build_match_log(directory: str, records: int) -> MatchLogReader:
+    """Segment giả gồm `records` bản ghi của 1000 người chơi"""
+    chunk = bytearray()
+    for i in range(1000):
+        chunk += RECORD.pack(time.time(), i // 2, i // 2, i, 1500, f'bot{i}'.encode(), 1, 0, 1, 1, 3, 0)
+    with open(segment_path(directory, 1), 'wb') as f:
+        f.write(HEADER)
+        for _ in range(records // 1000):
+            f.write(chunk)
+    return MatchLogReader(directory)
+
+
+def measure(fn, min_time: float, repeat: int) -> dict:
+    """Chạy fn theo lô đủ lâu (min_time) rồi lặp `repeat` lần; trả ns/lần gọi."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 24:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1e9)
+    return {'ns_min': min(samples), 'ns_median': statistics.median(samples), 'loops': number}
+
+
+def cases(args):
+    gs = build_server(10)
+    room = next(iter(gs.rooms.values()))
+    a, b = room.players
+    choices_win = {a: 'rock', b: 'scissors'}
+    choices_draw = {a: 'rock', b: 'rock'}
+    counts, _, results = gs.resolve_round(choices_win)
+
+    yield 'resolve_round/win', lambda: gs.resolve_round(choices_win)
+    yield 'resolve_round/draw', lambda: gs.resolve_round(choices_draw)
+    yield 'winning_choice', lambda: gs.winning_choice(counts)
+    yield 'update_scores', lambda: gs.update_scores(room, results)
+    yield 'get_room_info', room.get_room_info
+    yield 'get_room_info_with_player_ids', lambda: gs.get_room_info_with_player_ids(room)
+    yield 'series_wins_by_id', lambda: gs.series_wins_by_id(room)
+
+    for n in ROOM_SCALES:
+        if n > args.max_rooms:
+            continue
+        big = build_server(n)
+        yield f'lobby_snapshot/{n}', lambda: json.dumps(big.lobby.snapshot())
+
+    rnd = random.Random(1)
+    skills = [rnd.betavariate(4, 4) for _ in range(QUEUED_PLAYERS)]
+    yield f'match_queue/{QUEUED_PLAYERS}', lambda: match_queue_run(skills)
+
+    log_dir = tempfile.TemporaryDirectory()
+    gs.match_log = MatchLog(os.path.join(log_dir.name, 'append'))
+    asyncio.run(gs.match_log.open())
+    yield 'match_log/log_round', lambda: gs.log_round(room, results, False, None)
+    asyncio.run(gs.match_log.close())
+    gs.match_log = None
+
+    scan_dir = os.path.join(log_dir.name, 'scan')
+    os.makedirs(scan_dir)
+    reader = build_match_log(scan_dir, LOG_RECORDS)
+    yield f'match_log/scan_player/{LOG_RECORDS}', lambda: sum(1 for _ in reader.scan(player='bot7'))
+    log_dir.cleanup()
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str, max_regression: float) -> int:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    failed = 0
+    print(f"\nSo với {baseline_path} (ngưỡng x{max_regression}):")
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = r['ns_min'] / base['ns_min']
+        flag = 'CHẬM HƠN' if ratio > max_regression else 'ok'
+        failed += ratio > max_regression
+        print(f"  {name:<36} x{ratio:5.2f}  {flag}")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark đường nóng của GameServer')
+    parser.add_argument('--out', help='ghi kết quả ra file JSON')
+    parser.add_argument('--compare', help='file JSON baseline để so sánh')
+    parser.add_argument('--max-regression', type=float, default=1.25,
+                        help='tỉ lệ chậm đi tối đa so với baseline trước khi báo lỗi')
+    parser.add_argument('--min-time', type=float, default=0.2, help='giây tối thiểu mỗi lô đo')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-rooms', type=int, default=max(ROOM_SCALES))
+    args = parser.parse_args()
+
+    results = {}
+    for name, fn in cases(args):
+        results[name] = measure(fn, args.min_time, args.repeat)
+        r = results[name]
+        print(f"{name:<36} {r['ns_min']:>16,.0f} ns  (median {r['ns_median']:,.0f})")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare:
+        sys.exit(compare(results, args.compare, args.max_regression))
+
+
+if __name__ == '__main__':
+    main()
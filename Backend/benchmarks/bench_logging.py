@@ -0,0 +1,91 @@
+"""Đo chi phí log trên event loop khi stdout chậm (terminal bị kéo, pipe đầy, ổ đĩa chậm).
+
+Gửi một loạt tin chat qua handle_chat (phòng 2 người, socket giả) với đầu ra mất `--stall-ms`
+mỗi lần ghi. So sánh cách cũ (print đồng bộ trên event loop) với EventLog (hàng đợi + thread nền):
+độ trễ mỗi handler, tổng thời gian, số bản ghi đã ghi / bị bỏ vì hàng đợi đầy.
+
+Chạy:  python benchmarks/bench_logging.py
+       python benchmarks/bench_logging.py --messages 20000 --stall-ms 2 --log-queue 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from server import GameServer  # noqa: E402
+from eventlog import EventLog  # noqa: E402
+from bench_hotpaths import connect  # noqa: E402
+
+
+class SlowStream:
+    """Đầu ra chậm: mỗi lần write chặn `stall` giây"""
+    def __init__(self, stall: float):
+        self.stall = stall
+        self.writes = 0
+
+    def write(self, text):
+        time.sleep(self.stall)
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+
+class PrintLog(EventLog):
+    """Như trước: định dạng và print ngay trên event loop"""
+    def emit(self, level, category, event, fields):
+        print(f"[{category.upper()}] {event} {fields}", file=self.stream)
+        self.written += 1
+
+
+async def run(log: EventLog, n_messages: int) -> dict:
+    gs = GameServer(lobby_window=60, log=log)
+    room = gs.get_room(gs.create_room('Phòng chat', 2))
+    players = []
+    for _ in range(2):
+        ws = connect(gs)
+        room.add_player(ws, gs.clients[ws]['name'])
+        players.append(ws)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(n_messages):
+        t = time.perf_counter()
+        await gs.handle_chat(players[i % 2], {'message': f'tin nhắn {i}'})
+        latencies.append(time.perf_counter() - t)
+        await asyncio.sleep(0)      # tin nhắn đến lần lượt: task ghi của socket kịp chạy
+    handlers_done = time.perf_counter() - started
+    log.close(timeout=60)
+    for client_info in gs.clients.values():
+        if 'outbox' in client_info:
+            client_info['outbox'].close()
+    latencies.sort()
+    return {
+        'p50_us': statistics.median(latencies) * 1e6,
+        'p99_us': latencies[int(len(latencies) * 0.99)] * 1e6,
+        'handlers_s': handlers_done,
+        **log.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chi phí log khi stdout chậm')
+    parser.add_argument('--messages', type=int, default=5_000)
+    parser.add_argument('--stall-ms', type=float, default=1.0, help='ms mỗi lần ghi ra đầu ra')
+    parser.add_argument('--log-queue', type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'cách log':<12}{'p50 µs':>10}{'p99 µs':>10}{'handler xong s':>16}{'đã ghi':>10}{'bỏ':>10}")
+    for mode in ('print', 'eventlog'):
+        stream = SlowStream(args.stall_ms / 1e3)
+        cls = PrintLog if mode == 'print' else EventLog
+        r = asyncio.run(run(cls(stream=stream, queue_size=args.log_queue), args.messages))
+        print(f"{mode:<12}{r['p50_us']:>10,.1f}{r['p99_us']:>10,.1f}{r['handlers_s']:>16.2f}"
+              f"{r['written']:>10,}{r['dropped']:>10,}")
+
+
+if __name__ == '__main__':
+    main()
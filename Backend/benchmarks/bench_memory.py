@@ -0,0 +1,204 @@
+"""Bộ nhớ mỗi kết nối rỗi và mỗi phòng đang chơi (tracemalloc), và lượt dọn phòng / kết nối bỏ không.
+
+- kết nối rỗi: `--connections` client qua handle_client (task, hàng đợi gửi, client_info, resume token,
+  chỉ mục) rồi ngồi ở sảnh chờ không gửi gì
+- phòng đang chơi: `--rooms` phòng 2 người đang giữa ván (ready, một người đã chọn, hạn chót trong
+  timer wheel, mục trên sảnh chờ); so phòng với cách lưu cũ (5 dict / set theo websocket)
+- dọn: cho mọi kết nối im lặng quá hạn rồi chạy một lượt sweep_idle; đo thời gian và bộ nhớ thu lại
+
+Chạy:  python benchmarks/bench_memory.py
+       python benchmarks/bench_memory.py --connections 20000 --rooms 20000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from server import GameServer, GameRoom, ROUND_SECONDS  # noqa: E402
+from eventlog import EventLog  # noqa: E402
+
+
+class FakeSocket:
+    """Kết nối giả: handle_client chờ tin nhắn mãi tới khi bị đóng"""
+    subprotocol = None
+
+    def __init__(self):
+        self.closed = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self.closed = asyncio.get_running_loop().create_future()
+        await self.closed
+        raise StopAsyncIteration
+
+    async def send(self, frame):
+        pass
+
+    async def close(self, code=1000, reason=''):
+        if self.closed is not None and not self.closed.done():
+            self.closed.set_result(code)
+
+
+class LegacyRoom:
+    """Cách lưu người chơi cũ: danh sách + 5 dict / set theo websocket, điểm là dict riêng mỗi người"""
+    def __init__(self, room_id, room_name, max_players=2):
+        self.room_id = room_id
+        self.room_name = room_name
+        self.max_players = max_players
+        self.round_seconds = ROUND_SECONDS
+        self.round_timer = None
+        self.round_started_at = 0.0
+        self.auto_picked = set()
+        self.players = []
+        self.choices = {}
+        self.scores = {}
+        self.game_state = 'waiting'
+        self.ready_players = set()
+        self.series_best_of = 3
+        self.series_wins = {}
+        self.series_over = False
+        self.password_hash = None
+        self.index = None
+        self.version = 0
+        self.bot = None
+        self.spectators = set()
+        self.audience = deque()
+        self.audience_task = None
+
+    def add_player(self, player, name):
+        self.players.append(player)
+        self.scores[player] = {'wins': 0, 'losses': 0, 'draws': 0, 'name': name}
+        self.series_wins[player] = 0
+
+
+def measure(build) -> int:
+    """Số byte còn giữ sau build() (chỉ theo dõi cấp phát trong lúc build: lượt dọn đo riêng, không bị chậm)"""
+    gc.collect()
+    tracemalloc.start()
+    keep = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return used
+
+
+async def connections(n: int) -> dict:
+    gs = GameServer(lobby_window=60, log=EventLog(os.devnull))
+    sockets = [FakeSocket() for _ in range(n)]
+    tasks = []
+
+    async def connect_all():
+        for ws in sockets:
+            tasks.append(asyncio.ensure_future(gs.handle_client(ws, '/')))
+        while any(ws.closed is None for ws in sockets):
+            await asyncio.sleep(0.01)
+        while any(c.get('outbox') is not None and c['outbox'].task is not None for c in gs.clients.values()):
+            await asyncio.sleep(0.01)
+
+    gc.collect()
+    tracemalloc.start()
+    await connect_all()
+    gc.collect()
+    per_connection = tracemalloc.get_traced_memory()[0] / n
+    tracemalloc.stop()
+
+    # Mọi kết nối im lặng quá hạn: một lượt dọn đóng hết, handler dọn client_info ở finally
+    gs.room_idle_timeout = 0
+    gs.resume_grace = 0         # đo phần thu lại ngay, không giữ chỗ
+    started = time.perf_counter()
+    _, closed = await gs.sweep_idle(time.monotonic() + gs.idle_timeout + 1)
+    sweep_s = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    return {'per_connection': per_connection, 'sweep_s': sweep_s, 'closed': closed, 'clients_left': len(gs.clients)}
+
+
+async def rooms(n: int) -> dict:
+    gs = GameServer(lobby_window=60, log=EventLog(os.devnull))
+    players = []
+    for _ in range(2 * n):
+        ws = FakeSocket()
+        pid = gs.get_next_player_id()
+        gs.clients[ws] = {'id': pid, 'name': f'Player_{pid}', 'socket': ws, 'active': time.monotonic()}
+        players.append(ws)
+
+    def build_server_rooms():
+        for i in range(n):
+            a, b = players[2 * i], players[2 * i + 1]
+            room = gs.get_room(gs.create_room(f'Phòng {i}', 2))
+            for ws in (a, b):
+                room.add_player(ws, gs.clients[ws]['name'])
+                room.set_ready(ws)
+            room.game_state = 'playing'
+            room.choose(a, 'rock')
+            gs._start_round_timer(room)
+            gs.lobby.publish(room.room_id, gs.get_lobby_summary(room))
+        return None
+
+    def build_rooms(cls):
+        def build():
+            out = []
+            for i in range(n):
+                a, b = players[2 * i], players[2 * i + 1]
+                room = cls(f'{i:08x}', f'Phòng {i}', 2)
+                room.add_player(a, 'Player_a')
+                room.add_player(b, 'Player_b')
+                if cls is GameRoom:
+                    room.set_ready(a)
+                    room.set_ready(b)
+                    room.choose(a, 'rock')
+                else:
+                    room.ready_players.update((a, b))
+                    room.choices[a] = 'rock'
+                room.game_state = 'playing'
+                out.append(room)
+            return out
+        return build
+
+    legacy = measure(build_rooms(LegacyRoom)) / n
+    compact = measure(build_rooms(GameRoom)) / n
+    in_server = measure(build_server_rooms) / n
+
+    # Mọi phòng bỏ không: một lượt dọn giải tán hết
+    gs.idle_timeout = 0
+    started = time.perf_counter()
+    closed, _ = await gs.sweep_idle(time.monotonic() + gs.room_idle_timeout + 1)
+    sweep_s = time.perf_counter() - started
+    for task in (gs._timer_task, gs._bot_task):
+        if task is not None:
+            task.cancel()
+    return {'legacy': legacy, 'compact': compact, 'in_server': in_server, 'sweep_s': sweep_s, 'closed': closed,
+            'rooms_left': len(gs.rooms)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bộ nhớ mỗi kết nối / phòng và lượt dọn bỏ không')
+    parser.add_argument('--connections', type=int, default=100_000)
+    parser.add_argument('--rooms', type=int, default=100_000)
+    args = parser.parse_args()
+
+    c = asyncio.run(connections(args.connections))
+    r = asyncio.run(rooms(args.rooms))
+
+    print(f"{args.connections:,} kết nối rỗi ở sảnh chờ")
+    print(f"  mỗi kết nối                     {c['per_connection']:>10,.0f} B")
+    print(f"  dọn một lượt                    {c['sweep_s']:>10.2f} s  ({c['closed']:,} kết nối đóng, "
+          f"còn {c['clients_left']:,} client)")
+    print(f"{args.rooms:,} phòng 2 người đang chơi")
+    print(f"  phòng, cách lưu cũ              {r['legacy']:>10,.0f} B")
+    print(f"  phòng, Seat + __slots__         {r['compact']:>10,.0f} B")
+    print(f"  phòng trong server (sảnh, timer) {r['in_server']:>9,.0f} B")
+    print(f"  dọn một lượt                    {r['sweep_s']:>10.2f} s  ({r['closed']:,} phòng giải tán, "
+          f"còn {r['rooms_left']:,})")
+
+
+if __name__ == '__main__':
+    main()
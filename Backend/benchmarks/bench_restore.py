@@ -0,0 +1,168 @@
+"""Benchmark khởi động lại có snapshot: bao lâu từ lúc process mới chạy tới khi phục vụ được sảnh chờ.
+
+Dựng `--rooms` phòng 2 người (mặc định 100k; cứ 5 phòng có 1 phòng đang chơi dở, 10 phòng có 1
+phòng có mật khẩu, 20 phòng có 1 phòng đấu bot), rồi đo:
+  - ghi snapshot đầy đủ (lúc tắt êm): thời gian mã hóa + ghi, kích thước file; so với cùng dữ liệu dạng JSON
+  - nạp lại: đọc file + dựng lại phòng / phiên giữ chỗ + frame sảnh chờ đầu tiên (time-to-lobby-served)
+  - ghi tăng dần định kỳ khi `--dirty` phần phòng đổi trong một chu kỳ
+
+Chạy:  python benchmarks/bench_restore.py
+       python benchmarks/bench_restore.py --rooms 20000 --dirty 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import server  # noqa: E402
+from server import GameServer  # noqa: E402
+from bots import BotPlayer  # noqa: E402
+from eventlog import EventLog  # noqa: E402
+from snapshot import SnapshotStore  # noqa: E402
+from passwords import hash_password  # noqa: E402
+from bench_hotpaths import FakeSocket  # noqa: E402
+
+
+def populate(gs: GameServer, n_rooms: int):
+    """Dựng phòng trực tiếp (không qua handler): đủ trạng thái cho snapshot, nhanh
+    (mọi phòng có mật khẩu dùng chung một hash: scrypt cho từng phòng thì dựng rất lâu)"""
+    shared_hash = hash_password('mk')
+    for i in range(n_rooms):
+        password_hash = shared_hash if i % 10 == 3 else None
+        room = gs.get_room(gs.create_room(f'Phòng {i}', 2, password_hash=password_hash))
+        seats = [FakeSocket()]
+        if i % 20 == 7:
+            seats.append(BotPlayer(0))
+            room.bot = seats[1]
+        else:
+            seats.append(FakeSocket())
+        for seat in seats:
+            pid = gs.get_next_player_id()
+            if isinstance(seat, BotPlayer):
+                seat.player_id = pid
+                gs.clients[seat] = {'id': pid, 'room_id': None, 'name': server.BOT_NAME, 'bot': True}
+                gs.bot_rooms += 1
+            else:
+                gs.clients[seat] = {'id': pid, 'room_id': None, 'name': f'Player_{pid}', 'socket': seat,
+                                    'record': {'wins': i % 7, 'losses': i % 5, 'draws': i % 3},
+                                    'token': f'tok{pid:021d}'}
+                gs.sessions[gs.clients[seat]['token']] = seat
+            room.add_player(seat, gs.clients[seat]['name'])
+        first = room.seats[seats[0]]
+        first.wins = i % 4
+        first.series_wins = i % 2
+        if i % 5 == 1:
+            for seat in seats:
+                room.set_ready(seat)
+            room.game_state = 'playing'
+            room.choose(seats[0], 'rock')
+            gs._start_round_timer(room)
+        if room.bot is None:
+            gs.lobby.publish(room.room_id, gs.get_lobby_summary(room))
+
+
+async def save(n_rooms: int, path: str, dirty: float) -> dict:
+    gs = GameServer(lobby_window=60, log=EventLog(os.devnull))
+    gs.snapshots = SnapshotStore(path)
+    populate(gs, n_rooms)
+    loop = asyncio.get_running_loop()
+
+    started = time.perf_counter()
+    await gs.save_snapshot(full=True, chunk=None)
+    full_s = time.perf_counter() - started
+
+    # Cùng dữ liệu dạng JSON (cách làm "dễ" nhất) để so kích thước / thời gian
+    json_path = path + '.json'
+    started = time.perf_counter()
+    now = loop.time()
+    data = json.dumps([gs.room_state(room, now) for room in gs.rooms.values()], ensure_ascii=False).encode('utf-8')
+    with open(json_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    json_s = time.perf_counter() - started
+
+    # Một chu kỳ ghi tăng dần: `dirty` phần các phòng đổi
+    step = max(1, int(1 / dirty)) if dirty > 0 else 0
+    if step:
+        for room_id in list(gs.rooms)[::step]:
+            gs.mark_snapshot(room_id)
+    marked = len(gs._snapshot_dirty)
+    before = gs.snapshots.stats['bytes']
+    started = time.perf_counter()
+    await gs.save_snapshot()
+    delta_s = time.perf_counter() - started
+    result = {
+        'rooms': len(gs.rooms),
+        'full_s': full_s,
+        'full_bytes': gs.snapshots.base_bytes,
+        'json_s': json_s,
+        'json_bytes': len(data),
+        'delta_rooms': marked,
+        'delta_s': delta_s,
+        'delta_bytes': gs.snapshots.stats['bytes'] - before,
+    }
+    for task in (gs._timer_task, gs._bot_task):
+        if task is not None:
+            task.cancel()
+    return result
+
+
+async def restore(path: str) -> dict:
+    started = time.perf_counter()
+    gs = GameServer(lobby_window=60, log=EventLog(os.devnull))
+    gs.snapshots = SnapshotStore(path)
+    await gs.load_snapshot(server.RESTORE_GRACE)
+    restored = time.perf_counter()
+    frame = json.dumps(gs.lobby.snapshot())
+    served = time.perf_counter()
+    result = {
+        'restore_s': restored - started,
+        'lobby_s': served - started,
+        'lobby_rooms': len(gs.lobby.snapshot()['rooms']),
+        'lobby_bytes': len(frame),
+        'held': gs.session_stats['held'],
+    }
+    for task in (gs._timer_task, gs._bot_task, gs._session_task):
+        if task is not None:
+            task.cancel()
+    return result
+
+
+async def restore_json(path: str) -> float:
+    """Nạp phần JSON tương ứng (chỉ đọc + parse, chưa dựng phòng) để so với snapshot nhị phân"""
+    started = time.perf_counter()
+    with open(path + '.json', 'rb') as f:
+        json.loads(f.read())
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark snapshot / khởi động lại')
+    parser.add_argument('--rooms', type=int, default=100_000)
+    parser.add_argument('--dirty', type=float, default=0.01, help='phần phòng đổi trong một chu kỳ ghi tăng dần')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'rooms.snapshot')
+    s = asyncio.run(save(args.rooms, path, args.dirty))
+    r = asyncio.run(restore(path))
+    json_load_s = asyncio.run(restore_json(path))
+    os.remove(path + '.json')
+
+    print(f"{s['rooms']:,} phòng ({r['held']:,} người chơi giữ chỗ, {r['lobby_rooms']:,} phòng trên sảnh)")
+    print(f"{'':<28}{'thời gian s':>12}{'kích thước':>16}")
+    print(f"{'ghi đầy đủ (snapshot)':<28}{s['full_s']:>12.3f}{s['full_bytes']:>14,} B")
+    print(f"{'ghi đầy đủ (JSON)':<28}{s['json_s']:>12.3f}{s['json_bytes']:>14,} B")
+    print(f"{'ghi tăng dần':<28}{s['delta_s']:>12.3f}{s['delta_bytes']:>14,} B  ({s['delta_rooms']:,} phòng đổi)")
+    print(f"{'đọc file + dựng lại phòng':<28}{r['restore_s']:>12.3f}")
+    print(f"{'đọc file JSON (chỉ parse)':<28}{json_load_s:>12.3f}")
+    print(f"{'tới frame sảnh chờ đầu tiên':<28}{r['lobby_s']:>12.3f}{r['lobby_bytes']:>14,} B")
+
+
+if __name__ == '__main__':
+    main()
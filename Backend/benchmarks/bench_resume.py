@@ -0,0 +1,139 @@
+"""Benchmark "bão kết nối lại": mạng chập chờn làm mọi người chơi rớt rồi vào lại cùng lúc.
+
+Mặc định 10k người chơi trong 5k phòng 2 người, một người xem sảnh. Cả lô ngắt kết nối rồi
+kết nối lại ngay. So sánh resume_grace = 0 (dọn hết rồi vào lại như người mới, phải tạo /
+vào phòng lại) với giữ chỗ (kết nối lại bằng token). Đo thời gian xử lý cả cơn bão, số frame
+gửi tới người chơi và số frame rooms_delta người xem sảnh nhận, và phòng còn lại sau đó.
+
+Chạy:  python benchmarks/bench_resume.py
+       python benchmarks/bench_resume.py --players 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import server  # noqa: E402
+from server import GameServer  # noqa: E402
+from eventlog import EventLog  # noqa: E402
+
+
+class FakeSocket:
+    """Kết nối giả: handle_client đọc tin nhắn từ hàng đợi, frame gửi đi chỉ được đếm."""
+    subprotocol = None
+
+    def __init__(self):
+        self.inbox = asyncio.Queue()
+        self.frames = 0
+        self.deltas = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def send(self, frame):
+        self.frames += 1
+        if '"rooms_delta"' in frame[:24]:
+            self.deltas += 1
+
+    async def close(self, code=1000, reason=''):
+        self.inbox.put_nowait(None)
+
+
+async def settle(gs):
+    """Chờ mọi task ghi và lượt gộp sảnh chờ xong"""
+    while True:
+        await asyncio.sleep(0.01)
+        busy = any(c.get('outbox') is not None and c['outbox'].task is not None for c in gs.clients.values())
+        if not busy and gs._lobby_timer is None and not gs._lobby_dirty:
+            return
+
+
+async def run(n_players: int, grace: float) -> dict:
+    server.print = lambda *a, **k: None     # tổng kết lúc shutdown
+    gs = GameServer(lobby_window=0.05, resume_grace=grace, log=EventLog(os.devnull))
+    tasks = []
+
+    async def connect(path='/'):
+        ws = FakeSocket()
+        tasks.append(asyncio.ensure_future(gs.handle_client(ws, path)))
+        await asyncio.sleep(0)
+        return ws
+
+    sockets = [await connect() for _ in range(n_players)]
+    watcher = await connect()
+    sessions = {client_info.get('socket'): ws for ws, client_info in gs.clients.items()}
+    for i in range(0, n_players, 2):
+        host, guest = sockets[i], sockets[i + 1]
+        await gs.handle_message(sessions[host], json.dumps({'type': 'create_room', 'room_name': f'P{i}'}))
+        room_id = gs.get_player_room(sessions[host])
+        await gs.handle_message(sessions[guest], json.dumps({'type': 'join_room', 'room_id': room_id}))
+    tokens = {ws: gs.clients[sessions[ws]].get('token') for ws in sockets}
+    await settle(gs)
+    rooms_before = len(gs.rooms)
+    frames_before = sum(ws.frames for ws in sockets)
+    deltas_before = watcher.deltas
+
+    # Cơn bão: cả lô rớt rồi vào lại
+    started = time.perf_counter()
+    for ws in sockets:
+        await ws.close()
+    await settle(gs)
+    sockets2 = []
+    for ws in sockets:
+        token = tokens[ws]
+        sockets2.append(await connect(f'/?resume={token}' if token else '/'))
+    await settle(gs)
+    rooms_kept = len(gs.rooms)
+    if not grace:
+        # Không giữ chỗ: người chơi phải tự tạo / vào lại phòng
+        sessions = {client_info.get('socket'): ws for ws, client_info in gs.clients.items()}
+        for i in range(0, n_players, 2):
+            host, guest = sockets2[i], sockets2[i + 1]
+            await gs.handle_message(sessions[host], json.dumps({'type': 'create_room', 'room_name': f'P{i}'}))
+            room_id = gs.get_player_room(sessions[host])
+            await gs.handle_message(sessions[guest], json.dumps({'type': 'join_room', 'room_id': room_id}))
+        await settle(gs)
+    elapsed = time.perf_counter() - started
+
+    result = {
+        'storm_s': elapsed,
+        'player_frames': sum(ws.frames for ws in sockets + sockets2) - frames_before,
+        'lobby_deltas': watcher.deltas - deltas_before,
+        'rooms_kept': rooms_kept,
+        'rooms_before': rooms_before,
+    }
+    for ws in sockets2 + [watcher]:
+        await ws.close()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for ws in list(gs.clients):
+        await gs.cleanup_client(ws)
+    await gs.shutdown()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bão kết nối lại')
+    parser.add_argument('--players', type=int, default=10_000, help='số người chơi (chẵn)')
+    parser.add_argument('--grace', type=float, default=server.RESUME_GRACE, help='giây giữ chỗ khi so sánh')
+    args = parser.parse_args()
+
+    print(f"{'người chơi':>10}  {'giữ chỗ s':>9}{'thời gian s':>13}{'frame tới người chơi':>22}"
+          f"{'rooms_delta':>13}{'phòng giữ được':>16}")
+    for grace in (0.0, args.grace):
+        r = asyncio.run(run(args.players, grace))
+        print(f"{args.players:>10,}  {grace:>9g}{r['storm_s']:>13.2f}{r['player_frames']:>22,}"
+              f"{r['lobby_deltas']:>13,}{r['rooms_kept']:>10,}/{r['rooms_before']:,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Đo một ván trong phòng đông người (mặc định 100 / 1k / 10k người chơi).
+
+So sánh cách cũ (nhóm lựa chọn theo loại rồi duyệt từng nhóm; game_result là các
+dict theo tên từng người) với cách mới (đếm 3 loại -> nước thắng O(1), gán kết quả
+một lượt; round_result là frame gọn 1 ký tự / người), và toàn bộ process_game_result
+(socket giả, gửi không tốn gì) để thấy phần còn lại của một ván.
+
+Chạy:  python benchmarks/bench_rounds.py
+       python benchmarks/bench_rounds.py --players 1000 --out benchmarks/results/rounds.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+from server import GameServer  # noqa: E402
+from eventlog import EventLog  # noqa: E402
+from bench_hotpaths import connect, measure  # noqa: E402
+
+PLAYERS = (100, 1_000, 10_000)
+
+
+def build_room(n: int):
+    # Log thật (hàng đợi + thread nền) nhưng bỏ đầu ra để không lẫn vào bảng kết quả
+    gs = GameServer(lobby_window=60, log=EventLog(os.devnull))
+    room = gs.get_room(gs.create_room('Phòng đông', n))
+    for _ in range(n):
+        ws = connect(gs)
+        room.add_player(ws, gs.clients[ws]['name'])
+    rnd = random.Random(n)
+    choices = {p: rnd.choice(('rock', 'paper')) for p in room.players}   # 2 loại: có thắng có thua
+    return gs, room, choices
+
+
+def legacy_resolve(choices) -> dict:
+    """Cách cũ: nhóm người chơi theo lựa chọn rồi duyệt từng nhóm để gán kết quả"""
+    grouped = {}
+    for p, c in choices.items():
+        grouped.setdefault(c, []).append(p)
+    kinds = set(grouped)
+    beats = {'rock': 'scissors', 'scissors': 'paper', 'paper': 'rock'}
+    winner = None
+    if len(kinds) == 2:
+        a, b = kinds
+        winner = a if beats[a] == b else b
+    return {p: 'draw' if winner is None else 'win' if c == winner else 'lose'
+            for c, players in grouped.items() for p in players}
+
+
+def legacy_frame(gs, room, results) -> str:
+    """game_result như trước: lựa chọn / kết quả / điểm / series theo từng người"""
+    return json.dumps({
+        'type': 'game_result',
+        'choices': {gs.clients[p]['name']: c for p, c in room.choices().items()},
+        'results': {gs.clients[p]['name']: r for p, r in results.items()},
+        'scores': {gs.clients[p]['name']: seat.score() for p, seat in room.seats.items()},
+        'series': {'best_of': room.series_best_of, 'over': False, 'winner_id': None,
+                   'wins': {gs.clients[p]['id']: seat.series_wins for p, seat in room.seats.items()}},
+        **gs.room_diff(room, game_state='waiting',
+                       ready={gs.clients[p]['id']: False for p, seat in room.seats.items() if seat.ready})
+    })
+
+
+def choose_all(room, choices):
+    for p, c in choices.items():
+        room.choose(p, c)
+
+
+def cases(n: int):
+    gs, room, choices = build_room(n)
+    choose_all(room, choices)
+    for p in room.players:
+        room.set_ready(p)
+    picked = room.choices()
+    counts, winner, results = gs.resolve_round(picked)
+    assert results == legacy_resolve(picked)
+
+    yield 'resolve/legacy', lambda: legacy_resolve(picked)
+    yield 'resolve/counts', lambda: gs.resolve_round(picked)
+    legacy = legacy_frame(gs, room, results)
+    compact = json.dumps(gs.round_result(room, counts, winner, results, None))
+    yield 'frame/legacy', lambda: legacy_frame(gs, room, results), len(legacy)
+    yield 'frame/compact', lambda: json.dumps(gs.round_result(room, counts, winner, results, None)), len(compact)
+
+    loop = asyncio.new_event_loop()
+
+    def full_round():
+        choose_all(room, choices)
+        room.game_state = 'playing'
+        room.series_over = False
+        loop.run_until_complete(gs.process_game_result(room.room_id))
+    yield 'process_game_result', full_round
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Đo một ván trong phòng đông người')
+    parser.add_argument('--players', type=int, nargs='+', default=list(PLAYERS))
+    parser.add_argument('--min-time', type=float, default=0.2, help='giây tối thiểu mỗi lô đo')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='ghi kết quả ra file JSON')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'người':>8}  {'đo':<22}{'µs':>12}{'byte frame':>14}")
+    for n in args.players:
+        for name, fn, *size in cases(n):
+            r = measure(fn, args.min_time, args.repeat)
+            results[f'{n}/{name}'] = {'ns_min': r['ns_min'], 'bytes': size[0] if size else None}
+            print(f"{n:>8,}  {name:<22}{r['ns_min'] / 1e3:>12,.1f}{(f'{size[0]:,}' if size else ''):>14}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
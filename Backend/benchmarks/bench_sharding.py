@@ -0,0 +1,72 @@
+"""Benchmark khả năng mở rộng của chế độ shard (server.py --workers N).
+
+Với mỗi cấu hình số worker, khởi động server, chạy loadtest.py với think-time 0
+để ép tải, rồi so sánh throughput (tin nhắn nhận/giây, lượt chọn/giây).
+
+Chạy:  python benchmarks/bench_sharding.py --workers 0 1 2 4 --clients 400 --duration 20
+(0 = chế độ một process như cũ)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..')
+
+
+def run_one(workers: int, port: int, args) -> dict:
+    data_dir = tempfile.TemporaryDirectory()   # không ghi vào stats.db / match_logs thật
+    server = subprocess.Popen([sys.executable, 'server.py', '--port', str(port), '--workers', str(workers),
+                               '--stats-db', os.path.join(data_dir.name, 'stats.db'),
+                               '--match-log', os.path.join(data_dir.name, 'match_logs')],
+                              cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(args.startup)
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+            report_path = tmp.name
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, 'loadtest.py'),
+                        '--url', f'ws://localhost:{port}', '--clients', str(args.clients),
+                        '--ramp-up', str(args.ramp_up), '--duration', str(args.duration),
+                        '--think-time', '0', '--ping-interval', '1', '--chat-ratio', '0.2',
+                        '--json', report_path],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(report_path, encoding='utf-8') as f:
+            report = json.load(f)
+        os.unlink(report_path)
+        return report
+    finally:
+        server.terminate()
+        server.wait()
+        data_dir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark mở rộng theo số worker')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--clients', type=int, default=400)
+    parser.add_argument('--ramp-up', type=float, default=2.0)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--startup', type=float, default=3.0, help='giây chờ server khởi động')
+    parser.add_argument('--base-port', type=int, default=9200)
+    args = parser.parse_args()
+
+    rows = []
+    for i, workers in enumerate(args.workers):
+        report = run_one(workers, args.base_port + 100 * i, args)
+        rows.append((workers, report['received_per_s'], report['rounds'] / report['elapsed_s'],
+                     report['latency'].get('choice->game_result', {}).get('p99_ms', 0.0),
+                     sum(report['errors'].values())))
+
+    base = next((r for r in rows if r[0] == 1), rows[0])
+    print(f"{'workers':>8}{'nhận/s':>12}{'lượt/s':>10}{'x':>7}{'p99 ms':>10}{'lỗi':>7}")
+    for workers, recv_s, rounds_s, p99, errors in rows:
+        label = workers if workers else '1 (cũ)'
+        print(f"{label:>8}{recv_s:>12,.0f}{rounds_s:>10,.0f}{rounds_s / base[2]:>7.2f}{p99:>10.1f}{errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark phòng có đông người xem (mặc định 1k / 10k người xem, 5% rất chậm).
+
+Mỗi ván phát chuỗi sự kiện như thật (game_start, chat, game_result). Đo thời gian
+broadcast_to_room trả về (người chơi chờ bao lâu), thời gian tới khi người xem
+nhanh nhận đủ, và số frame bị bỏ / số lần gửi lại cả phòng cho người xem chậm.
+So sánh với cách gộp người xem vào danh sách người nhận như người chơi (gửi chung một lượt).
+
+Chạy:  python benchmarks/bench_spectators.py
+       python benchmarks/bench_spectators.py --spectators 10000 --slow-ratio 0.05 --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from server import GameServer  # noqa: E402
+from eventlog import EventLog  # noqa: E402
+from bench_hotpaths import connect  # noqa: E402
+
+
+class FakeSocket:
+    """Socket giả: người xem chậm mất `delay` giây cho mỗi frame."""
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.frames = 0
+
+    async def send(self, frame):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames += 1
+
+
+def build(n_spectators: int, slow_ratio: float, slow_delay: float):
+    gs = GameServer(lobby_window=60, log=EventLog(os.devnull))
+    room = gs.get_room(gs.create_room('Trận hot', 2))
+    sockets = []
+    slow_every = int(1 / slow_ratio) if slow_ratio else 0
+    for i in range(2 + n_spectators):
+        slow = i >= 2 and slow_every and i % slow_every == 0
+        sockets.append(connect(gs, FakeSocket(slow_delay if slow else 0.0)))
+    for ws in sockets[:2]:
+        room.add_player(ws, gs.clients[ws]['name'])
+    return gs, room, sockets[:2], sockets[2:]
+
+
+async def run(n_spectators: int, args, mode: str) -> dict:
+    gs, room, players, audience = build(n_spectators, args.slow_ratio, args.slow_delay)
+    if mode == 'spectators':
+        for ws in audience:
+            await gs.handle_spectate(ws, {'room_id': room.room_id})
+    else:
+        # Cách gộp: người xem nằm chung danh sách người nhận với người chơi
+        async def broadcast_to_room(room_id, message, _players=players):
+            return await gs.send_many(_players + audience, message)
+        gs.broadcast_to_room = broadcast_to_room
+    fast = [ws for ws in audience if not ws.delay]
+    waits = []
+    started = time.perf_counter()
+    for r in range(args.rounds):
+        for message in ({'type': 'game_start', 'is_first_game': r == 0, 'round_seconds': 10},
+                        {'type': 'chat', 'player_name': 'Player_1', 'message': 'gg'},
+                        {'type': 'game_result', 'choices': {}, 'results': {}, 'scores': {}}):
+            t = time.perf_counter()
+            await gs.broadcast_to_room(room.room_id, message)
+            waits.append(time.perf_counter() - t)
+        await asyncio.sleep(args.round_gap)
+    expected = min(ws.frames for ws in players)
+    while fast and min(ws.frames for ws in fast) < expected + (1 if mode == 'spectators' else 0):
+        await asyncio.sleep(0.001)
+    delivered = time.perf_counter() - started
+    for client_info in gs.clients.values():
+        if 'outbox' in client_info:
+            client_info['outbox'].close()
+    return {
+        'player_wait_ms_p50': statistics.median(waits) * 1e3,
+        'player_wait_ms_max': max(waits) * 1e3,
+        'fast_audience_done_s': delivered,
+        'dropped': gs.send_stats['dropped_room'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark phòng có đông người xem')
+    parser.add_argument('--spectators', type=int, nargs='+', default=[1_000, 10_000])
+    parser.add_argument('--slow-ratio', type=float, default=0.05, help='tỉ lệ người xem chậm')
+    parser.add_argument('--slow-delay', type=float, default=0.5, help='giây mỗi frame của người xem chậm')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--round-gap', type=float, default=0.05, help='giây giữa hai ván')
+    args = parser.parse_args()
+
+    print(f"{'người xem':>10}  {'cách gửi':<12}{'chờ p50 ms':>12}{'chờ max ms':>12}"
+          f"{'xem nhanh xong s':>18}{'frame bỏ':>10}")
+    for n in args.spectators:
+        for mode in ('inline', 'spectators'):
+            r = asyncio.run(run(n, args, mode))
+            print(f"{n:>10,}  {mode:<12}{r['player_wait_ms_p50']:>12.2f}{r['player_wait_ms_max']:>12.2f}"
+                  f"{r['fast_audience_done_s']:>18.2f}{r['dropped']:>10,}")
+
+
+if __name__ == '__main__':
+    main()
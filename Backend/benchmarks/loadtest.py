@@ -0,0 +1,388 @@
+"""Load test: hàng nghìn client asyncio giả lập chạy đúng giao thức WebSocket của server.py.
+
+Mỗi client: set_name -> (tạo phòng | vào phòng, có/không mật khẩu) -> ready -> choice
+-> ... (đủ một series, dùng new_game giữa các ván) -> chat -> leave_room, lặp lại tới hết
+thời gian; song song gửi ping định kỳ. Cuối cùng in throughput, p50/p95/p99 theo loại
+tin nhắn, số lỗi và RSS của server.
+
+Chạy (server đã chạy sẵn):
+    python benchmarks/loadtest.py --clients 2000 --ramp-up 20 --duration 60
+Tự khởi động server và đo RSS:
+    python benchmarks/loadtest.py --spawn-server --clients 500
+Ghép trận nhanh (quick_match) với 10k người cùng vào hàng đợi:
+    python benchmarks/loadtest.py --spawn-server --clients 10000 --ramp-up 5 --quick-match-ratio 1
+Dùng codec nhị phân (subprotocol rps.bin.v1) thay cho JSON, so sánh số byte nhận:
+    python benchmarks/loadtest.py --spawn-server --clients 500 --codec binary
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import websockets
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+import wire  # noqa: E402
+CHOICES = ('rock', 'paper', 'scissors')
+
+
+class Stats:
+    """Số liệu gom chung cho mọi client."""
+    def __init__(self):
+        self.latency = defaultdict(list)   # loại tin nhắn -> [giây]
+        self.sent = defaultdict(int)
+        self.received = defaultdict(int)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors = defaultdict(int)     # loại lỗi -> số lần
+        self.rounds = 0
+        self.connected = 0
+        self.rss_samples = []              # (thời điểm, KB)
+
+    def record(self, kind: str, seconds: float):
+        self.latency[kind].append(seconds)
+
+
+class SimClient:
+    def __init__(self, idx: int, args, stats: Stats, lobby: asyncio.Queue, rnd: random.Random):
+        self.idx = idx
+        self.args = args
+        self.stats = stats
+        self.lobby = lobby            # phòng đang chờ khách: (room_id, password)
+        self.rnd = rnd
+        self.ws = None
+        self.name = f"bot{idx}"
+        self.player_id = None
+        self.waiters = []             # [(loại, điều kiện, future)]
+
+    async def think(self):
+        if self.args.think_time > 0:
+            await asyncio.sleep(self.rnd.expovariate(1 / self.args.think_time))
+
+    async def send(self, msg: dict):
+        self.stats.sent[msg['type']] += 1
+        frame = wire.encode(msg) if self.args.codec == 'binary' else json.dumps(msg)
+        self.stats.bytes_sent += len(frame)
+        await self.ws.send(frame)
+
+    def expect(self, kinds, cond=None) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append((kinds if isinstance(kinds, tuple) else (kinds,), cond, fut))
+        return fut
+
+    async def request(self, msg: dict, kinds, cond=None, label=None, timeout=None):
+        """Gửi msg rồi chờ phản hồi đầu tiên thuộc `kinds`; ghi latency theo `label`."""
+        fut = self.expect(kinds, cond)
+        t0 = time.perf_counter()
+        await self.send(msg)
+        try:
+            reply = await asyncio.wait_for(fut, timeout or self.args.timeout)
+        except asyncio.TimeoutError:
+            self.stats.errors[f"timeout:{label or msg['type']}"] += 1
+            return None
+        self.stats.record(label or msg['type'], time.perf_counter() - t0)
+        return reply
+
+    async def reader(self):
+        async for raw in self.ws:
+            self.stats.bytes_received += len(raw)
+            data = wire.decode(raw)
+            kind = data.get('type')
+            self.stats.received[kind] += 1
+            if kind == 'pong' and isinstance(data.get('t'), (int, float)):
+                self.stats.record('ping', time.time() - data['t'] / 1000)
+            elif kind == 'player_id':
+                self.player_id = data['player_id']
+            elif kind == 'error':
+                self.stats.errors[f"server:{data.get('message')}"] += 1
+            for waiter in list(self.waiters):
+                kinds, cond, fut = waiter
+                if kind in kinds and not fut.done() and (cond is None or cond(data)):
+                    fut.set_result(data)
+                    self.waiters.remove(waiter)
+                    break
+            self.waiters = [w for w in self.waiters if not w[2].done()]
+
+    async def pinger(self):
+        while True:
+            await asyncio.sleep(self.args.ping_interval)
+            await self.send({'type': 'ping', 't': int(time.time() * 1000)})
+
+    async def play_series(self, room_id: str, started: asyncio.Future | None = None):
+        """Chơi tới khi series kết thúc (hoặc đối thủ rời / hết giờ).
+        `started`: ván đầu đã được server bắt đầu sẵn (quick_match), không cần ready."""
+        first = True
+        while True:
+            if started is None:
+                await self.think()
+                started = self.expect('game_start')
+                if first:
+                    ok = await self.request({'type': 'ready'}, 'player_ready',
+                                            lambda d: d.get('player_name') == self.name)
+                else:
+                    ok = await self.request({'type': 'new_game'}, 'player_ready_for_new_game',
+                                            lambda d: d.get('player_name') == self.name)
+                if ok is None:
+                    return
+            first = False
+            try:
+                await asyncio.wait_for(started, self.args.timeout)
+            except asyncio.TimeoutError:
+                self.stats.errors['timeout:game_start'] += 1
+                return
+            started = None
+            await self.think()
+            result = await self.request({'type': 'choice', 'choice': self.rnd.choice(CHOICES)},
+                                        'game_result', label='choice->game_result', timeout=15)
+            if result is None:
+                return
+            self.stats.rounds += 1
+            if self.rnd.random() < self.args.chat_ratio:
+                await self.request({'type': 'chat', 'message': f'gg {self.idx}'}, 'chat',
+                                   lambda d: d.get('player_name') == self.name)
+            if result.get('series', {}).get('over'):
+                return
+
+    async def host(self):
+        password = 'pw' if self.rnd.random() < self.args.password_ratio else ''
+        msg = {'type': 'create_room', 'room_name': f'Load {self.idx}', 'max_players': 2}
+        if password:
+            msg['password'] = password
+        joined = self.expect('player_joined')
+        created = await self.request(msg, 'room_created')
+        if created is None:
+            return
+        room_id = created['room']['room_id']
+        await self.lobby.put((room_id, password))
+        try:
+            await asyncio.wait_for(joined, self.args.timeout)
+        except asyncio.TimeoutError:
+            self.stats.errors['timeout:waiting_for_guest'] += 1
+            return
+        await self.play_series(room_id)
+
+    async def guest(self):
+        await self.request({'type': 'get_rooms'}, ('rooms_list', 'rooms_delta'))
+        try:
+            room_id, password = await asyncio.wait_for(self.lobby.get(), self.args.timeout)
+        except asyncio.TimeoutError:
+            self.stats.errors['timeout:no_room_to_join'] += 1
+            return
+        msg = {'type': 'join_room', 'room_id': room_id}
+        if password:
+            msg['password'] = password
+        reply = await self.request(msg, ('player_joined', 'error'),
+                                   lambda d: d['type'] == 'error' or d.get('player_name') == self.name)
+        if reply is None or reply['type'] == 'error':
+            return
+        await self.play_series(room_id)
+
+    async def quick(self):
+        started = self.expect('game_start')
+        found = await self.request({'type': 'quick_match'}, 'match_found', label='quick_match->match_found')
+        if found is None:
+            await self.send({'type': 'cancel_quick_match'})
+            return
+        await self.play_series(found['room']['room_id'], started)
+
+    def uses_quick_match(self) -> bool:
+        # Chia theo cặp (host, guest) để cặp nào cũng cùng một chế độ; rải đều theo tỉ lệ
+        pair, ratio = self.idx // 2, self.args.quick_match_ratio
+        return int((pair + 1) * ratio) > int(pair * ratio)
+
+    async def run(self, deadline: float):
+        try:
+            self.ws = await websockets.connect(
+                self.args.url, open_timeout=self.args.timeout, max_size=None,
+                subprotocols=[wire.SUBPROTOCOL] if self.args.codec == 'binary' else None)
+        except Exception as e:
+            self.stats.errors[f"connect:{type(e).__name__}"] += 1
+            return
+        self.stats.connected += 1
+        reader = asyncio.create_task(self.reader())
+        pinger = asyncio.create_task(self.pinger())
+        try:
+            await self.send({'type': 'set_name', 'name': self.name})
+            is_host = self.idx % 2 == 0
+            quick = self.uses_quick_match()
+            while time.monotonic() < deadline:
+                if quick:
+                    await self.quick()
+                elif is_host:
+                    await self.host()
+                else:
+                    await self.guest()
+                await self.send({'type': 'leave_room'})
+                await self.think()
+        except websockets.exceptions.ConnectionClosed:
+            self.stats.errors['connection_closed'] += 1
+        finally:
+            pinger.cancel()
+            reader.cancel()
+            await self.ws.close()
+            self.stats.connected -= 1
+
+
+def read_rss_kb(pid: int) -> int | None:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+async def sample_rss(pid: int, stats: Stats):
+    while True:
+        rss = read_rss_kb(pid)
+        if rss is not None:
+            stats.rss_samples.append((time.monotonic(), rss))
+        await asyncio.sleep(1)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def build_report(args, stats: Stats, elapsed: float) -> dict:
+    per_type = {}
+    for kind, values in sorted(stats.latency.items()):
+        values.sort()
+        per_type[kind] = {
+            'count': len(values),
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        }
+    sent, received = sum(stats.sent.values()), sum(stats.received.values())
+    rss = [kb for _, kb in stats.rss_samples]
+    return {
+        'clients': args.clients,
+        'elapsed_s': elapsed,
+        'sent': sent,
+        'received': received,
+        'sent_per_s': sent / elapsed,
+        'received_per_s': received / elapsed,
+        'codec': args.codec,
+        'bytes_sent': stats.bytes_sent,
+        'bytes_received': stats.bytes_received,
+        'rounds': stats.rounds,
+        'latency': per_type,
+        'errors': dict(stats.errors),
+        'server_rss_kb': {'peak': max(rss), 'last': rss[-1]} if rss else None,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n=== {report['clients']} client, {report['elapsed_s']:.1f}s ===")
+    print(f"gửi {report['sent']:,} ({report['sent_per_s']:,.0f}/s), "
+          f"nhận {report['received']:,} ({report['received_per_s']:,.0f}/s), "
+          f"{report['rounds']:,} lượt chọn đã có kết quả")
+    print(f"codec {report['codec']}: gửi {report['bytes_sent'] / 1024:,.0f} KB, "
+          f"nhận {report['bytes_received'] / 1024:,.0f} KB "
+          f"({report['bytes_received'] / max(1, report['received']):.0f} byte/tin)")
+    print(f"{'loại':<24}{'số mẫu':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, r in report['latency'].items():
+        print(f"{kind:<24}{r['count']:>10,}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+    if report['errors']:
+        print("Lỗi:")
+        for kind, n in sorted(report['errors'].items(), key=lambda x: -x[1]):
+            print(f"  {n:>8,}  {kind}")
+    else:
+        print("Lỗi: 0")
+    if report['server_rss_kb']:
+        print(f"RSS server: đỉnh {report['server_rss_kb']['peak'] / 1024:.1f} MB, "
+              f"cuối {report['server_rss_kb']['last'] / 1024:.1f} MB")
+
+
+def raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+async def run(args):
+    stats = Stats()
+    rnd = random.Random(args.seed)
+    server_proc = None
+    server_pid = args.server_pid
+    if args.spawn_server:
+        # Thành tích / nhật ký ván ghi ra thư mục tạm, không lẫn vào dữ liệu thật
+        data_dir = tempfile.TemporaryDirectory()
+        server_proc = subprocess.Popen([sys.executable, 'server.py',
+                                        '--stats-db', os.path.join(data_dir.name, 'stats.db'),
+                                        '--match-log', os.path.join(data_dir.name, 'match_logs')],
+                                       cwd=BACKEND_DIR,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        server_pid = server_proc.pid
+        await asyncio.sleep(1.5)
+    sampler = asyncio.create_task(sample_rss(server_pid, stats)) if server_pid else None
+
+    lobby = asyncio.Queue()
+    start = time.monotonic()
+    deadline = start + args.ramp_up + args.duration
+    tasks = []
+    try:
+        for i in range(args.clients):
+            client = SimClient(i, args, stats, lobby, random.Random(rnd.random()))
+            tasks.append(asyncio.create_task(client.run(deadline)))
+            if args.ramp_up > 0:
+                await asyncio.sleep(args.ramp_up / args.clients)
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        elapsed = time.monotonic() - start
+        if sampler:
+            sampler.cancel()
+        if server_proc:
+            server_proc.terminate()
+            server_proc.wait()
+            data_dir.cleanup()
+
+    report = build_report(args, stats, elapsed)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test giao thức WebSocket của server Kéo Búa Bao')
+    parser.add_argument('--url', default='ws://localhost:8082')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--ramp-up', type=float, default=10.0, help='giây để mở hết các kết nối')
+    parser.add_argument('--duration', type=float, default=30.0, help='giây chạy sau khi ramp-up xong')
+    parser.add_argument('--think-time', type=float, default=0.5, help='thời gian nghĩ trung bình (giây)')
+    parser.add_argument('--ping-interval', type=float, default=2.0)
+    parser.add_argument('--password-ratio', type=float, default=0.3, help='tỉ lệ phòng có mật khẩu')
+    parser.add_argument('--chat-ratio', type=float, default=0.3, help='xác suất chat sau mỗi ván')
+    parser.add_argument('--quick-match-ratio', type=float, default=0.0,
+                        help='tỉ lệ client dùng quick_match thay vì tạo / tìm phòng')
+    parser.add_argument('--codec', choices=('json', 'binary'), default='json',
+                        help='binary = xin subprotocol rps.bin.v1 (frame nhị phân)')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--server-pid', type=int, help='PID server để đo RSS (Linux)')
+    parser.add_argument('--spawn-server', action='store_true', help='tự chạy server.py cục bộ')
+    parser.add_argument('--json', help='ghi báo cáo ra file JSON')
+    raise_fd_limit()
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
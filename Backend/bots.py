@@ -0,0 +1,176 @@
+"""Bot đối thủ chạy trên server: đoán nước đi tiếp theo của người chơi rồi chọn nước thắng.
+
+Mỗi người chơi (theo tên đã đặt, hoặc player_id với khách) có một mô hình cố định
+kích thước: bảng đếm Markov bậc 1 theo ngữ cảnh (nước trước của người, nước trước
+của bot) cộng tần suất chung, mọi số đếm suy giảm theo cấp số nhân để mô hình bám
+thói quen gần đây. Số mô hình giữ trong RAM có giới hạn (LRU).
+
+Mọi phòng bot cần ra nước trong một tick được tính chung một lần: với NumPy là vài
+phép toán trên mảng (n phòng, 3); không có NumPy thì chạy cùng công thức bằng vòng lặp.
+"""
+import random
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:          # NumPy là tùy chọn: thiếu thì dùng vòng lặp Python
+    np = None
+
+MOVES = ('rock', 'paper', 'scissors')   # nước (i + 1) % 3 thắng nước i
+MOVE_INDEX = {m: i for i, m in enumerate(MOVES)}
+CONTEXTS = 10                 # 9 cặp (nước người, nước bot) trước đó + 1 ngữ cảnh "chưa có ván nào"
+NO_CONTEXT = 9
+DECAY = 0.95                  # mỗi ván số đếm cũ nhân với hệ số này (~20 ván gần nhất là chính)
+FREQ_WEIGHT = 0.3             # trọng số của tần suất chung so với bảng theo ngữ cảnh
+PRIOR = 0.5                   # số đếm giả cho mỗi nước, tránh tin vào 1-2 mẫu
+EPSILON = 0.1                 # xác suất ra nước ngẫu nhiên (khó bị bắt bài ngược)
+MAX_MODELS = 100_000          # số người chơi tối đa được nhớ mô hình
+BOT_NAME = 'Bot'
+
+# PAYOFF[h][m]: điểm của bot khi bot ra m, người ra h (+1 thắng, -1 thua)
+PAYOFF = [[(1 if m == (h + 1) % 3 else -1 if h == (m + 1) % 3 else 0) for m in range(3)] for h in range(3)]
+
+
+class BotPlayer:
+    """Người chơi ảo trong GameRoom; đứng ở chỗ của websocket (chỉ cần hashable + send)."""
+    __slots__ = ('player_id',)
+
+    def __init__(self, player_id: int):
+        self.player_id = player_id
+
+    async def send(self, frame):
+        pass
+
+    def __repr__(self):
+        return f'BotPlayer({self.player_id})'
+
+
+class BotBrain:
+    def __init__(self, max_models: int = MAX_MODELS, epsilon: float = EPSILON, use_numpy: bool = True,
+                 seed: int | None = None):
+        self.max_models = max_models
+        self.epsilon = epsilon
+        self.use_numpy = use_numpy and np is not None
+        self.slots = OrderedDict()      # khóa người chơi -> slot (thứ tự LRU)
+        self.context = []               # slot -> ngữ cảnh hiện tại
+        self.pending = []               # (slot, ngữ cảnh, nước của người) chờ áp dụng ở tick sau
+        self.rnd = random.Random(seed)
+        self.stats = {'predictions': 0, 'updates': 0, 'evictions': 0}
+        if self.use_numpy:
+            self.rng = np.random.default_rng(seed)
+            self.payoff = np.array(PAYOFF, dtype=np.float32)
+            self.counts = np.zeros((0, CONTEXTS, 3), dtype=np.float32)
+            self.freq = np.zeros((0, 3), dtype=np.float32)
+        else:
+            self.counts = []            # slot -> CONTEXTS * 3 số đếm (phẳng)
+            self.freq = []              # slot -> 3 số đếm
+
+    def __len__(self):
+        return len(self.slots)
+
+    def slot(self, key) -> int:
+        """Slot mô hình của người chơi; người ít dùng nhất bị quên khi đã đủ max_models"""
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.slots.move_to_end(key)
+            return slot
+        if len(self.slots) >= self.max_models:
+            _, slot = self.slots.popitem(last=False)
+            self.stats['evictions'] += 1
+            self.pending = [u for u in self.pending if u[0] != slot]
+            self._clear(slot)
+        else:
+            slot = len(self.slots)
+            self._grow(slot + 1)
+        self.slots[key] = slot
+        return slot
+
+    def _grow(self, size: int):
+        if self.use_numpy:
+            if size > len(self.counts):
+                capacity = min(self.max_models, max(size, 2 * len(self.counts), 64))
+                counts = np.zeros((capacity, CONTEXTS, 3), dtype=np.float32)
+                freq = np.zeros((capacity, 3), dtype=np.float32)
+                counts[:len(self.counts)] = self.counts
+                freq[:len(self.freq)] = self.freq
+                self.counts, self.freq = counts, freq
+        else:
+            while len(self.counts) < size:
+                self.counts.append([0.0] * (CONTEXTS * 3))
+                self.freq.append([0.0] * 3)
+        while len(self.context) < size:
+            self.context.append(NO_CONTEXT)
+
+    def _clear(self, slot: int):
+        if self.use_numpy:
+            self.counts[slot] = 0
+            self.freq[slot] = 0
+        else:
+            self.counts[slot] = [0.0] * (CONTEXTS * 3)
+            self.freq[slot] = [0.0] * 3
+        self.context[slot] = NO_CONTEXT
+
+    def observe(self, key, human_move: str, bot_move: str):
+        """Ghi nhận một ván; mô hình được cập nhật (theo lô) ở lần choose kế tiếp"""
+        slot = self.slot(key)
+        h, b = MOVE_INDEX[human_move], MOVE_INDEX[bot_move]
+        self.pending.append((slot, self.context[slot], h))
+        self.context[slot] = 3 * h + b
+
+    def _apply_pending(self):
+        pending, self.pending = self.pending, []
+        self.stats['updates'] += len(pending)
+        if self.use_numpy and pending:
+            slots, ctx, h = (np.array(column, dtype=np.intp) for column in zip(*pending))
+            if len(np.unique(slots)) == len(slots):
+                self.counts[slots] *= DECAY
+                self.freq[slots] *= DECAY
+                self.counts[slots, ctx, h] += 1.0
+                self.freq[slots, h] += 1.0
+                return
+            # Hiếm: một người có hai ván trong cùng một tick -> áp dụng lần lượt
+            for slot, c, move in pending:
+                self.counts[slot] *= DECAY
+                self.freq[slot] *= DECAY
+                self.counts[slot, c, move] += 1.0
+                self.freq[slot, move] += 1.0
+            return
+        for slot, ctx, h in pending:
+            counts, freq = self.counts[slot], self.freq[slot]
+            for i in range(len(counts)):
+                counts[i] *= DECAY
+            for i in range(3):
+                freq[i] *= DECAY
+            counts[3 * ctx + h] += 1.0
+            freq[h] += 1.0
+
+    def choose(self, keys: list) -> list:
+        """Nước đi của bot cho từng người chơi trong `keys` (một lô mỗi tick)"""
+        self._apply_pending()
+        if not keys:
+            return []
+        self.stats['predictions'] += len(keys)
+        slots = [self.slot(key) for key in keys]
+        if self.use_numpy:
+            idx = np.fromiter(slots, dtype=np.intp, count=len(slots))
+            ctx = np.fromiter((self.context[s] for s in slots), dtype=np.intp, count=len(slots))
+            # Phân phối nước tiếp theo của người -> điểm kỳ vọng của từng nước bot
+            belief = self.counts[idx, ctx] + FREQ_WEIGHT * self.freq[idx] + PRIOR
+            expected = belief @ self.payoff
+            expected += self.rng.random(expected.shape, dtype=np.float32) * 1e-3   # hòa thì chọn ngẫu nhiên
+            moves = expected.argmax(axis=1)
+            explore = self.rng.random(len(slots)) < self.epsilon
+            moves[explore] = self.rng.integers(0, 3, int(explore.sum()))
+            return [MOVES[m] for m in moves.tolist()]
+        out = []
+        for s in slots:
+            if self.rnd.random() < self.epsilon:
+                out.append(self.rnd.choice(MOVES))
+                continue
+            base = 3 * self.context[s]
+            counts, freq = self.counts[s], self.freq[s]
+            belief = [counts[base + h] + FREQ_WEIGHT * freq[h] + PRIOR for h in range(3)]
+            expected = [sum(belief[h] * PAYOFF[h][m] for h in range(3)) + self.rnd.random() * 1e-3
+                        for m in range(3)]
+            out.append(MOVES[max(range(3), key=expected.__getitem__)])
+        return out
@@ -0,0 +1,130 @@
+"""Nhật ký sự kiện dạng JSON lines, ghi từ một thread nền.
+
+Event loop chỉ kiểm tra mức / lấy mẫu rồi đặt bản ghi (tuple, chưa định dạng) vào hàng đợi có
+giới hạn; thread nền mới dựng JSON và ghi ra stdout / file theo lô. stdout chậm hay bị chuyển
+hướng chỉ làm đầy hàng đợi: bản ghi đến sau bị bỏ và đếm, không bao giờ chặn các phòng.
+
+Mỗi dòng: {"ts": ..., "level": ..., "cat": ..., "event": ..., <các trường>}. Mỗi nhóm (cat) có thể
+lấy mẫu riêng, vd. {'chat': 0.1, 'game': 0.5} giữ 10% tin chat và một nửa kết quả ván.
+"""
+import json
+import queue
+import random
+import sys
+import threading
+import time
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+LOG_QUEUE = 10_000            # số bản ghi tối đa chờ ghi
+WRITE_BATCH = 256             # số bản ghi tối đa gộp vào một lần write
+
+
+def parse_sampling(spec: str) -> dict:
+    """'chat=0.1,game=0.5' -> {'chat': 0.1, 'game': 0.5} (chuỗi rỗng = giữ hết)"""
+    sampling = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        category, _, rate = item.partition('=')
+        rate = float(rate)
+        if not category or not 0.0 <= rate <= 1.0:
+            raise ValueError(f"tỉ lệ lấy mẫu không hợp lệ: {item!r}")
+        sampling[category] = rate
+    return sampling
+
+
+class EventLog:
+    def __init__(self, path: str | None = None, level: str = 'info', sampling: dict | None = None,
+                 queue_size: int = LOG_QUEUE, stream=None):
+        if level not in LEVELS:
+            raise ValueError(f"mức log không hợp lệ: {level!r}")
+        self.path = path                # None = ghi ra `stream` (mặc định sys.stdout)
+        self.stream = stream
+        self.level = LEVELS[level]
+        self.sampling = dict(sampling or {})
+        self.queue = queue.Queue(queue_size)
+        self.thread = None              # chỉ tạo khi có bản ghi đầu tiên
+        self.written = 0                # do thread nền tăng
+        self.dropped = 0                # hàng đợi đầy
+        self.sampled_out = 0            # bị bỏ do lấy mẫu
+
+    def stats(self) -> dict:
+        return {'written': self.written, 'dropped': self.dropped, 'sampled_out': self.sampled_out}
+
+    def wants(self, level: str, category: str) -> bool:
+        """Bản ghi này có được giữ không (mức + lấy mẫu); gọi trước khi dựng các trường tốn kém"""
+        if LEVELS[level] < self.level:
+            return False
+        rate = self.sampling.get(category)
+        if rate is not None and rate < 1.0 and random.random() >= rate:
+            self.sampled_out += 1
+            return False
+        return True
+
+    def emit(self, level: str, category: str, event: str, fields: dict):
+        """Đặt bản ghi vào hàng đợi (không chờ); các trường phải là giá trị sẽ không đổi về sau"""
+        try:
+            self.queue.put_nowait((time.time(), level, category, event, fields))
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='eventlog', daemon=True)
+            self.thread.start()
+
+    def log(self, level: str, category: str, event: str, **fields):
+        if self.wants(level, category):
+            self.emit(level, category, event, fields)
+
+    def debug(self, category: str, event: str, **fields):
+        self.log('debug', category, event, **fields)
+
+    def info(self, category: str, event: str, **fields):
+        self.log('info', category, event, **fields)
+
+    def warning(self, category: str, event: str, **fields):
+        self.log('warning', category, event, **fields)
+
+    def error(self, category: str, event: str, **fields):
+        self.log('error', category, event, **fields)
+
+    def _run(self):
+        out = open(self.path, 'a', encoding='utf-8') if self.path else None
+        try:
+            while True:
+                batch = [self.queue.get()]
+                while len(batch) < WRITE_BATCH:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is None
+                lines = []
+                for record in batch:
+                    if record is None:
+                        continue
+                    ts, level, category, event, fields = record
+                    lines.append(json.dumps({'ts': round(ts, 3), 'level': level, 'cat': category, 'event': event,
+                                             **fields}, ensure_ascii=False, default=repr))
+                if lines:
+                    stream = out or self.stream or sys.stdout
+                    try:
+                        stream.write('\n'.join(lines) + '\n')
+                        stream.flush()
+                        self.written += len(lines)
+                    except (OSError, ValueError):
+                        self.dropped += len(lines)
+                if stop:
+                    return
+        finally:
+            if out is not None:
+                out.close()
+
+    def close(self, timeout: float = 2.0):
+        """Ghi nốt các bản ghi đang chờ rồi dừng thread nền (quá `timeout` giây thì bỏ)"""
+        thread, self.thread = self.thread, None
+        if thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
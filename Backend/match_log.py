@@ -0,0 +1,381 @@
+"""Nhật ký ván đấu dạng nhị phân, chỉ ghi nối (append-only), chia segment.
+
+Mỗi người chơi trong một ván là một bản ghi 64 byte cố định (RECORD):
+thời điểm, round_id, phòng, player_id, thời lượng ván, tên (32 byte, cắt bớt),
+lựa chọn, có bị tự chọn khi hết giờ không, kết quả, số ván thắng trong series,
+best_of và cờ (series kết thúc / hết giờ / thắng series). Các bản ghi của cùng
+một ván luôn nằm liền nhau.
+
+- Ghi: struct.pack_into thẳng vào một bytearray cấp sẵn, đầy thì chuyển xuống một
+  thread riêng để ghi ra file (page cache, không fsync); không tạo dict cho từng trường.
+  Mọi thao tác file (ghi, mở segment, đọc lịch sử) chạy tuần tự trên thread đó, không
+  chặn event loop.
+- Segment: `matches-000001.log`, ... đầy SEGMENT_RECORDS bản ghi thì mở file mới.
+- Đọc: MatchLogReader mmap từng segment và giải mã bằng Struct.iter_unpack để quét /
+  lọc hàng triệu ván; chạy trực tiếp để phân tích:
+      python match_log.py match_logs --player An --limit 20
+- get_match_history dùng chỉ mục trong RAM: tên -> vị trí các bản ghi gần nhất.
+"""
+import asyncio
+import mmap
+import os
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+RECORD = struct.Struct('<dIIII32sBBBBBBxx')
+RECORD_SIZE = RECORD.size                 # 64
+HEADER = b'RPSLOG1\0' + struct.pack('<II', RECORD_SIZE, 0)
+HEADER_SIZE = len(HEADER)                 # 16
+SEGMENT_RECORDS = 1 << 20                 # ~64 MB mỗi segment
+BUFFER_RECORDS = 1024                     # bản ghi gom trong RAM trước khi ghi xuống file
+FLUSH_INTERVAL = 1.0                      # giây; bản ghi chưa đầy buffer cũng được ghi sau chừng này
+HISTORY_PER_PLAYER = 200                  # số ván gần nhất mỗi người chơi giữ trong chỉ mục
+INDEX_SEGMENTS = 4                        # số segment mới nhất được quét để dựng lại chỉ mục khi khởi động
+NAME_BYTES = 32
+
+CHOICES = (None, 'rock', 'paper', 'scissors')
+CHOICE_CODES = {c: i for i, c in enumerate(CHOICES)}
+RESULTS = (None, 'win', 'lose', 'draw')
+RESULT_CODES = {r: i for i, r in enumerate(RESULTS)}
+FLAG_SERIES_OVER = 1
+FLAG_TIMED_OUT = 2
+FLAG_SERIES_WINNER = 4
+
+# Vị trí các trường trong tuple giải mã
+(F_TS, F_ROUND, F_ROOM, F_PLAYER, F_DURATION, F_NAME, F_CHOICE, F_AUTO, F_RESULT,
+ F_SERIES_WINS, F_BEST_OF, F_FLAGS) = range(12)
+
+
+def name_key(name: str) -> bytes:
+    """Tên đúng như được lưu trong bản ghi (UTF-8, tối đa 32 byte)"""
+    return name.encode('utf-8')[:NAME_BYTES]
+
+
+def decode(record: tuple) -> dict:
+    """Bản ghi -> dict cho client / phân tích (chỉ dùng ở đường đọc)"""
+    flags = record[F_FLAGS]
+    return {
+        'round_id': record[F_ROUND],
+        'time': record[F_TS],
+        'room_id': f'{record[F_ROOM]:08x}',
+        'player_id': record[F_PLAYER],
+        'name': record[F_NAME].rstrip(b'\0').decode('utf-8', 'ignore'),
+        'choice': CHOICES[record[F_CHOICE]],
+        'auto_picked': bool(record[F_AUTO]),
+        'result': RESULTS[record[F_RESULT]],
+        'series_wins': record[F_SERIES_WINS],
+        'best_of': record[F_BEST_OF],
+        'series_over': bool(flags & FLAG_SERIES_OVER),
+        'timed_out': bool(flags & FLAG_TIMED_OUT),
+        'series_winner': bool(flags & FLAG_SERIES_WINNER),
+        'duration_ms': record[F_DURATION],
+    }
+
+
+def segment_path(directory: str, number: int) -> str:
+    return os.path.join(directory, f'matches-{number:06d}.log')
+
+
+def list_segments(directory: str) -> list:
+    numbers = []
+    for name in os.listdir(directory):
+        if name.startswith('matches-') and name.endswith('.log'):
+            try:
+                numbers.append(int(name[8:-4]))
+            except ValueError:
+                pass
+    return sorted(numbers)
+
+
+class MatchLogReader:
+    """Đọc các segment bằng mmap (không copy file vào RAM)."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._maps = {}             # segment -> (mmap, số bản ghi) của segment đã đóng
+
+    def segments(self) -> list:
+        return list_segments(self.directory)
+
+    def _map(self, number: int):
+        with open(segment_path(self.directory, number), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= HEADER_SIZE:
+                return None, 0
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:8] != HEADER[:8]:
+            mapped.close()
+            raise ValueError(f'Segment {number} không đúng định dạng')
+        return mapped, (size - HEADER_SIZE) // RECORD_SIZE
+
+    def records(self, number: int):
+        """Duyệt mọi bản ghi của một segment (tuple thô, theo thứ tự ghi)"""
+        mapped, count = self._map(number)
+        if mapped is None:
+            return
+        try:
+            view = memoryview(mapped)[HEADER_SIZE:HEADER_SIZE + count * RECORD_SIZE]
+            try:
+                yield from RECORD.iter_unpack(view)
+            finally:
+                view.release()
+        finally:
+            mapped.close()
+
+    def count(self, number: int) -> int:
+        size = os.path.getsize(segment_path(self.directory, number))
+        return max(0, size - HEADER_SIZE) // RECORD_SIZE
+
+    def read(self, number: int, index: int) -> tuple:
+        """Đọc một bản ghi của segment đã đóng (mmap được giữ lại để đọc lần sau)"""
+        entry = self._maps.get(number)
+        if entry is None:
+            entry = self._maps[number] = self._map(number)
+        mapped, count = entry
+        if mapped is None or index >= count:
+            raise IndexError(index)
+        return RECORD.unpack_from(mapped, HEADER_SIZE + index * RECORD_SIZE)
+
+    def scan(self, player: str | None = None, room_id: str | None = None,
+             since: float | None = None, segments: list | None = None):
+        """Lọc bản ghi theo người chơi / phòng / thời điểm; trả tuple thô"""
+        key = name_key(player) if player is not None else None
+        room = int(room_id, 16) if room_id is not None else None
+        for number in (segments if segments is not None else self.segments()):
+            for record in self.records(number):
+                if key is not None and record[F_NAME].rstrip(b'\0') != key:
+                    continue
+                if room is not None and record[F_ROOM] != room:
+                    continue
+                if since is not None and record[F_TS] < since:
+                    continue
+                yield record
+
+    def close(self):
+        for mapped, _ in self._maps.values():
+            if mapped is not None:
+                mapped.close()
+        self._maps.clear()
+
+
+class MatchLog:
+    """Phía ghi: một process / một thư mục (chế độ shard: mỗi worker một thư mục con)."""
+    def __init__(self, directory: str, segment_records: int = SEGMENT_RECORDS,
+                 buffer_records: int = BUFFER_RECORDS, history: int = HISTORY_PER_PLAYER,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.buffer_records = buffer_records
+        self.history_size = history
+        self.flush_interval = flush_interval
+        self.reader = MatchLogReader(directory)
+        self.index = {}             # name_key -> deque[vị trí], vị trí = segment * segment_records + số thứ tự
+        self.next_round = 1
+        self.segment = 0            # segment đang ghi
+        self.written = 0            # số bản ghi đã giao cho thread ghi trong segment đang ghi
+        self._buffer = bytearray(buffer_records * RECORD_SIZE)
+        self._buffered = 0          # số bản ghi đang nằm trong _buffer
+        self._file = None           # chỉ dùng trên thread của _executor
+        self._flush_task = None
+        # Một thread: các lần ghi / đổi segment / đọc chạy đúng thứ tự được giao
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='match-log')
+        self.stats = {'records': 0, 'rounds': 0, 'segments': 0, 'errors': 0}
+
+    # ---- Mở / dựng lại chỉ mục ----
+    async def open(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        self._flush_task = asyncio.create_task(self.run_flusher())
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        segments = list_segments(self.directory)
+        for number in segments[-INDEX_SEGMENTS:]:
+            for i, record in enumerate(self.reader.records(number)):
+                self._index(record[F_NAME].rstrip(b'\0'), number * self.segment_records + i)
+                self.next_round = max(self.next_round, record[F_ROUND] + 1)
+        if segments:
+            self.segment = segments[-1]
+            self._open_segment(self.segment)
+            if self.written >= self.segment_records:
+                self._new_segment(self._rotate())
+        else:
+            self._new_segment(self._rotate())
+
+    def _open_segment(self, number: int):
+        path = segment_path(self.directory, number)
+        self._file = open(path, 'r+b')
+        size = os.fstat(self._file.fileno()).st_size
+        self.written = max(0, size - HEADER_SIZE) // RECORD_SIZE
+        # Bỏ phần bản ghi ghi dở (crash giữa chừng)
+        end = HEADER_SIZE + self.written * RECORD_SIZE
+        if size != end:
+            self._file.truncate(end)
+        self._file.seek(end)
+
+    def _rotate(self) -> int:
+        """Chuyển sang segment mới (phía event loop); file do _new_segment tạo trên thread ghi"""
+        self.segment += 1
+        self.written = 0
+        self.stats['segments'] += 1
+        return self.segment
+
+    def _new_segment(self, number: int):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(segment_path(self.directory, number), 'w+b')
+        self._file.write(HEADER)
+
+    def _index(self, key: bytes, position: int):
+        recent = self.index.get(key)
+        if recent is None:
+            recent = self.index[key] = deque(maxlen=self.history_size)
+        recent.append(position)
+
+    # ---- Ghi ----
+    def new_round(self) -> int:
+        round_id = self.next_round
+        self.next_round += 1
+        self.stats['rounds'] += 1
+        return round_id
+
+    def append(self, ts: float, round_id: int, room: int, player_id: int, duration_ms: int, name: bytes,
+               choice: int, auto: int, result: int, series_wins: int, best_of: int, flags: int):
+        """Ghi một bản ghi (người chơi trong một ván); các tham số đã là số / bytes"""
+        if self.written + self._buffered >= self.segment_records:
+            self.flush()
+            self._executor.submit(self._new_segment, self._rotate())
+        RECORD.pack_into(self._buffer, self._buffered * RECORD_SIZE, ts, round_id, room, player_id,
+                         duration_ms, name, choice, auto, result, series_wins, best_of, flags)
+        self._index(name, self.segment * self.segment_records + self.written + self._buffered)
+        self._buffered += 1
+        self.stats['records'] += 1
+        if self._buffered == self.buffer_records:
+            self.flush()
+
+    def flush(self):
+        """Giao phần đang gom cho thread ghi; trả Future của lần ghi (None nếu không có gì)"""
+        if not self._buffered:
+            return None
+        data = bytes(memoryview(self._buffer)[:self._buffered * RECORD_SIZE])
+        self.written += self._buffered
+        self._buffered = 0
+        return self._executor.submit(self._write, data)
+
+    def _write(self, data: bytes):
+        try:
+            self._file.write(data)
+            self._file.flush()
+        except OSError:
+            self.stats['errors'] += 1
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            pending = self.flush()
+            if pending is not None:
+                await asyncio.wrap_future(pending)
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=True)
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.reader.close()
+
+    # ---- Đọc cho get_match_history ----
+    async def rounds(self, positions: list) -> list:
+        """[(bản ghi ở position, mọi bản ghi của ván đó)] cho từng vị trí; đọc file trên thread ghi"""
+        # Chụp lại phần chưa ghi trên event loop: thread chỉ đọc bản chụp, không đụng _buffer
+        tail = (self.segment, self.written, bytes(memoryview(self._buffer)[:self._buffered * RECORD_SIZE]))
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, lambda: [(self.read(p, tail), self.round_records(p, tail)) for p in positions])
+
+    def read(self, position: int, tail: tuple) -> tuple:
+        """Đọc một bản ghi; tail = (segment, written, bytes chưa ghi) chụp lúc giao việc"""
+        segment, written, pending = tail
+        number, index = divmod(position, self.segment_records)
+        if position < 0 or number > segment:
+            raise IndexError(position)
+        if number == segment:
+            if index >= written + len(pending) // RECORD_SIZE:
+                raise IndexError(position)
+            if index >= written:
+                return RECORD.unpack_from(pending, (index - written) * RECORD_SIZE)
+            # Segment đang ghi: file còn lớn dần nên đọc thẳng bằng pread thay vì mmap
+            data = os.pread(self._file.fileno(), RECORD_SIZE, HEADER_SIZE + index * RECORD_SIZE)
+            return RECORD.unpack(data)
+        return self.reader.read(number, index)
+
+    def round_records(self, position: int, tail: tuple) -> list:
+        """Mọi bản ghi của ván chứa `position` (các bản ghi một ván nằm liền nhau)"""
+        record = self.read(position, tail)
+        records = [record]
+        for step in (-1, 1):
+            p = position + step
+            while True:
+                try:
+                    other = self.read(p, tail)
+                except (IndexError, struct.error, OSError):
+                    break
+                if other[F_ROUND] != record[F_ROUND]:
+                    break
+                if step > 0:
+                    records.append(other)
+                else:
+                    records.insert(0, other)
+                p += step
+        return records
+
+    def history(self, name: str, limit: int, before: int | None = None) -> tuple:
+        """Vị trí các ván gần nhất của người chơi (mới trước) và con trỏ trang sau"""
+        recent = self.index.get(name_key(name))
+        if not recent:
+            return [], None
+        positions = []
+        for position in reversed(recent):
+            if before is not None and position >= before:
+                continue
+            if len(positions) == limit:
+                return positions, positions[-1]
+            positions.append(position)
+        return positions, None
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Quét / lọc nhật ký ván đấu')
+    parser.add_argument('directory', nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                      'match_logs'))
+    parser.add_argument('--player', help='lọc theo tên người chơi')
+    parser.add_argument('--room', help='lọc theo room_id')
+    parser.add_argument('--since', type=float, help='chỉ lấy ván sau thời điểm (unix time)')
+    parser.add_argument('--limit', type=int, default=20, help='số bản ghi in ra (0 = chỉ đếm)')
+    args = parser.parse_args()
+
+    reader = MatchLogReader(args.directory)
+    started = time.perf_counter()
+    matched = scanned = 0
+    shown = []
+    for number in reader.segments():
+        for record in reader.scan(args.player, args.room, args.since, segments=[number]):
+            matched += 1
+            if len(shown) < args.limit:
+                shown.append(record)
+        scanned += reader.count(number)
+    elapsed = time.perf_counter() - started
+    for record in shown:
+        print(decode(record))
+    rate = scanned / elapsed if elapsed > 0 else 0
+    print(f"{matched:,} / {scanned:,} bản ghi khớp, {elapsed:.2f}s ({rate:,.0f} bản ghi/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Hàng đợi ghép trận nhanh (quick_match).
+
+Người chơi được chia vào các "bucket" theo trình độ tính từ thành tích thắng/thua.
+Mỗi bucket là một hàng đợi FIFO; danh sách bucket đang có người chờ được giữ
+sắp xếp để tìm bucket lân cận bằng bisect (O(log số bucket)). Khoảng trình độ
+chấp nhận của một người rộng dần theo thời gian chờ, nên ai chờ đủ lâu cũng
+sẽ được ghép.
+"""
+from bisect import bisect_left, insort
+from collections import deque
+
+SKILL_BUCKETS = 10          # số bucket trình độ (0 = yếu nhất)
+WIDEN_SECONDS = 2.0         # cứ chờ thêm chừng này giây thì nới thêm 1 bucket mỗi phía
+
+
+def skill_of(record: dict | None) -> float:
+    """Tỉ lệ thắng đã làm mượt (0..1); người mới = 0.5. Hòa không tính."""
+    if not record:
+        return 0.5
+    wins, losses = record.get('wins', 0), record.get('losses', 0)
+    return (wins + 1) / (wins + losses + 2)
+
+
+def bucket_of(skill: float, buckets: int = SKILL_BUCKETS) -> int:
+    return min(buckets - 1, max(0, int(skill * buckets)))
+
+
+class MatchTicket:
+    __slots__ = ('player', 'bucket', 'enqueued_at', 'active')
+
+    def __init__(self, player, bucket: int, enqueued_at: float):
+        self.player = player
+        self.bucket = bucket
+        self.enqueued_at = enqueued_at
+        self.active = True          # False = đã hủy / đã ghép (gỡ lười khỏi deque)
+
+
+class MatchQueue:
+    def __init__(self, by_skill: bool = True, widen_seconds: float = WIDEN_SECONDS,
+                 buckets: int = SKILL_BUCKETS):
+        self.by_skill = by_skill
+        self.widen_seconds = widen_seconds
+        self.max_window = buckets - 1
+        self.queues = {}            # bucket -> deque[MatchTicket], phần tử đầu luôn còn hiệu lực
+        self.keys = []              # các bucket đang có người chờ, đã sắp xếp
+        self.tickets = {}           # player -> MatchTicket
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def __contains__(self, player):
+        return player in self.tickets
+
+    def window(self, ticket: MatchTicket, now: float) -> int:
+        """Số bucket mỗi phía mà ticket chấp nhận sau thời gian đã chờ"""
+        return min(self.max_window, int((now - ticket.enqueued_at) / self.widen_seconds))
+
+    def _take(self, ticket: MatchTicket):
+        """Gỡ ticket; dọn các ticket hết hiệu lực ở đầu bucket và bucket rỗng"""
+        ticket.active = False
+        del self.tickets[ticket.player]
+        queue = self.queues[ticket.bucket]
+        while queue and not queue[0].active:
+            queue.popleft()
+        if not queue:
+            del self.queues[ticket.bucket]
+            del self.keys[bisect_left(self.keys, ticket.bucket)]
+
+    def _nearest(self, bucket: int, window: int, now: float, exclude=None) -> MatchTicket | None:
+        """Ticket ở bucket gần nhất mà hai bên cùng chấp nhận (window của ai rộng hơn thì tính)"""
+        i = bisect_left(self.keys, bucket)
+        lo, hi = i - 1, i
+        while lo >= 0 or hi < len(self.keys):
+            # Đi dần ra hai phía, ưu tiên bucket gần hơn
+            if hi < len(self.keys) and (lo < 0 or self.keys[hi] - bucket <= bucket - self.keys[lo]):
+                key, hi = self.keys[hi], hi + 1
+            else:
+                key, lo = self.keys[lo], lo - 1
+            distance = abs(key - bucket)
+            if distance > self.max_window:
+                break
+            head = self.queues[key][0]
+            if head is exclude:
+                head = next((t for t in self.queues[key] if t.active and t is not exclude), None)
+            if head is not None and distance <= max(window, self.window(head, now)):
+                return head
+        return None
+
+    def push(self, player, skill: float, now: float) -> MatchTicket | None:
+        """Thêm người chơi; trả về ticket của đối thủ nếu ghép được ngay (cả hai rời hàng đợi)."""
+        if player in self.tickets:
+            return None
+        bucket = bucket_of(skill, self.max_window + 1) if self.by_skill else 0
+        partner = self._nearest(bucket, 0, now)
+        if partner is not None:
+            self._take(partner)
+            return partner
+        ticket = MatchTicket(player, bucket, now)
+        self.tickets[player] = ticket
+        if bucket not in self.queues:
+            self.queues[bucket] = deque()
+            insort(self.keys, bucket)
+        self.queues[bucket].append(ticket)
+        return None
+
+    def cancel(self, player) -> MatchTicket | None:
+        ticket = self.tickets.get(player)
+        if ticket is not None:
+            self._take(ticket)
+        return ticket
+
+    def sweep(self, now: float) -> list:
+        """Ghép lại theo khoảng đã nới rộng; trả về [(ticket chờ lâu hơn, đối thủ)]"""
+        pairs = []
+        for key in list(self.keys):
+            queue = self.queues.get(key)
+            if not queue:
+                continue
+            head = queue[0]
+            partner = self._nearest(key, self.window(head, now), now, exclude=head)
+            if partner is not None:
+                self._take(head)
+                self._take(partner)
+                pairs.append((head, partner))
+        return pairs
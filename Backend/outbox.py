@@ -0,0 +1,134 @@
+"""Hàng đợi gửi có giới hạn cho một kết nối, với một task ghi riêng.
+
+Người gọi chỉ đặt frame (đã mã hóa sẵn) vào hàng đợi, không bao giờ chờ socket; task ghi
+chỉ tồn tại khi hàng đợi còn frame. Mỗi frame thuộc một nhóm:
+- None: phải tới nơi (kết quả ván, trả lời yêu cầu, vào / rời phòng...), không bao giờ bị bỏ;
+- tên nhóm ('lobby', 'room'): cập nhật có thể thay bằng trạng thái mới nhất.
+
+Khi hàng đợi vượt `limit`, mọi frame thuộc nhóm bị bỏ. Nhóm có hàm đồng bộ lại (`resync`)
+được thay bằng một frame giữ chỗ ở cuối hàng đợi, chỉ dựng (trạng thái lúc gửi) khi tới lượt;
+frame cùng nhóm đến sau trong lúc chờ được gộp luôn vào đó. Nếu chỉ còn frame bắt buộc mà
+vẫn vượt `limit` suốt `grace` giây (hoặc vượt `limit * HARD_LIMIT_FACTOR`), kết nối bị coi là
+đứng hẳn và `on_overflow` được gọi để ngắt.
+"""
+import asyncio
+from collections import Counter, deque
+
+HARD_LIMIT_FACTOR = 4         # quá số frame bắt buộc này thì ngắt ngay, không chờ hết grace
+
+
+class Outbox:
+    __slots__ = ('websocket', 'session', 'limit', 'grace', 'resync', 'on_overflow', 'on_error', 'frames',
+                 'pending', 'over_since', 'timer', 'task', 'closed', 'stats')
+
+    def __init__(self, websocket, limit: int, grace: float, resync: dict | None = None,
+                 on_overflow=None, on_error=None, stats: Counter | None = None, session=None):
+        self.websocket = websocket
+        self.session = websocket if session is None else session   # khóa của người nhận phía server
+        self.limit = limit              # số frame tối đa chờ gửi
+        self.grace = grace              # giây được phép vượt limit (chỉ còn frame bắt buộc)
+        self.resync = resync or {}      # nhóm -> (session) -> frame đồng bộ lại (hoặc None = không cần)
+        self.on_overflow = on_overflow  # (outbox) -> None: kết nối đứng quá lâu
+        self.on_error = on_error        # (session, type, lỗi) -> None: gửi thất bại
+        self.frames = deque()           # (frame | None = giữ chỗ, nhóm, type)
+        self.pending = set()            # nhóm đang có frame giữ chỗ trong hàng đợi
+        self.over_since = None          # thời điểm bắt đầu vượt limit
+        self.timer = None
+        self.task = None
+        self.closed = False
+        self.stats = stats if stats is not None else Counter()   # có thể dùng chung cho mọi kết nối
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, frame, group: str | None = None, kind: str | None = None):
+        """Đặt frame vào hàng đợi (không chờ)"""
+        if self.closed:
+            return
+        if group in self.pending:
+            self.stats['conflated'] += 1    # frame giữ chỗ sẽ mang trạng thái mới hơn
+            return
+        self.frames.append((frame, group, kind))
+        if len(self.frames) > self.limit:
+            self._shed()
+            if self.closed:
+                return
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    def _shed(self):
+        """Bỏ mọi frame có nhóm; nhóm có resync được thay bằng một frame giữ chỗ"""
+        kept = deque()
+        shed = Counter()
+        for entry in self.frames:
+            frame, group, _ = entry
+            if group is None or frame is None:
+                kept.append(entry)
+            else:
+                shed[group] += 1
+        for group, count in shed.items():
+            self.stats[f'dropped_{group}'] += count
+            if group in self.resync:
+                kept.append((None, group, None))
+                self.pending.add(group)
+        self.frames = kept
+        if len(kept) <= self.limit:
+            return
+        if len(kept) > self.limit * HARD_LIMIT_FACTOR:
+            self._overflow()
+        elif self.over_since is None:
+            loop = asyncio.get_running_loop()
+            self.over_since = loop.time()
+            self.timer = loop.call_later(self.grace, self._check_overflow)
+
+    def _check_overflow(self):
+        self.timer = None
+        if len(self.frames) > self.limit:
+            self._overflow()
+        self.over_since = None
+
+    def _overflow(self):
+        self.stats['disconnects'] += 1
+        on_overflow = self.on_overflow
+        self.close()
+        if on_overflow is not None:
+            on_overflow(self)
+
+    async def run(self):
+        ws = self.websocket
+        kind = None
+        try:
+            while self.frames:
+                frame, group, kind = self.frames.popleft()
+                if frame is None:
+                    self.pending.discard(group)
+                    self.stats['resyncs'] += 1
+                    frame = self.resync[group](self.session)
+                    if frame is None:
+                        continue
+                await ws.send(frame)
+                self.stats['sent'] += 1
+                if self.over_since is not None and len(self.frames) <= self.limit:
+                    self.over_since = None
+                    self.timer.cancel()
+                    self.timer = None
+        except Exception as err:    # ConnectionClosed hoặc lỗi socket: bỏ phần còn lại
+            self.stats['errors'] += 1
+            self.frames.clear()
+            self.closed = True
+            if self.on_error is not None:
+                self.on_error(self.session, kind, err)
+        finally:
+            self.task = None
+
+    def close(self):
+        """Bỏ mọi frame chưa gửi và dừng task ghi; các lần put sau bị bỏ qua"""
+        self.closed = True
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.frames.clear()
+        self.pending.clear()
@@ -0,0 +1,104 @@
+"""Mật khẩu phòng: băm bằng KDF có salt (scrypt) trong thread pool riêng, không chạy trên event loop.
+
+Mỗi lần băm / kiểm tra tốn vài chục ms CPU (cố ý, để dò mật khẩu tốn kém); hashlib.scrypt nhả GIL nên
+event loop vẫn phục vụ các phòng khác. Pool có giới hạn: quá `max_pending` việc đang chờ / đang chạy
+thì từ chối ngay (người gọi báo máy chủ bận) thay vì xếp hàng vô hạn. Lần kiểm tra đúng gần đây được
+nhớ theo (phòng, người chơi) trong một LRU nhỏ để vào lại phòng không phải băm lại.
+
+Định dạng lưu: 'scrypt$n$r$p$salt$key' (hex, ~120 ký tự, vừa trường hash của snapshot). Hash cũ
+(sha256 hex không salt, từ snapshot trước đây) vẫn kiểm tra được.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEME = 'scrypt'
+SCRYPT_N = 2 ** 14            # ~16 MiB, ~60 ms mỗi lần trên một nhân
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def hash_password(plain: str, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P) -> str:
+    salt = os.urandom(SALT_BYTES)
+    key = hashlib.scrypt(plain.encode('utf-8'), salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES)
+    return f'{SCHEME}${n}${r}${p}${salt.hex()}${key.hex()}'
+
+
+def verify_password(plain: str, stored: str) -> bool:
+    if '$' not in stored:
+        # Hash cũ: sha256 hex không salt
+        return hmac.compare_digest(hashlib.sha256(plain.encode('utf-8')).hexdigest(), stored)
+    try:
+        scheme, n, r, p, salt, key = stored.split('$')
+        if scheme != SCHEME:
+            return False
+        key = bytes.fromhex(key)
+        got = hashlib.scrypt(plain.encode('utf-8'), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p),
+                             dklen=len(key))
+    except ValueError:
+        return False
+    return hmac.compare_digest(got, key)
+
+
+class PasswordPool:
+    """Thread pool giới hạn cho băm / kiểm tra mật khẩu, kèm LRU các lần kiểm tra đúng gần đây.
+
+    hash() / verify() trả về None khi pool đã đủ `max_pending` việc (người gọi báo bận)."""
+    def __init__(self, workers: int, max_pending: int, cache_size: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0                # việc đã gửi vào pool chưa xong
+        self.cache_size = cache_size
+        self.verified = OrderedDict()   # (room_id, player_id) -> hash đã khớp
+        self.stats = Counter()          # hashed / verified / wrong / cached / busy / locked
+        self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.stats['busy'] += 1
+            return None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='rps-password')
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, plain: str) -> str | None:
+        stored = await self._run(hash_password, plain)
+        if stored is not None:
+            self.stats['hashed'] += 1
+        return stored
+
+    async def verify(self, plain: str, stored: str) -> bool | None:
+        ok = await self._run(verify_password, plain, stored)
+        if ok is not None:
+            self.stats['verified' if ok else 'wrong'] += 1
+        return ok
+
+    def is_verified(self, room_id: str, player_id: int, stored: str) -> bool:
+        """Người chơi đã nhập đúng mật khẩu hiện tại của phòng gần đây (đổi mật khẩu thì không còn khớp)"""
+        key = (room_id, player_id)
+        if self.verified.get(key) != stored:
+            return False
+        self.verified.move_to_end(key)
+        self.stats['cached'] += 1
+        return True
+
+    def remember(self, room_id: str, player_id: int, stored: str):
+        key = (room_id, player_id)
+        self.verified[key] = stored
+        self.verified.move_to_end(key)
+        if len(self.verified) > self.cache_size:
+            self.verified.popitem(last=False)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,80 @@
+"""Giới hạn tốc độ tin nhắn của từng kết nối bằng token bucket.
+
+Mỗi kết nối có một bucket chung cho mọi tin nhắn và (khi cần) một bucket riêng cho từng
+loại có giới hạn riêng. Loại tin nhắn được đoán từ đầu frame (client luôn gửi 'type' là
+khóa đầu tiên) để tin nhắn vượt giới hạn bị bỏ trước khi giải mã JSON.
+"""
+import re
+
+_TYPE_RE = re.compile(r'\{\s*"type"\s*:\s*"([a-z_]{1,32})"')
+PEEK_BYTES = 48               # chỉ xem chừng này ký tự đầu frame
+
+
+def peek_type(message: str | bytes) -> str | None:
+    """'type' của tin nhắn client mà không giải mã cả frame; None nếu không nhận ra
+    (khi đó chỉ bucket chung được kiểm tra trước, bucket theo loại kiểm tra sau khi giải mã)"""
+    head = message[:PEEK_BYTES]
+    if isinstance(head, bytes):
+        if not head or head[0] != 0:     # frame nhị phân: chỉ loại JSON (byte 0) có 'type' ở đầu
+            return None
+        head = head[1:].decode('utf-8', 'replace')
+    match = _TYPE_RE.match(head)
+    return match.group(1) if match else None
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate              # token / giây
+        self.burst = burst            # số token tối đa dồn được
+        self.tokens = burst
+        self.stamp = now
+
+    def take(self, now: float) -> bool:
+        tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if tokens >= 1.0:
+            self.tokens = tokens - 1.0
+            return True
+        self.tokens = tokens
+        return False
+
+    def refund(self):
+        """Trả lại token vừa lấy (lần đó hóa ra không tính)"""
+        self.tokens = min(self.burst, self.tokens + 1.0)
+
+
+class RateLimiter:
+    """Giới hạn của một kết nối. limits: loại -> (token / giây, tối đa dồn), khóa None = mọi loại cộng lại."""
+    __slots__ = ('limits', 'total', 'by_type', 'strikes', 'strikes_since', 'warned')
+
+    def __init__(self, limits: dict, now: float):
+        self.limits = limits
+        total = limits.get(None)
+        self.total = TokenBucket(*total, now) if total else None
+        self.by_type = {}             # tạo bucket theo loại khi loại đó xuất hiện lần đầu
+        self.strikes = 0              # số tin nhắn bị từ chối trong cửa sổ hiện tại
+        self.strikes_since = now
+        self.warned = False           # đã báo lỗi cho lần vượt giới hạn này
+
+    def allow(self, message_type: str | None, now: float, charge_total: bool = True) -> bool:
+        if charge_total and self.total is not None and not self.total.take(now):
+            return False
+        if message_type is None:
+            return True
+        bucket = self.by_type.get(message_type)
+        if bucket is None:
+            limit = self.limits.get(message_type)
+            if limit is None:
+                return True
+            bucket = self.by_type[message_type] = TokenBucket(*limit, now)
+        return bucket.take(now)
+
+    def strike(self, now: float, window: float) -> int:
+        """Ghi một lần bị từ chối; trả về số lần trong cửa sổ `window` giây hiện tại"""
+        if now - self.strikes_since > window:
+            self.strikes = 0
+            self.strikes_since = now
+        self.strikes += 1
+        return self.strikes
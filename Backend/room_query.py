@@ -0,0 +1,175 @@
+"""Truy vấn danh sách phòng có lọc / sắp xếp / phân trang.
+
+Các chỉ mục phụ được cập nhật mỗi khi LobbyFeed công bố tóm tắt phòng mới,
+nên một truy vấn chỉ duyệt các phòng khớp điều kiện thay vì toàn bộ self.rooms.
+"""
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Set
+
+GAME_STATES = ('waiting', 'playing', 'finished')
+SORT_ORDERS = ('oldest', 'newest', 'name')
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def normalize_filter(raw) -> dict | None:
+    """Chuẩn hóa bộ lọc client gửi lên; bỏ các khóa không hợp lệ. None = không lọc."""
+    if not isinstance(raw, dict):
+        return None
+    flt = {}
+    if raw.get('game_state') in GAME_STATES:
+        flt['game_state'] = raw['game_state']
+    if isinstance(raw.get('has_password'), bool):
+        flt['has_password'] = raw['has_password']
+    if raw.get('joinable') is True or raw.get('not_full') is True:
+        flt['joinable'] = True
+    prefix = raw.get('name_prefix')
+    if isinstance(prefix, str) and prefix.strip():
+        flt['name_prefix'] = prefix.strip().lower()
+    return flt or None
+
+
+def filter_key(flt: dict | None) -> tuple:
+    """Khóa hashable để gom các client có cùng bộ lọc."""
+    return tuple(sorted(flt.items())) if flt else ()
+
+
+def matches(summary: dict | None, flt: dict | None) -> bool:
+    """Tóm tắt phòng có khớp bộ lọc không (None = phòng không tồn tại)."""
+    if summary is None:
+        return False
+    if not flt:
+        return True
+    if 'game_state' in flt and summary['game_state'] != flt['game_state']:
+        return False
+    if 'has_password' in flt and summary['has_password'] != flt['has_password']:
+        return False
+    if flt.get('joinable') and summary['is_full']:
+        return False
+    if 'name_prefix' in flt and not summary['room_name'].lower().startswith(flt['name_prefix']):
+        return False
+    return True
+
+
+class RoomQueryIndex:
+    """Chỉ mục phụ trên tóm tắt phòng của sảnh chờ."""
+    def __init__(self):
+        self.by_state: Dict[str, Set[str]] = {s: set() for s in GAME_STATES}
+        self.by_password: Dict[bool, Set[str]] = {True: set(), False: set()}
+        self.joinable: Set[str] = set()
+        self.seq_of: Dict[str, int] = {}      # room_id -> số thứ tự tạo phòng
+        self.seqs: List[int] = []             # đã sắp xếp tăng dần
+        self.room_at: Dict[int, str] = {}     # seq -> room_id
+        self.names: List[tuple] = []          # [(tên viết thường, room_id)] đã sắp xếp
+        self._next_seq = 0
+
+    def update(self, room_id: str, old: dict | None, new: dict | None):
+        """Cập nhật chỉ mục khi tóm tắt phòng đổi từ `old` sang `new`."""
+        # Tính khóa tên trước khi đổi gì: tóm tắt hỏng thì lỗi ngay, chỉ mục giữ nguyên
+        if old is None and new is not None:
+            name_key = (new['room_name'].lower(), room_id)
+        elif old is not None and new is None:
+            name_key = (old['room_name'].lower(), room_id)
+        if old is not None:
+            self.by_state.get(old['game_state'], set()).discard(room_id)
+            self.by_password[old['has_password']].discard(room_id)
+            self.joinable.discard(room_id)
+        if new is not None:
+            self.by_state.setdefault(new['game_state'], set()).add(room_id)
+            self.by_password[new['has_password']].add(room_id)
+            if not new['is_full']:
+                self.joinable.add(room_id)
+        if old is None and new is not None:
+            self._next_seq += 1
+            seq = self._next_seq
+            self.seq_of[room_id] = seq
+            self.seqs.append(seq)             # seq luôn tăng nên vẫn giữ thứ tự
+            self.room_at[seq] = room_id
+            insort(self.names, name_key)
+        elif old is not None and new is None:
+            seq = self.seq_of.pop(room_id)
+            del self.seqs[bisect_left(self.seqs, seq)]
+            del self.room_at[seq]
+            i = bisect_left(self.names, name_key)
+            if i < len(self.names) and self.names[i] == name_key:
+                del self.names[i]
+
+    def _candidates(self, flt: dict) -> Set[str] | None:
+        sets = []
+        if 'game_state' in flt:
+            sets.append(self.by_state.get(flt['game_state'], set()))
+        if 'has_password' in flt:
+            sets.append(self.by_password[flt['has_password']])
+        if flt.get('joinable'):
+            sets.append(self.joinable)
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = set(sets[0])
+        for other in sets[1:]:
+            result &= other
+        return result
+
+    def query(self, rooms: Dict[str, dict], flt: dict | None, sort: str = 'oldest',
+              cursor=None, limit: int = DEFAULT_PAGE_SIZE) -> tuple:
+        """Trả về (danh sách tóm tắt phòng, next_cursor). next_cursor = None khi hết trang."""
+        flt = flt or {}
+        sort = sort if sort in SORT_ORDERS else 'oldest'
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        candidates = self._candidates(flt)
+        prefix = flt.get('name_prefix')
+        if sort == 'name' or prefix:
+            # Khoảng tên khớp prefix trong danh sách tên đã sắp xếp
+            lo = bisect_left(self.names, (prefix,)) if prefix else 0
+            hi = bisect_right(self.names, (prefix + '\uffff',)) if prefix else len(self.names)
+
+        ids = []
+        if sort == 'name':
+            if isinstance(cursor, str) and '\t' in cursor:
+                name, _, rid = cursor.partition('\t')
+                lo = max(lo, bisect_right(self.names, (name, rid)))
+            for i in range(lo, hi):
+                rid = self.names[i][1]
+                if candidates is None or rid in candidates:
+                    ids.append(rid)
+                    if len(ids) > limit:
+                        break
+        else:
+            newest = sort == 'newest'
+            after = int(cursor) if isinstance(cursor, str) and cursor.isdigit() else None
+            if candidates is not None and len(candidates) <= 4 * limit:
+                seqs = sorted((self.seq_of[r] for r in candidates), reverse=newest)
+            elif prefix:
+                seqs = sorted((self.seq_of[self.names[i][1]] for i in range(lo, hi)), reverse=newest)
+            else:
+                # Duyệt thẳng theo thứ tự tạo, bắt đầu ngay sau cursor
+                if newest:
+                    start = bisect_left(self.seqs, after) if after is not None else len(self.seqs)
+                    positions = range(start - 1, -1, -1)
+                else:
+                    start = bisect_right(self.seqs, after) if after is not None else 0
+                    positions = range(start, len(self.seqs))
+                seqs = (self.seqs[i] for i in positions)
+                after = None
+            for seq in seqs:
+                if after is not None and (seq >= after if newest else seq <= after):
+                    continue
+                rid = self.room_at[seq]
+                if candidates is not None and rid not in candidates:
+                    continue
+                if prefix and not rooms[rid]['room_name'].lower().startswith(prefix):
+                    continue
+                ids.append(rid)
+                if len(ids) > limit:
+                    break
+
+        has_more = len(ids) > limit
+        page = [rooms[rid] for rid in ids[:limit]]
+        next_cursor = None
+        if has_more and page:
+            last = page[-1]
+            if sort == 'name':
+                next_cursor = f"{last['room_name'].lower()}\t{last['room_id']}"
+            else:
+                next_cursor = str(self.seq_of[last['room_id']])
+        return page, next_cursor
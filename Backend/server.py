@@ -3,208 +3,683 @@ import websockets
 import json
 import random
 import uuid
-import hashlib
+import gc
+import os
+import secrets
+import signal
+import time
+from collections import Counter, deque
+from http import HTTPStatus
 from typing import Dict, List, Set
+from urllib.parse import parse_qs, urlsplit
+
+from room_query import RoomQueryIndex, normalize_filter, filter_key, matches
+from metrics import Registry, FANOUT_BUCKETS, WAIT_BUCKETS
+from timer_wheel import TimerWheel
+from matchmaking import MatchQueue, skill_of
+from stats_store import StatsStore, TOP_K
+from match_log import (MatchLog, CHOICE_CODES, RESULT_CODES, FLAG_SERIES_OVER, FLAG_TIMED_OUT,
+                       FLAG_SERIES_WINNER, F_PLAYER, decode, name_key)
+import wire
+from bots import BotBrain, BotPlayer, BOT_NAME
+from outbox import Outbox
+from ratelimit import RateLimiter, TokenBucket, peek_type
+from eventlog import EventLog, LEVELS, LOG_QUEUE, parse_sampling
+from snapshot import SnapshotStore, RestoredSeat, BLOCK_FULL, BLOCK_DELTA, encode_room, encode_block
+from passwords import PasswordPool
+
+# Hàng đợi gửi riêng từng kết nối: handler chỉ xếp frame, không chờ socket của ai
+SEND_QUEUE = 64               # frame tối đa chờ gửi cho một kết nối; vượt thì bỏ / gộp cập nhật sảnh chờ, phòng đang xem
+SLOW_CLIENT_GRACE = 10.0      # giây được phép vượt SEND_QUEUE bằng frame bắt buộc (kết quả ván...) trước khi bị ngắt
+LOBBY_POLICIES = ('conflate', 'drop')
+LOBBY_POLICY = 'conflate'     # hàng đợi đầy: 'conflate' = gửi lại sảnh mới nhất, 'drop' = bỏ (client thấy lệch version tự tải lại)
+
+# Giới hạn tin nhắn client: token bucket theo kết nối (khóa None = mọi loại) và theo loại tốn kém / dễ spam
+RATE_LIMITS = {               # loại -> (token / giây, tối đa dồn)
+    None: (20.0, 40),
+    'get_rooms': (2.0, 5), 'subscribe_rooms': (2.0, 5), 'get_room': (2.0, 5),
+    'get_leaderboard': (1.0, 3), 'get_match_history': (2.0, 5),
+    'create_room': (1.0, 3), 'join_room': (2.0, 5), 'play_bot': (1.0, 3), 'spectate': (2.0, 5),
+    'quick_match': (1.0, 3), 'chat': (1.0, 5), 'set_name': (0.5, 3), 'ping': (1.0, 5),
+}
+RATE_STRIKE_WINDOW = 10.0     # giây; đếm số tin nhắn bị từ chối trong cửa sổ này
+RATE_DISCONNECT = 200         # bị từ chối chừng này lần trong một cửa sổ thì ngắt (0 = không ngắt)
+MAX_FRAME_BYTES = 4096        # frame lớn hơn bị thư viện websockets đóng kết nối (1009) trước khi đọc hết
+
+# Mật khẩu phòng: scrypt có salt trong thread pool riêng (không chặn event loop)
+PASSWORD_WORKERS = 2          # số thread băm / kiểm tra mật khẩu
+PASSWORD_PENDING = 32         # số việc tối đa chờ / đang chạy trong pool; quá thì báo bận ngay
+PASSWORD_CACHE = 4096         # số lần kiểm tra đúng (phòng, người chơi) được nhớ để vào lại không phải băm lại
+PASSWORD_ATTEMPTS = (1 / 30, 5)   # lần nhập sai mỗi kết nối: (lượt hồi / giây, tối đa dồn); hết lượt thì từ chối không băm
+
+# Nhật ký sự kiện (JSON lines, thread nền): mức tối thiểu và tỉ lệ lấy mẫu theo nhóm ('chat=0.1,game=0.5')
+LOG_LEVEL = 'info'
+LOG_SAMPLING = ''
+LOG_FRAME_BYTES = 200         # chỉ ghi chừng này ký tự đầu của frame hỏng
+
+# Kết nối lại: mất kết nối thì giữ chỗ (phòng, điểm, series) chờ client quay lại bằng resume token
+RESUME_GRACE = 30.0           # giây giữ phiên sau khi mất kết nối (0 = dọn ngay như trước)
+SESSION_TICK = 0.5            # độ phân giải của timer wheel hết hạn phiên (giây)
+REAP_CHUNK = 500              # số phiên hết hạn dọn mỗi lượt; giữa hai lượt nhường event loop
+
+# Dọn phòng / kết nối bỏ không (theo thời điểm tin nhắn cuối, ping không tính)
+ROOM_IDLE_TIMEOUT = 600.0     # giây mọi người chơi trong phòng đều im lặng thì giải tán phòng (0 = tắt)
+IDLE_TIMEOUT = 900.0          # giây kết nối ngoài phòng im lặng thì đóng (0 = tắt); người đang xem không tính
+IDLE_SWEEP = 30.0             # giây giữa hai lượt quét
+IDLE_SCAN_CHUNK = 5000        # số phòng / kết nối kiểm tra mỗi lượt; giữa hai lượt nhường event loop
+IDLE_CLOSE_CHUNK = 100        # số phòng giải tán mỗi lượt (mỗi phòng tốn vài broadcast)
+IDLE_CLOSE_CODE = 4000        # mã đóng kết nối vì không hoạt động (client không tự kết nối lại)
+
+# Snapshot phòng (chế độ 1 process): ghi đầy đủ khi tắt êm, khối tăng dần định kỳ; nạp lại khi khởi động
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rooms.snapshot')
+SNAPSHOT_INTERVAL = 5.0       # giây giữa hai lần ghi các phòng đã đổi (0 = chỉ ghi khi tắt)
+SNAPSHOT_CHUNK = 2000         # số phòng mã hóa mỗi lượt khi ghi đầy đủ lúc đang chạy; giữa hai lượt nhường event loop
+RESTORE_GRACE = 60.0          # giây giữ chỗ cho người chơi của phòng nạp lại (cả server cùng kết nối lại một lúc)
+
+# Gộp cập nhật sảnh chờ: mọi thay đổi trong cửa sổ này được gửi thành 1 frame
+LOBBY_COALESCE_WINDOW = 0.1   # giây (0 = gửi ngay như trước)
+LOBBY_MAX_STALENESS = 0.5     # giây, giới hạn trễ tối đa khi thay đổi liên tục
+
+METRICS_PATH = '/metrics'     # endpoint HTTP (Prometheus) trên cùng cổng WebSocket
+LOOP_LAG_INTERVAL = 0.5       # giây giữa hai lần đo độ trễ event loop
+ROUND_SECONDS = 10            # thời gian mặc định cho mỗi ván
+ROUND_SECONDS_MIN = 3
+ROUND_SECONDS_MAX = 60
+ROOM_PLAYERS_MAX = 5000       # sức chứa tối đa khi tạo phòng (mặc định 2)
+ROOM_NAME_MAX = 30            # ký tự tối đa của tên phòng (như ô nhập ở frontend)
+PLAYER_NAME_MAX = 20          # ký tự tối đa của tên người chơi (như ô nhập ở frontend)
+CHOSE_BROADCAST_MAX = 8       # phòng đông hơn: player_chose chỉ gửi lại người chọn (tránh n² frame mỗi ván)
+CHOICES = ('rock', 'paper', 'scissors')   # nước (i + 1) % 3 thắng nước i
+CHOICE_CHARS = {'rock': 'r', 'paper': 'p', 'scissors': 's'}   # round_result: 1 ký tự / người
+RESULT_CHARS = {'win': 'w', 'lose': 'l', 'draw': 'd'}
+SPECTATOR_FANOUT_CHUNK = 500  # số người xem mỗi lượt chia frame, giữa hai lượt nhường event loop
+TIMER_TICK = 0.1              # độ phân giải của timer wheel (giây)
+MATCH_SWEEP_INTERVAL = 0.5    # giây giữa hai lần ghép lại hàng đợi quick_match (khoảng trình độ nới dần)
+STATS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stats.db')   # thành tích người chơi
+LEADERBOARD_SIZE = 10         # số người mặc định trả về cho get_leaderboard (tối đa TOP_K)
+MATCH_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'match_logs')   # nhật ký ván đấu
+HISTORY_PAGE_SIZE = 20        # số ván mỗi trang get_match_history
+HISTORY_PAGE_MAX = 50
+BOT_TICK = 0.05              # giây giữa hai lần bot ra nước (mọi phòng bot trong một lô)
+BOT_ROOM_NAME = 'Đấu với Bot'
+BOT_ID_BASE = wire.NO_ID      # id bot đếm lùi từ NO_ID - 1 (vẫn vừa uint32), tách khỏi id người chơi đếm lên từ 1
+HISTORY_OPPONENT_FIELDS = ('name', 'player_id', 'choice', 'auto_picked', 'result', 'series_wins')
+MESSAGE_TYPES = ('get_rooms', 'subscribe_rooms', 'create_room', 'join_room', 'leave_room', 'ready',
+                 'choice', 'new_game', 'set_name', 'chat', 'ping', 'quick_match', 'cancel_quick_match',
+                 'get_leaderboard', 'get_match_history', 'get_room', 'play_bot',
+                 'spectate', 'stop_spectating')
+
+def clean_name(name) -> str | None:
+    """Tên người chơi client gửi lên: bỏ khoảng trắng hai đầu, cắt còn PLAYER_NAME_MAX ký tự.
+    None nếu không dùng được (không phải chuỗi, rỗng, có ký tự điều khiển, trùng tên bot)."""
+    if not isinstance(name, str):
+        return None
+    name = name.strip()[:PLAYER_NAME_MAX]
+    if not name or not name.isprintable() or name == BOT_NAME:
+        return None
+    return name
+
+class PlayerIndex:
+    """Chỉ mục O(1) cho kết nối: websocket -> phòng.
+
+    Bản ghi người chơi (websocket -> dict) vẫn nằm trong GameServer.clients;
+    chỉ mục giữ các ánh xạ ngược để không phải quét toàn bộ phòng/clients.
+    """
+    def __init__(self, clients: Dict[websockets.WebSocketServerProtocol, dict]):
+        self.clients = clients
+        self.room_by_ws: Dict[websockets.WebSocketServerProtocol, str] = {}
+
+    def remove_client(self, websocket: websockets.WebSocketServerProtocol):
+        self.room_by_ws.pop(websocket, None)
+
+    def bind_room(self, websocket: websockets.WebSocketServerProtocol, room_id: str):
+        self.room_by_ws[websocket] = room_id
+        if websocket in self.clients:
+            self.clients[websocket]['room_id'] = room_id
+
+    def unbind_room(self, websocket: websockets.WebSocketServerProtocol, room_id: str):
+        # Chỉ gỡ nếu websocket đang gắn với đúng phòng này
+        if self.room_by_ws.get(websocket) == room_id:
+            del self.room_by_ws[websocket]
+            if websocket in self.clients:
+                self.clients[websocket]['room_id'] = None
+
+    def room_of(self, websocket: websockets.WebSocketServerProtocol) -> str:
+        return self.room_by_ws.get(websocket)
+
+class LobbyFeed:
+    """Danh sách phòng có đánh số phiên bản.
+
+    Client nhận một snapshot khi gọi get_rooms, sau đó chỉ nhận các delta nhỏ
+    (room_added / room_changed / room_removed). Mỗi delta tăng version lên 1;
+    client bị lỡ delta có thể xin resync từ version cuối cùng nó có.
+    """
+    def __init__(self, history: int = 512):
+        self.version = 0
+        self.rooms: Dict[str, dict] = {}     # room_id -> tóm tắt phòng đã công bố
+        self.history = deque(maxlen=history)  # các delta gần nhất để resync
+        self.query = RoomQueryIndex()          # chỉ mục phụ cho truy vấn lọc/phân trang
+
+    def publish(self, room_id: str, summary: dict | None) -> dict | None:
+        """Ghi nhận trạng thái mới của phòng (None = phòng đã bị xóa).
+        Trả về delta vừa tạo, hoặc None nếu không có gì thay đổi."""
+        old = self.rooms.get(room_id)
+        if summary is None:
+            if old is None:
+                return None
+            delta = {'type': 'room_removed', 'room_id': room_id}
+        elif old is None:
+            delta = {'type': 'room_added', 'room': summary}
+        elif old == summary:
+            return None
+        else:
+            delta = {'type': 'room_changed', 'room': summary}
+        self.query.update(room_id, old, summary)   # trước: tóm tắt hỏng thì sảnh giữ nguyên như cũ
+        if summary is None:
+            del self.rooms[room_id]
+        else:
+            self.rooms[room_id] = summary
+        self.version += 1
+        delta['version'] = self.version
+        self.history.append(delta)
+        return delta
+
+    def snapshot(self, flt: dict | None = None) -> dict:
+        if flt:
+            rooms = [r for r in self.rooms.values() if matches(r, flt)]
+            return {'type': 'rooms_list', 'version': self.version, 'rooms': rooms, 'filter': flt}
+        return {'type': 'rooms_list', 'version': self.version, 'rooms': list(self.rooms.values())}
+
+    def changes_since(self, version: int) -> List[dict] | None:
+        """Các delta sau `version`, hoặc None nếu lịch sử không còn đủ (cần snapshot)."""
+        if version == self.version:
+            return []
+        if version > self.version or not self.history or version < self.history[0]['version'] - 1:
+            return None
+        return [d for d in self.history if d['version'] > version]
+
+NO_SPECTATORS = frozenset()   # dùng chung cho mọi phòng chưa có người xem
+
+
+class Seat:
+    """Trạng thái của một người chơi trong phòng: điểm, số ván thắng series, ready và lựa chọn của ván hiện tại"""
+    __slots__ = ('name', 'wins', 'losses', 'draws', 'series_wins', 'ready', 'choice', 'auto')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wins = 0
+        self.losses = 0
+        self.draws = 0
+        self.series_wins = 0             # số ván thắng trong series hiện tại
+        self.ready = False
+        self.choice = None               # 'rock' / 'paper' / 'scissors' khi đã chọn trong ván hiện tại
+        self.auto = False                # lựa chọn do server tự chốt khi hết giờ
+
+    def score(self) -> dict:
+        return {'wins': self.wins, 'losses': self.losses, 'draws': self.draws}
+
 
 class GameRoom:
-    def __init__(self, room_id: str, room_name: str, max_players: int = 2, password_hash: str | None = None):
+    __slots__ = ('room_id', 'room_name', 'max_players', 'round_seconds', 'round_timer', 'round_started_at',
+                 'seats', 'ready_count', 'chosen_count', 'game_state', 'series_best_of', 'series_over',
+                 'password_hash', 'index', 'version', 'bot', 'spectators', 'audience', 'audience_task')
+
+    def __init__(self, room_id: str, room_name: str, max_players: int = 2, password_hash: str | None = None,
+                 index: PlayerIndex | None = None):
         self.room_id = room_id
         self.room_name = room_name
         self.max_players = max_players
-        self.round_task = None  # asyncio.Task đếm giờ cho ván hiện tại
-        self.players: List[websockets.WebSocketServerProtocol] = []
-        self.choices: Dict[websockets.WebSocketServerProtocol, str] = {}
-        self.scores: Dict[websockets.WebSocketServerProtocol, dict] = {}
+        self.round_seconds = ROUND_SECONDS
+        self.round_timer = None  # TimerEntry hạn chót của ván hiện tại (trong timer wheel của server)
+        self.round_started_at = 0.0   # loop.time() lúc bắt đầu ván (cho nhật ký ván đấu)
+        # websocket -> Seat, theo thứ tự vào phòng (room.players là các khóa của dict này)
+        self.seats: Dict[websockets.WebSocketServerProtocol, Seat] = {}
+        self.ready_count = 0             # số chỗ đang ready
+        self.chosen_count = 0            # số chỗ đã chọn trong ván hiện tại
         self.game_state = 'waiting'  # waiting, playing, finished
-        self.ready_players: Set[websockets.WebSocketServerProtocol] = set()
         self.series_best_of = 3          # Bo3
-        self.series_wins = {}            # map: websocket -> số ván thắng trong series hiện tại
         self.series_over = False         # đã kết thúc series hay chưa
         self.password_hash = password_hash
+        self.index = index               # chỉ mục websocket -> phòng của server (nếu có)
+        self.version = 0                 # tăng mỗi lần trạng thái phòng gửi cho client thay đổi
+        self.bot: BotPlayer | None = None   # đối thủ máy (phòng play_bot), luôn sẵn sàng
+        # Người xem (không chiếm chỗ) và hàng chờ chia frame cho họ: chỉ tạo khi có người xem,
+        # phần lớn phòng không ai xem (set rỗng ~200 B, deque rỗng ~750 B mỗi phòng)
+        self.spectators: Set[websockets.WebSocketServerProtocol] = NO_SPECTATORS
+        self.audience: deque | None = None   # (message, frames, người nhận | None = mọi người xem) chờ chia
+        self.audience_task = None
+
+    @property
+    def players(self):
+        """Người chơi theo thứ tự vào phòng (view trên các khóa của seats)"""
+        return self.seats.keys()
 
     def add_player(self, player: websockets.WebSocketServerProtocol, player_name: str):
-        if len(self.players) < self.max_players:
-            self.players.append(player)
-            self.scores[player] = {'wins': 0, 'losses': 0, 'draws': 0, 'name': player_name}
+        if len(self.seats) < self.max_players:
+            self.seats[player] = Seat(player_name)
+            self.version += 1
+            if self.index:
+                self.index.bind_room(player, self.room_id)
             return True
         return False
     
     def remove_player(self, player: websockets.WebSocketServerProtocol):
-        if player in self.players:
-            self.players.remove(player)
-            if player in self.choices:
-                del self.choices[player]
-            if player in self.scores:
-                del self.scores[player]
-            if player in self.ready_players:
-                self.ready_players.remove(player)
-            return True
-        return False
+        seat = self.seats.pop(player, None)
+        if seat is None:
+            return False
+        self.version += 1
+        if self.index:
+            self.index.unbind_room(player, self.room_id)
+        self.ready_count -= seat.ready
+        self.chosen_count -= seat.choice is not None
+        return True
+
+    def set_ready(self, player: websockets.WebSocketServerProtocol):
+        seat = self.seats[player]
+        if not seat.ready:
+            seat.ready = True
+            self.ready_count += 1
+
+    def choose(self, player: websockets.WebSocketServerProtocol, choice: str, auto: bool = False):
+        seat = self.seats[player]
+        if seat.choice is None:
+            self.chosen_count += 1
+        seat.choice = choice
+        seat.auto = auto
+
+    def choices(self) -> Dict[websockets.WebSocketServerProtocol, str]:
+        """{websocket: lựa chọn} của những người đã chọn trong ván hiện tại"""
+        return {p: seat.choice for p, seat in self.seats.items() if seat.choice is not None}
+
+    def clear_round(self):
+        """Bỏ lựa chọn và cờ ready của mọi người cho ván kế tiếp (bot luôn sẵn sàng)"""
+        for p, seat in self.seats.items():
+            seat.choice = None
+            seat.auto = False
+            seat.ready = p is self.bot
+        self.chosen_count = 0
+        self.ready_count = 1 if self.bot is not None and self.bot in self.seats else 0
+
+    def all_chosen(self):
+        return self.chosen_count == len(self.seats)
     
     def is_full(self):
-        return len(self.players) >= self.max_players
+        return len(self.seats) >= self.max_players
     
     def can_start_game(self):
-        return len(self.players) >= 2 and len(self.ready_players) == len(self.players)
+        return len(self.seats) >= 2 and self.ready_count == len(self.seats)
     
     def get_room_info(self):
+        seats = self.seats.values()
         return {
             'room_id': self.room_id,
             'room_name': self.room_name,
             'max_players': self.max_players,
-            'current_players': len(self.players),
+            'current_players': len(self.seats),
             'game_state': self.game_state,
-            'players': [{'name': self.scores[p]['name'], 'ready': p in self.ready_players} for p in self.players],
-            'scores': {self.scores[p]['name']: {'wins': self.scores[p]['wins'], 'losses': self.scores[p]['losses'], 'draws': self.scores[p]['draws']} for p in self.players},
-            'has_password': bool(self.password_hash)
+            'players': [{'name': seat.name, 'ready': seat.ready} for seat in seats],
+            'scores': {seat.name: seat.score() for seat in seats},
+            'has_password': bool(self.password_hash),
+            'version': self.version
         }
 
 class GameServer:
-    def __init__(self):
+    def __init__(self, lobby_window: float = LOBBY_COALESCE_WINDOW,
+                 lobby_max_staleness: float = LOBBY_MAX_STALENESS, match_by_skill: bool = True,
+                 send_queue: int = SEND_QUEUE, slow_client_grace: float = SLOW_CLIENT_GRACE,
+                 lobby_policy: str = LOBBY_POLICY, rate_limits: dict | None = RATE_LIMITS,
+                 rate_disconnect: int = RATE_DISCONNECT, resume_grace: float = RESUME_GRACE,
+                 log: EventLog | None = None):
         self.clients: Dict[websockets.WebSocketServerProtocol, dict] = {}
         self.rooms: Dict[str, GameRoom] = {}
+        self.index = PlayerIndex(self.clients)
+        self.lobby = LobbyFeed()
+        # Bộ gộp cập nhật sảnh chờ
+        self.lobby_window = lobby_window
+        self.lobby_max_staleness = max(lobby_max_staleness, lobby_window)
+        self._lobby_dirty: Set[str] = set()
+        self._lobby_first_mark = 0.0       # thời điểm thay đổi đầu tiên chưa gửi
+        self._lobby_last_mark = 0.0        # thời điểm thay đổi gần nhất
+        self._lobby_timer = None           # asyncio.TimerHandle của lần flush kế tiếp
+        self.lobby_stats = {'events': 0, 'broadcasts': 0, 'saved': 0}
         self.player_counter = 0
-        
+        self.bot_counter = 0
+        self.round_timers = TimerWheel(TIMER_TICK, now=time.monotonic())   # hạn chót của mọi ván, dùng chung
+        self._timer_task = None
+        self.matchmaker = MatchQueue(by_skill=match_by_skill)   # hàng đợi quick_match
+        self._match_task = None
+        self.player_stats: StatsStore | None = None   # lưu thành tích lâu dài (bật trong main())
+        self.match_log: MatchLog | None = None        # nhật ký nhị phân từng ván (bật trong main())
+        self.bots = BotBrain()                        # mô hình đoán nước của người chơi, dùng chung
+        self._bot_turns: Dict[str, GameRoom] = {}     # phòng bot đang chờ bot ra nước ở tick kế tiếp
+        self._bot_task = None
+        self.bot_rooms = 0
+        self.spectator_frames = 0
+        self.send_stats = Counter()      # số liệu dùng chung cho hàng đợi gửi của mọi kết nối
+        self.set_send_policy(send_queue, slow_client_grace, lobby_policy)
+        self.rate_limits = rate_limits            # None = không giới hạn (vd: kết nối proxy của worker)
+        self.rate_disconnect = rate_disconnect
+        # Phiên chờ kết nối lại: token -> khóa người chơi (websocket của kết nối đầu tiên, giữ nguyên
+        # trong phòng / chỉ mục suốt phiên; client_info['socket'] là kết nối hiện tại, None khi đang chờ)
+        self.resume_grace = resume_grace
+        self.sessions: Dict[str, websockets.WebSocketServerProtocol] = {}
+        self.session_timers = TimerWheel(SESSION_TICK, now=time.monotonic())   # hạn giữ chỗ của mọi phiên đang chờ
+        self._session_task = None
+        self.session_stats = {'held': 0, 'resumed': 0, 'expired': 0, 'unknown_token': 0}
+        self.log = log if log is not None else EventLog(level=LOG_LEVEL)
+        # Dọn phòng / kết nối bỏ không (task bật trong main())
+        self.room_idle_timeout = ROOM_IDLE_TIMEOUT
+        self.idle_timeout = IDLE_TIMEOUT
+        self._idle_task = None
+        self.passwords = PasswordPool(PASSWORD_WORKERS, PASSWORD_PENDING, PASSWORD_CACHE)
+        # Snapshot phòng (tùy chọn, bật trong main()): room_id đã đổi kể từ lần ghi trước
+        self.snapshots: SnapshotStore | None = None
+        self.snapshot_interval = SNAPSHOT_INTERVAL
+        self._snapshot_dirty: Set[str] = set()
+        self._snapshot_task = None
+        self._snapshot_write = None     # lần ghi file đang chạy trong thread
+        self._init_metrics()
+
+    def set_send_policy(self, send_queue: int, slow_client_grace: float, lobby_policy: str):
+        """Chính sách hàng đợi gửi cho các kết nối mở từ giờ (main() gọi lại theo tham số dòng lệnh)"""
+        if lobby_policy not in LOBBY_POLICIES:
+            raise ValueError(f'lobby_policy phải là một trong {LOBBY_POLICIES}')
+        self.send_queue = send_queue
+        self.slow_client_grace = slow_client_grace
+        # Nhóm frame được phép bỏ -> hàm dựng trạng thái mới nhất để gửi thay (nhóm không có thì chỉ bỏ)
+        self.resync = {'room': self.spectator_snapshot}
+        if lobby_policy == 'conflate':
+            self.resync['lobby'] = self.lobby_snapshot
+
+    def _init_metrics(self):
+        """Khai báo số liệu; gauge chỉ được tính khi có người scrape /metrics."""
+        m = self.metrics = Registry()
+        self.m_handler_seconds = m.histogram(
+            'rps_handler_seconds', 'Thời gian xử lý tin nhắn theo loại', labelnames=('type',))
+        self.m_rounds = m.counter(
+            'rps_rounds_total', 'Số ván đã có kết quả', labelnames=('reason',))
+        self.m_fanout = m.histogram(
+            'rps_broadcast_recipients', 'Số người nhận của mỗi lần broadcast', buckets=FANOUT_BUCKETS)
+        self.m_send_failures = m.counter(
+            'rps_send_failures_total', 'Số lần gửi thất bại', labelnames=('type',))
+        self.m_rejected = m.counter(
+            'rps_rejected_messages_total', 'Tin nhắn client bị bỏ: vượt giới hạn tốc độ / frame quá lớn / không giải mã được',
+            labelnames=('reason', 'type'))
+        self.m_rate_disconnects = m.counter(
+            'rps_rate_limit_disconnects_total', 'Số kết nối bị ngắt vì liên tục vượt giới hạn tốc độ')
+        self.m_idle_reaped = m.counter(
+            'rps_idle_reaped_total', 'Số phòng bị giải tán / kết nối bị đóng vì không hoạt động', labelnames=('kind',))
+        self.m_loop_lag = m.histogram(
+            'rps_event_loop_lag_seconds', 'Độ trễ của event loop so với lịch hẹn')
+        self.m_match_wait = m.histogram(
+            'rps_match_wait_seconds', 'Thời gian chờ trong hàng đợi quick_match tới khi được ghép',
+            buckets=WAIT_BUCKETS)
+        m.gauge('rps_round_timers', 'Số ván đang chờ hết giờ', lambda: len(self.round_timers))
+        m.gauge('rps_sessions_waiting', 'Số phiên mất kết nối đang được giữ chỗ', lambda: len(self.session_timers))
+        m.gauge('rps_sessions', 'Phiên: số lần giữ chỗ / kết nối lại / hết hạn bị dọn / token không hợp lệ',
+                lambda: dict(self.session_stats), labelnames=('kind',))
+        m.gauge('rps_snapshots', 'Snapshot phòng: số lần ghi đầy đủ / tăng dần, số byte đã ghi, số phòng chờ ghi',
+                lambda: {**self.snapshots.stats, 'dirty_rooms': len(self._snapshot_dirty)} if self.snapshots else {},
+                labelnames=('kind',))
+        m.gauge('rps_passwords', 'Mật khẩu phòng: số lần băm / đúng / sai / dùng lại kết quả / từ chối vì bận / '
+                'vì sai quá nhiều, số việc đang trong pool', lambda: {**self.passwords.stats, 'pending': self.passwords.pending},
+                labelnames=('kind',))
+        m.gauge('rps_log_records', 'Bản ghi log: đã ghi / bỏ do hàng đợi đầy / bỏ do lấy mẫu',
+                lambda: self.log.stats(), labelnames=('kind',))
+        m.gauge('rps_match_queue_depth', 'Số người đang chờ quick_match', lambda: len(self.matchmaker))
+        m.gauge('rps_stats_pending', 'Số người chơi có thành tích chưa ghi xuống đĩa',
+                lambda: len(self.player_stats.pending) if self.player_stats else 0)
+        m.gauge('rps_stats_writes', 'Số lần ghi / số dòng / số lỗi khi ghi thành tích',
+                lambda: dict(self.player_stats.stats) if self.player_stats else {}, labelnames=('kind',))
+        m.gauge('rps_match_log', 'Nhật ký ván đấu: số bản ghi / ván / segment mới từ khi chạy',
+                lambda: dict(self.match_log.stats) if self.match_log else {}, labelnames=('kind',))
+        m.gauge('rps_connected_clients', 'Số client đang kết nối', lambda: len(self.clients) - self.bot_rooms)
+        m.gauge('rps_bot_rooms', 'Số phòng đang đấu với bot', lambda: self.bot_rooms)
+        m.gauge('rps_bot_engine', 'Bot: số lần đoán / cập nhật / mô hình bị quên, số mô hình đang giữ',
+                lambda: {**self.bots.stats, 'models': len(self.bots)}, labelnames=('kind',))
+        m.gauge('rps_spectators', 'Số người đang xem phòng',
+                lambda: sum(len(room.spectators) for room in self.rooms.values()))
+        m.gauge('rps_spectator_frames', 'Frame gửi cho người xem: đã xếp hàng / bị bỏ do người xem chậm',
+                lambda: {'queued': self.spectator_frames, 'dropped': self.send_stats['dropped_room']},
+                labelnames=('kind',))
+        m.gauge('rps_send_queue', 'Hàng đợi gửi: frame đã gửi / bị bỏ theo nhóm / được gộp / gửi lại trạng thái, '
+                'lỗi gửi, số kết nối bị ngắt vì nhận quá chậm', lambda: dict(self.send_stats), labelnames=('kind',))
+        m.gauge('rps_send_queue_depth', 'Số frame đang chờ gửi theo client (chỉ client có hàng đợi khác rỗng)',
+                self._queue_depths, labelnames=('client',))
+        m.gauge('rps_rooms', 'Số phòng theo game_state', self._rooms_by_state, labelnames=('game_state',))
+        m.gauge('rps_lobby_updates', 'Bộ gộp cập nhật sảnh chờ', lambda: dict(self.lobby_stats),
+                labelnames=('kind',))
+
+    def _queue_depths(self) -> dict:
+        depths = {}
+        for client_info in self.clients.values():
+            outbox = client_info.get('outbox')
+            if outbox:
+                depths[client_info['id']] = len(outbox)
+        return depths
+
+    def _rooms_by_state(self) -> dict:
+        counts = {'waiting': 0, 'playing': 0, 'finished': 0}
+        for room in self.rooms.values():
+            counts[room.game_state] = counts.get(room.game_state, 0) + 1
+        return counts
+
     def get_next_player_id(self) -> int:
         self.player_counter += 1
         return self.player_counter
+
+    def get_next_bot_id(self) -> int:
+        """Id của bot lấy từ dải riêng (đếm lùi từ BOT_ID_BASE): không trùng id người chơi, kể cả id do
+        router gán cho worker qua attach()"""
+        self.bot_counter += 1
+        return BOT_ID_BASE - self.bot_counter
     
-    def create_room(self, room_name: str, max_players: int = 2, password_hash: str | None = None) -> str:
-        room_id = str(uuid.uuid4())[:8]
-        self.rooms[room_id] = GameRoom(room_id, room_name, 2, password_hash=password_hash)
+    def new_room_id(self) -> str:
+        return str(uuid.uuid4())[:8]
+
+    def create_room(self, room_name: str, max_players: int = 2, password_hash: str | None = None,
+                    round_seconds: int = ROUND_SECONDS) -> str:
+        room_id = self.new_room_id()
+        room = GameRoom(room_id, room_name, max_players, password_hash=password_hash, index=self.index)
+        room.round_seconds = round_seconds
+        self.rooms[room_id] = room
         return room_id
-    def _hash_password(self, s: str) -> str:
-        return hashlib.sha256(s.encode('utf-8')).hexdigest()
     
     def get_room(self, room_id: str) -> GameRoom:
         return self.rooms.get(room_id)
     
     def get_player_room(self, player: websockets.WebSocketServerProtocol) -> str:
-        for room_id, room in self.rooms.items():
-            if player in room.players:
-                return room_id
-        return None
+        return self.index.room_of(player)
     
     def remove_room(self, room_id: str):
         if room_id in self.rooms:
-            del self.rooms[room_id]
+            room = self.rooms.pop(room_id)
+            self.mark_snapshot(room_id)
+            for p in room.players:
+                self.index.unbind_room(p, room_id)
+            if room.spectators:
+                watchers = list(room.spectators)
+                room.spectators.clear()
+                for ws in watchers:
+                    self.clients[ws]['spectating'] = None
+                self.publish_to_spectators(room, {'type': 'spectate_ended', 'room_id': room_id}, {}, watchers,
+                                           group=None)
     
+    def stats_name(self, websocket) -> str | None:
+        """Tên dùng để lưu thành tích; bỏ qua tên mặc định Player_<id> (khách chưa đặt tên)"""
+        client_info = self.clients.get(websocket)
+        if client_info is None or client_info.get('bot') or client_info['name'] == f"Player_{client_info['id']}":
+            return None
+        return client_info['name']
+
     def get_room_info_with_player_ids(self, room: GameRoom):
         """Lấy thông tin phòng với player_id cho mỗi người chơi"""
         room_info = room.get_room_info()
-        # Thêm player_id cho mỗi player
-        for player in room_info['players']:
-            for websocket, client_info in self.clients.items():
-                if websocket in room.players and room.scores[websocket]['name'] == player['name']:
-                    player['player_id'] = client_info['id']
-                    player['player_name'] = player['name']
-                    break
+        # Thêm player_id cho mỗi player (room_info['players'] cùng thứ tự với room.players)
+        for websocket, player in zip(room.players, room_info['players']):
+            client_info = self.clients.get(websocket)
+            if client_info:
+                player['player_id'] = client_info['id']
+                player['player_name'] = player['name']
         return room_info
     
-    def get_rooms_list(self):
-        rooms_info = []
-        for room in self.rooms.values():
-            room_info = self.get_room_info_with_player_ids(room)
-            room_info['is_full'] = room.is_full()
-            rooms_info.append(room_info)
-        return rooms_info
-    
-    def compare_choices(self, choices: Dict[str, List[websockets.WebSocketServerProtocol]]
-                ) -> Dict[websockets.WebSocketServerProtocol, str]:
-        """So sánh lựa chọn và trả kết quả cho từng người chơi.
-        - 1 loại => hòa
-        - 3 loại => hòa
-        - 2 loại => loại thắng theo bảng quy tắc"""
-        results = {}
-
-        # Tập các loại được chọn
-        kinds = set(choices.keys())
-        if len(kinds) == 1 or len(kinds) == 3:
-            for players in choices.values():
-                for p in players:
-                    results[p] = 'draw'
-            return results
-
-        # Chỉ còn trường hợp có đúng 2 loại
-        beats = {'rock': 'scissors', 'scissors': 'paper', 'paper': 'rock'}
-        a, b = list(kinds)
-        if beats[a] == b:
-            winner, loser = a, b
-        elif beats[b] == a:
-            winner, loser = b, a
+    def room_diff(self, room: GameRoom, **changes) -> dict:
+        """Tăng version của phòng; trả về các trường diff gắn vào message gửi cho phòng.
+        changes: game_state, ready {player_id: bool}, ready_all (cờ ready chung cho cả phòng),
+        renamed {player_id: tên mới}.
+        Client đang ở đúng from_version thì áp dụng, lỡ version thì xin get_room."""
+        self.mark_snapshot(room.room_id)
+        room.version += 1
+        return {'from_version': room.version - 1, 'version': room.version, 'room_changes': changes}
+
+    def get_lobby_summary(self, room: GameRoom) -> dict:
+        """Tóm tắt phòng cho sảnh chờ (không kèm điểm số để ít thay đổi)."""
+        return {
+            'room_id': room.room_id,
+            'room_name': room.room_name,
+            'max_players': room.max_players,
+            'current_players': len(room.players),
+            'game_state': room.game_state,
+            'players': [{'name': seat.name, 'player_id': self.clients[p]['id'] if p in self.clients else None}
+                        for p, seat in room.seats.items()],
+            'has_password': bool(room.password_hash),
+            'is_full': room.is_full()
+        }
+
+    def winning_choice(self, counts: dict) -> str | None:
+        """Nước thắng của ván từ số người chọn mỗi nước (O(1)); None = hòa (1 hoặc 3 loại)"""
+        present = [i for i, choice in enumerate(CHOICES) if counts.get(choice)]
+        if len(present) != 2:
+            return None
+        a, b = present
+        return CHOICES[b if b == (a + 1) % 3 else a]
+
+    def resolve_round(self, choices: Dict[websockets.WebSocketServerProtocol, str]):
+        """Đếm lựa chọn, quyết định nước thắng rồi gán kết quả cho mọi người trong một lượt.
+        Trả về (counts, nước thắng hoặc None, {websocket: 'win' | 'lose' | 'draw'})"""
+        counts = dict.fromkeys(CHOICES, 0)
+        counts.update(Counter(choices.values()))
+        winner = self.winning_choice(counts)
+        if winner is None:
+            results = dict.fromkeys(choices, 'draw')
         else:
-            # Phòng hờ (không xảy ra) -> hòa
-            winner = loser = None
-
-        for ch, players in choices.items():
-            for p in players:
-                if winner is None:
-                    results[p] = 'draw'
-                elif ch == winner:
-                    results[p] = 'win'
-                else:
-                    results[p] = 'lose'
-        return results
-    
+            results = {p: 'win' if c == winner else 'lose' for p, c in choices.items()}
+        return counts, winner, results
+
     def update_scores(self, room: GameRoom, results: Dict[websockets.WebSocketServerProtocol, str]):
-        """Cập nhật điểm số cho tất cả người chơi"""
+        """Cập nhật điểm số cho tất cả người chơi (cả thành tích tích lũy dùng để ghép trận)"""
+        seats = room.seats
         for player, result in results.items():
+            seat = seats[player]
             if result == 'win':
-                room.scores[player]['wins'] += 1
+                key = 'wins'
+                seat.wins += 1
             elif result == 'lose':
-                room.scores[player]['losses'] += 1
+                key = 'losses'
+                seat.losses += 1
             else:  # draw
-                room.scores[player]['draws'] += 1
-    def _start_round_timer(self, room: GameRoom, seconds: int = 10):
+                key = 'draws'
+                seat.draws += 1
+            record = self.clients[player].get('record') if player in self.clients else None
+            if record is not None:
+                record[key] += 1
+
+    def _start_round_timer(self, room: GameRoom, seconds: int | None = None):
         """Bắt đầu (hoặc reset) bộ đếm cho ván hiện tại."""
         # Hủy timer cũ nếu có
-        if getattr(room, 'round_task', None):
-            try:
-                room.round_task.cancel()
-            except Exception:
-                pass
-        # Tạo timer mới
-        room.round_task = asyncio.create_task(self._round_timeout(room.room_id, seconds))
-    def ensure_series_keys(self, room: GameRoom):
-        """Đảm bảo mọi người trong phòng đều có key trong series_wins."""
-        for p in room.players:
-            if p not in room.series_wins:
-                room.series_wins[p] = 0
+        self._cancel_round_timer(room)
+        # Đặt hạn chót mới trong timer wheel chung
+        loop = asyncio.get_running_loop()
+        room.round_started_at = loop.time()
+        room.round_timer = self.round_timers.schedule(loop.time(), seconds or room.round_seconds, room.room_id)
+        if self._timer_task is None or self._timer_task.done():
+            self._timer_task = asyncio.create_task(self.run_round_timers())
+        if room.bot is not None:
+            self._bot_turns[room.room_id] = room
+            if self._bot_task is None or self._bot_task.done():
+                self._bot_task = asyncio.create_task(self.run_bots())
+
+    def _cancel_round_timer(self, room: GameRoom):
+        if room.round_timer is not None:
+            self.round_timers.cancel(room.round_timer)
+            room.round_timer = None
+
+    async def run_round_timers(self):
+        """Một task duy nhất cho mọi phòng: mỗi tick lấy lô ván hết giờ và xử lý"""
+        loop = asyncio.get_running_loop()
+        while len(self.round_timers):
+            await asyncio.sleep(self.round_timers.tick)
+            expired = self.round_timers.advance(loop.time())
+            if not expired:
+                continue
+            results = await asyncio.gather(*(self._round_timeout(entry) for entry in expired),
+                                           return_exceptions=True)
+            for entry, result in zip(expired, results):
+                if isinstance(result, Exception):
+                    self.log.error('error', 'round_timer_failed', room=entry.key, error=repr(result))
 
     def reset_series(self, room: GameRoom):
         """Bắt đầu một series mới (reset số ván thắng, bỏ trạng thái kết thúc)."""
-        room.series_wins = {}
-        for p in room.players:
-            room.series_wins[p] = 0
+        for seat in room.seats.values():
+            seat.series_wins = 0
         room.series_over = False
 
     def series_wins_by_id(self, room: GameRoom):
-        """Trả về dict {player_id: wins} để client hiển thị dễ dàng."""
+        """Trả về dict {player_id: wins} để client hiển thị dễ dàng.
+        Phòng nhiều người trả {}: frame gửi cho n người mà kèm n mục thì thành O(n²) byte mỗi ván."""
+        if room.max_players > 2:
+            return {}
         out = {}
-        for p in room.players:
-            pid = self.clients[p]['id']
-            out[pid] = room.series_wins.get(p, 0)
+        for p, seat in room.seats.items():
+            out[self.clients[p]['id']] = seat.series_wins
         return out
 
 
-    async def _round_timeout(self, room_id: str, seconds: int):
+    async def _round_timeout(self, entry):
         """Hết giờ: tự chốt lựa chọn cho ai chưa chọn và công bố kết quả."""
-        try:
-            await asyncio.sleep(seconds)
-            room = self.get_room(room_id)
-            if not room or room.game_state != 'playing':
-                return
-            # Gán lựa chọn ngẫu nhiên cho ai chưa chọn
-            for p in room.players:
-                if p not in room.choices:
-                    room.choices[p] = random.choice(['rock', 'paper', 'scissors'])
-            # Công bố kết quả
-            await self.process_game_result(room_id)
-        except asyncio.CancelledError:
-            # Timer bị hủy (do mọi người chọn xong sớm hoặc người chơi rời)
-            pass
+        room = self.get_room(entry.key)
+        # Timer đã bị thay thế (ván mới) hoặc phòng không còn chơi
+        if not room or room.round_timer is not entry or room.game_state != 'playing':
+            return
+        room.round_timer = None
+        # Gán lựa chọn ngẫu nhiên cho ai chưa chọn (ghi nhận để nhật ký phân biệt với tự chọn)
+        for p, seat in room.seats.items():
+            if seat.choice is None:
+                room.choose(p, random.choice(['rock', 'paper', 'scissors']), auto=True)
+        # Công bố kết quả
+        await self.process_game_result(room.room_id, timed_out=True)
 
 
+    def bot_model_key(self, room: GameRoom):
+        """Khóa mô hình của người đấu với bot: tên đã đặt (nhớ qua nhiều phòng), khách thì theo player_id"""
+        human = next(p for p in room.players if p is not room.bot)
+        return self.stats_name(human) or f"#{self.clients[human]['id']}"
+
+    async def run_bots(self):
+        """Một task cho mọi phòng bot: mỗi tick đoán nước cho cả lô phòng đang chờ bot"""
+        while self._bot_turns:
+            await asyncio.sleep(BOT_TICK)
+            turns, self._bot_turns = self._bot_turns, {}
+            rooms = [room for room in turns.values()
+                     if self.get_room(room.room_id) is room and room.game_state == 'playing'
+                     and len(room.seats) == 2 and room.seats[room.bot].choice is None]
+            moves = self.bots.choose([self.bot_model_key(room) for room in rooms])
+            results = await asyncio.gather(*(self.handle_choice(room.bot, move) for room, move in zip(rooms, moves)),
+                                           return_exceptions=True)
+            for room, result in zip(rooms, results):
+                if isinstance(result, Exception):
+                    self.log.error('error', 'bot_failed', room=room.room_id, error=repr(result))
+
+    def observe_bot_round(self, room: GameRoom):
+        """Cho mô hình học nước vừa ra (bỏ qua nước tự chọn do hết giờ: không phải thói quen)"""
+        human = next((p for p in room.players if p is not room.bot), None)
+        if human is None:
+            return
+        seat, bot_seat = room.seats[human], room.seats[room.bot]
+        if seat.auto or seat.choice is None or bot_seat.choice is None:
+            return
+        self.bots.observe(self.bot_model_key(room), seat.choice, bot_seat.choice)
+
     async def handle_chat(self, websocket, data):
         room_id = self.get_player_room(websocket)
         if not room_id:
@@ -213,8 +688,9 @@ class GameServer:
         message_text = data.get('message', '')
         if not message_text.strip():
             return  # Không gửi tin nhắn rỗng
-        # In ra log server
-        print(f"[CHAT] Phòng {room_id} - {player_name}: {message_text}")
+        if self.log.wants('info', 'chat'):
+            # Đường nóng, hay bị lấy mẫu: kiểm tra trước rồi mới dựng bản ghi
+            self.log.emit('info', 'chat', 'chat', {'room': room_id, 'player': player_name, 'message': message_text})
         # Gửi lại cho tất cả người chơi trong phòng
         await self.broadcast_to_room(room_id, {
         'type': 'chat',
@@ -222,36 +698,225 @@ class GameServer:
         'message': message_text
     })
     async def handle_client(self, websocket: websockets.WebSocketServerProtocol, path: str):
-        """Xử lý kết nối của client"""
-        player_id = self.get_next_player_id()
-        self.clients[websocket] = {
-            'id': player_id,
-            'room_id': None,
-            'name': f"Player_{player_id}"
-        }
-        
-        # Gửi ID cho client
-        await websocket.send(json.dumps({
-            'type': 'player_id',
-            'player_id': player_id
-        }))
-        
+        """Xử lý kết nối của client (kết nối lại bằng `?resume=<token>` để quay về phiên cũ)"""
+        session = self.resume_session(websocket, path)
+        if session is None:
+            session = websocket
+            player_id = self.get_next_player_id()
+            self.clients[websocket] = {
+                'id': player_id,
+                'room_id': None,
+                'name': f"Player_{player_id}",
+                'record': {'wins': 0, 'losses': 0, 'draws': 0},  # tích lũy qua mọi phòng
+                'binary': websocket.subprotocol == wire.SUBPROTOCOL,  # codec đã thỏa thuận lúc bắt tay
+                'socket': websocket,
+                'active': time.monotonic()   # tin nhắn cuối (trừ ping), để dọn kết nối / phòng bỏ không
+            }
+        player_id = self.clients[session]['id']
+
+        # Gửi ID (và token để kết nối lại) cho client
+        resumed = session is not websocket
+        message = {'type': 'player_id', 'player_id': player_id}
+        token = self.issue_resume_token(session)
+        if token:
+            message['resume_token'] = token
+        if resumed:
+            message['resumed'] = True
+        await self.send(session, message)
+        if resumed:
+            # Các frame trong lúc mất kết nối đã bị bỏ: gửi lại cả phòng đang chơi / đang xem
+            await self.handle_get_room(session)
+
         try:
             async for message in websocket:
-                await self.handle_message(websocket, message)
-        except websockets.exceptions.ConnectionClosed:
-            print(f"Client {player_id} đã ngắt kết nối")
+                await self.handle_message(session, message)
+        except websockets.exceptions.ConnectionClosed as e:
+            if e.sent is not None and e.sent.code == 1009:
+                self.m_rejected.inc('too_big', 'unknown')
+            self.log.info('client', 'disconnected', player_id=player_id)
         finally:
-            await self.cleanup_client(websocket)
+            await self.disconnect(session, websocket)
+
+    def issue_resume_token(self, session) -> str | None:
+        """Token mới cho phiên (token cũ hết hiệu lực); None nếu tắt kết nối lại"""
+        if self.resume_grace <= 0:
+            return None
+        client_info = self.clients[session]
+        self.sessions.pop(client_info.get('token'), None)
+        token = client_info['token'] = secrets.token_urlsafe(18)
+        self.sessions[token] = session
+        room_id = self.get_player_room(session)
+        if room_id:
+            self.mark_snapshot(room_id)   # token trong snapshot phải là token client đang giữ
+        return token
+
+    def resume_session(self, websocket, path: str):
+        """Gắn kết nối mới vào phiên của token trong `path` (O(1), không broadcast gì).
+        Trả về khóa của phiên, hoặc None nếu không có token / token không còn hiệu lực."""
+        query = urlsplit(path or '').query
+        token = parse_qs(query).get('resume', [None])[0] if query else None
+        if not token:
+            return None
+        session = self.sessions.get(token)
+        if session is None:
+            self.session_stats['unknown_token'] += 1
+            return None
+        client_info = self.clients[session]
+        old_socket = client_info.get('socket')
+        if old_socket is not None:
+            # Client kết nối lại trước khi server biết kết nối cũ đã chết: kết nối cũ nhường chỗ
+            asyncio.ensure_future(old_socket.close(code=1000, reason='đã kết nối lại'))
+        self.session_timers.cancel(client_info.pop('expiry', None))
+        outbox = client_info.pop('outbox', None)
+        if outbox is not None:
+            outbox.close()
+        client_info['socket'] = websocket
+        client_info['binary'] = websocket.subprotocol == wire.SUBPROTOCOL
+        client_info['active'] = time.monotonic()
+        self.session_stats['resumed'] += 1
+        self.log.info('client', 'resumed', player_id=client_info['id'])
+        return session
+
+    async def disconnect(self, session, websocket):
+        """Kết nối đóng: giữ phiên resume_grace giây (chỗ ngồi, điểm, series) hoặc dọn ngay"""
+        client_info = self.clients.get(session)
+        if client_info is None or client_info.get('socket', websocket) is not websocket:
+            return      # phiên đã chuyển sang kết nối khác
+        if self.resume_grace <= 0 or 'token' not in client_info:
+            await self.cleanup_client(session)
+            return
+        client_info['socket'] = None
+        outbox = client_info.pop('outbox', None)
+        if outbox is not None:
+            outbox.close()
+        self.matchmaker.cancel(session)
+        loop = asyncio.get_running_loop()
+        client_info['expiry'] = self.session_timers.schedule(loop.time(), self.resume_grace, session)
+        self.session_stats['held'] += 1
+        if self._session_task is None or self._session_task.done():
+            self._session_task = asyncio.create_task(self.reap_sessions())
+
+    async def reap_sessions(self):
+        """Một task cho mọi phiên đang giữ chỗ: mỗi tick dọn cả lô phiên đã hết hạn,
+        từng lượt REAP_CHUNK phiên (thay đổi sảnh chờ của cả lô được gộp như mọi khi)"""
+        loop = asyncio.get_running_loop()
+        while len(self.session_timers):
+            await asyncio.sleep(self.session_timers.tick)
+            expired = self.session_timers.advance(loop.time())
+            for start in range(0, len(expired), REAP_CHUNK):
+                if start:
+                    await asyncio.sleep(0)
+                for entry in expired[start:start + REAP_CHUNK]:
+                    client_info = self.clients.get(entry.key)
+                    if client_info is None or client_info.get('expiry') is not entry:
+                        continue
+                    self.session_stats['expired'] += 1
+                    try:
+                        await self.cleanup_client(entry.key)
+                    except Exception as e:
+                        self.log.error('error', 'session_reap_failed', player_id=client_info['id'], error=repr(e))
+    
+    def room_idle(self, room: GameRoom, cutoff: float) -> bool:
+        """Mọi người chơi (trừ bot) đều im lặng từ trước `cutoff` và không có ván nào đang chờ hết giờ
+        (hạn chót tự chọn thay và kết thúc ván; phòng được dọn ở lượt quét sau nếu vẫn bỏ không)"""
+        if room.round_timer is not None:
+            return False
+        for p in room.players:
+            if p is room.bot:
+                continue
+            client_info = self.clients.get(p)
+            if client_info is not None and client_info.get('active', cutoff) >= cutoff:
+                return False
+        return True
+
+    def connection_idle(self, websocket, client_info: dict, cutoff: float) -> bool:
+        """Kết nối còn mở, ngoài phòng, không xem phòng nào và im lặng từ trước `cutoff`"""
+        return (client_info.get('socket') is not None and client_info.get('active', cutoff) < cutoff
+                and not client_info.get('spectating') and not self.get_player_room(websocket))
+
+    async def close_idle_room(self, room: GameRoom):
+        """Giải tán phòng bỏ không: từng người chơi được báo rồi rời phòng như bấm Rời phòng"""
+        for p in list(room.players):
+            if p is room.bot:
+                continue
+            await self.send(p, {
+                'type': 'room_closed',
+                'message': 'Phòng đã bị giải tán vì không ai hoạt động quá lâu'
+            })
+            await self.handle_leave_room(p)
+        self.m_idle_reaped.inc('room')
+        self.log.info('room', 'idle_closed', room=room.room_id)
+
+    async def sweep_idle(self, now: float) -> tuple:
+        """Một lượt dọn: giải tán phòng bỏ không rồi đóng kết nối bỏ không.
+        Quét từng lượt IDLE_SCAN_CHUNK mục, giải tán từng lượt IDLE_CLOSE_CHUNK phòng; mỗi mục
+        được kiểm tra lại ngay trước khi dọn. Trả về (số phòng giải tán, số kết nối đóng)."""
+        rooms_closed = connections_closed = 0
+        if self.room_idle_timeout > 0:
+            cutoff = now - self.room_idle_timeout
+            rooms = list(self.rooms.values())
+            idle = []
+            for start in range(0, len(rooms), IDLE_SCAN_CHUNK):
+                if start:
+                    await asyncio.sleep(0)
+                idle += [room for room in rooms[start:start + IDLE_SCAN_CHUNK] if self.room_idle(room, cutoff)]
+            for start in range(0, len(idle), IDLE_CLOSE_CHUNK):
+                if start:
+                    await asyncio.sleep(0)
+                for room in idle[start:start + IDLE_CLOSE_CHUNK]:
+                    if self.rooms.get(room.room_id) is room and self.room_idle(room, cutoff):
+                        await self.close_idle_room(room)
+                        rooms_closed += 1
+        if self.idle_timeout > 0:
+            cutoff = now - self.idle_timeout
+            clients = list(self.clients.items())
+            for start in range(0, len(clients), IDLE_SCAN_CHUNK):
+                if start:
+                    await asyncio.sleep(0)
+                for websocket, client_info in clients[start:start + IDLE_SCAN_CHUNK]:
+                    if self.clients.get(websocket) is client_info and self.connection_idle(websocket, client_info, cutoff):
+                        # Đóng như client tự ngắt: handler dọn (hoặc giữ chỗ) ở finally
+                        asyncio.ensure_future(client_info['socket'].close(code=IDLE_CLOSE_CODE,
+                                                                          reason='không hoạt động'))
+                        self.m_idle_reaped.inc('connection')
+                        connections_closed += 1
+        if rooms_closed or connections_closed:
+            self.log.info('client', 'idle_reaped', rooms=rooms_closed, connections=connections_closed)
+        return rooms_closed, connections_closed
+
+    async def reap_idle(self):
+        """Định kỳ dọn phòng / kết nối bỏ không (rỗi việc chỉ tốn một lượt quét mỗi IDLE_SWEEP giây)"""
+        while True:
+            await asyncio.sleep(IDLE_SWEEP)
+            try:
+                await self.sweep_idle(time.monotonic())
+            except Exception as e:
+                self.log.error('error', 'idle_reap_failed', error=repr(e))
+
+    def start_idle_reaper(self):
+        if (self.room_idle_timeout > 0 or self.idle_timeout > 0) and self._idle_task is None:
+            self._idle_task = asyncio.create_task(self.reap_idle())
     
-    async def handle_message(self, websocket: websockets.WebSocketServerProtocol, message: str):
-        """Xử lý tin nhắn từ client"""
+    async def handle_message(self, websocket: websockets.WebSocketServerProtocol, message: str | bytes):
+        """Xử lý tin nhắn từ client (frame text = JSON, frame binary = codec wire)"""
+        # Vượt giới hạn thì bỏ ngay, chưa tốn công giải mã (loại đoán từ đầu frame)
+        peeked = peek_type(message)
+        if not self.admit(websocket, peeked):
+            return
+        started = time.perf_counter()
+        message_type = 'invalid'
         try:
-            data = json.loads(message)
+            data = json.loads(message) if isinstance(message, str) else wire.decode(message)
             message_type = data.get('type')
+            if message_type != peeked and not self.admit(websocket, message_type, charge_total=False):
+                return
+            if message_type != 'ping':
+                self.clients[websocket]['active'] = time.monotonic()
             
             if message_type == 'get_rooms':
-                await self.handle_get_rooms(websocket)
+                await self.handle_get_rooms(websocket, data)
+            elif message_type == 'subscribe_rooms':
+                await self.handle_subscribe_rooms(websocket, data)
             elif message_type == 'create_room':
                 await self.handle_create_room(websocket, data)
             elif message_type == 'join_room':
@@ -265,115 +930,210 @@ class GameServer:
             elif message_type == 'new_game':
                 await self.handle_new_game_request(websocket)
             elif message_type == 'set_name':
-                await self.handle_set_name(websocket, data['name'])
+                await self.handle_set_name(websocket, data.get('name'))
             elif message_type == 'chat':
                 await self.handle_chat(websocket, data)
+            elif message_type == 'quick_match':
+                await self.handle_quick_match(websocket)
+            elif message_type == 'cancel_quick_match':
+                await self.handle_cancel_quick_match(websocket)
+            elif message_type == 'get_leaderboard':
+                await self.handle_get_leaderboard(websocket, data)
+            elif message_type == 'get_match_history':
+                await self.handle_get_match_history(websocket, data)
+            elif message_type == 'get_room':
+                await self.handle_get_room(websocket)
+            elif message_type == 'play_bot':
+                await self.handle_play_bot(websocket)
+            elif message_type == 'spectate':
+                await self.handle_spectate(websocket, data)
+            elif message_type == 'stop_spectating':
+                await self.handle_stop_spectating(websocket)
             elif message_type == 'ping':
-                await websocket.send(json.dumps({'type': 'pong', 't': data.get('t')}))
+                await self.send(websocket, {'type': 'pong', 't': data.get('t')})
             else:
-                print(f"Tin nhắn không xác định: {message_type}")
+                self.log.warning('error', 'unknown_message', type=message_type)
                 
-        except json.JSONDecodeError:
-            print(f"Lỗi JSON: {message}")
+        except (json.JSONDecodeError, wire.FrameError):
+            self.m_rejected.inc('invalid', 'unknown')
+            self.log.warning('error', 'invalid_frame', frame=message[:LOG_FRAME_BYTES])
         except Exception as e:
-            print(f"Lỗi xử lý tin nhắn: {e}")
+            self.log.error('error', 'handler_failed', type=message_type, error=repr(e))
+        finally:
+            label = message_type if message_type in MESSAGE_TYPES else 'unknown'
+            self.m_handler_seconds.observe(time.perf_counter() - started, label)
+
+    def admit(self, websocket, message_type: str | None, charge_total: bool = True) -> bool:
+        """Kiểm tra token bucket của kết nối. Tin nhắn vượt giới hạn bị bỏ: báo lỗi một lần cho mỗi đợt
+        vượt, bị từ chối quá rate_disconnect lần trong RATE_STRIKE_WINDOW giây thì ngắt kết nối."""
+        client_info = self.clients.get(websocket)
+        if self.rate_limits is None or client_info is None:
+            return True
+        now = time.monotonic()
+        limiter = client_info.get('limiter')
+        if limiter is None:
+            limiter = client_info['limiter'] = RateLimiter(self.rate_limits, now)
+        if message_type not in MESSAGE_TYPES:
+            message_type = None           # loại lạ chỉ tính vào bucket chung
+        if limiter.allow(message_type, now, charge_total):
+            limiter.warned = False
+            return True
+        self.m_rejected.inc('rate', message_type or 'unknown')
+        strikes = limiter.strike(now, RATE_STRIKE_WINDOW)
+        if self.rate_disconnect and strikes == self.rate_disconnect:
+            self.m_rate_disconnects.inc()
+            self.log.warning('rate', 'disconnect', player_id=client_info['id'], strikes=strikes,
+                             window=RATE_STRIKE_WINDOW)
+            socket = client_info.get('socket', websocket)
+            if socket is not None:
+                asyncio.ensure_future(socket.close(code=1008, reason='gửi quá nhanh'))
+        elif not limiter.warned:
+            limiter.warned = True
+            self.post(websocket, {'type': 'error', 'message': 'Bạn thao tác quá nhanh, vui lòng chậm lại.'})
+        return False
     
-    async def handle_get_rooms(self, websocket: websockets.WebSocketServerProtocol):
-        """Gửi danh sách phòng"""
-        await websocket.send(json.dumps({
-            'type': 'rooms_list',
-            'rooms': self.get_rooms_list()
-        }))
+    async def handle_get_rooms(self, websocket: websockets.WebSocketServerProtocol, data: dict | None = None):
+        """Gửi danh sách phòng: delta từ version client đang có nếu được, không thì snapshot"""
+        data = data or {}
+        if any(k in data for k in ('filter', 'sort', 'cursor', 'limit')):
+            await self.handle_query_rooms(websocket, data)
+            return
+        lobby_filter = self.clients[websocket].get('lobby_filter')
+        if lobby_filter:
+            # Client đăng ký view có lọc: resync bằng snapshot của view
+            await self.send(websocket, self.lobby.snapshot(lobby_filter))
+            return
+        since = data.get('since')
+        changes = self.lobby.changes_since(since) if isinstance(since, int) else None
+        if changes is not None:
+            await self.send(websocket, {
+                'type': 'rooms_delta',
+                'from_version': since,
+                'version': self.lobby.version,
+                'changes': changes
+            })
+            return
+        await self.send(websocket, self.lobby.snapshot())
     
+    async def handle_query_rooms(self, websocket: websockets.WebSocketServerProtocol, data: dict):
+        """Truy vấn phòng có lọc (game_state, has_password, joinable, name_prefix),
+        sắp xếp (oldest/newest/name) và phân trang bằng cursor/limit"""
+        flt = normalize_filter(data.get('filter'))
+        sort = data.get('sort', 'oldest')
+        try:
+            rooms, next_cursor = self.lobby.query.query(self.lobby.rooms, flt, sort,
+                                                        data.get('cursor'), data.get('limit'))
+        except (TypeError, ValueError):
+            await self.send(websocket, {'type': 'error', 'message': 'Truy vấn phòng không hợp lệ'})
+            return
+        await self.send(websocket, {
+            'type': 'rooms_page',
+            'version': self.lobby.version,
+            'filter': flt,
+            'sort': sort,
+            'rooms': rooms,
+            'next_cursor': next_cursor
+        })
+
+    async def handle_subscribe_rooms(self, websocket: websockets.WebSocketServerProtocol, data: dict):
+        """Chỉ nhận cập nhật sảnh chờ cho các phòng khớp bộ lọc (filter rỗng = toàn bộ sảnh)"""
+        flt = normalize_filter(data.get('filter'))
+        self.clients[websocket]['lobby_filter'] = flt
+        await self.send(websocket, self.lobby.snapshot(flt))
+
     async def handle_create_room(self, websocket: websockets.WebSocketServerProtocol, data: dict):
         """Tạo phòng mới"""
         # Kiểm tra người chơi đã ở trong phòng khác chưa
         current_room_id = self.get_player_room(websocket)
-        if current_room_id:
-            await websocket.send(json.dumps({
+        if current_room_id or self.clients[websocket].get('spectating'):
+            await self.send(websocket, {
                 'type': 'error',
                 'message': 'Bạn đã ở trong phòng khác. Hãy rời phòng hiện tại trước.'
-            }))
+            })
             return
         
-        room_name = data.get('room_name', f'Phòng {len(self.rooms) + 1}')
+        room_name = data.get('room_name')
+        if room_name is not None and not isinstance(room_name, str):
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Tên phòng không hợp lệ'
+            })
+            return
+        room_name = (room_name or '').strip()[:ROOM_NAME_MAX] or f'Phòng {len(self.rooms) + 1}'
         pwd_plain = (data.get('password') or '').strip()
-        pwd_hash = self._hash_password(pwd_plain) if pwd_plain else None
+        pwd_hash = None
+        if pwd_plain:
+            pwd_hash = await self.passwords.hash(pwd_plain)
+            if pwd_hash is None:
+                await self.send(websocket, {
+                    'type': 'error',
+                    'message': 'Máy chủ đang bận, hãy thử lại sau.'
+                })
+                return
+            if self.get_player_room(websocket) or self.clients[websocket].get('spectating'):
+                return      # trong lúc băm đã được ghép trận / vào phòng khác
 
-        room_id = self.create_room(room_name, 2, password_hash=pwd_hash)
+        try:
+            round_seconds = int(data.get('round_seconds') or ROUND_SECONDS)
+        except (TypeError, ValueError):
+            round_seconds = ROUND_SECONDS
+        round_seconds = max(ROUND_SECONDS_MIN, min(ROUND_SECONDS_MAX, round_seconds))
+        try:
+            max_players = int(data.get('max_players') or 2)
+        except (TypeError, ValueError):
+            max_players = 2
+        max_players = max(2, min(ROOM_PLAYERS_MAX, max_players))
+
+        room_id = self.create_room(room_name, max_players, password_hash=pwd_hash, round_seconds=round_seconds)
         room = self.get_room(room_id)
         
         # Thêm người tạo vào phòng
         player_name = self.clients[websocket]['name']
         if room.add_player(websocket, player_name):
-            self.clients[websocket]['room_id'] = room_id
-            
+            self.matchmaker.cancel(websocket)  # tự vào phòng thì rời hàng đợi ghép trận
+            if pwd_hash:
+                self.passwords.remember(room_id, self.clients[websocket]['id'], pwd_hash)
             # Thông báo cho tất cả client về phòng mới
-            await self.broadcast_rooms_update()
+            await self.broadcast_room_change(room_id)
             
             # Gửi thông tin phòng cho người tạo
             room_info = self.get_room_info_with_player_ids(room)
             
-            await websocket.send(json.dumps({
+            await self.send(websocket, {
                 'type': 'room_created',
                 'room': room_info
-            }))
+            })
             
-            print(f"Tạo phòng {room_id} bởi {player_name}")
+            self.log.info('room', 'created', room=room_id, player=player_name)
         else:
             # Xóa phòng nếu không thể thêm người chơi
             self.remove_room(room_id)
-            await websocket.send(json.dumps({
+            await self.send(websocket, {
                 'type': 'error',
                 'message': 'Không thể tạo phòng'
-            }))
+            })
     
     async def handle_join_room(self, websocket: websockets.WebSocketServerProtocol, data: dict):
         """Tham gia phòng"""
         room_id = data.get('room_id')
         room = self.get_room(room_id)
-        
-        # Kiểm tra người chơi đã ở trong phòng khác chưa
-        current_room_id = self.get_player_room(websocket)
-        if current_room_id:
-            await websocket.send(json.dumps({
-                'type': 'error',
-                'message': 'Bạn đã ở trong phòng khác. Hãy rời phòng hiện tại trước.'
-            }))
-            return
-        
-        if not room:
-            await websocket.send(json.dumps({
-                'type': 'error',
-                'message': 'Phòng không tồn tại'
-            }))
-            return
-        
-        if room.is_full():
-            await websocket.send(json.dumps({
+        refusal = self.join_refusal(websocket, room)
+        if refusal is None and room.password_hash:
+            if not await self.check_password(websocket, room, data):
+                return
+            # Trong lúc kiểm tra mật khẩu phòng có thể đã đầy / bị xóa, người chơi có thể đã được ghép trận
+            room = self.get_room(room_id)
+            refusal = self.join_refusal(websocket, room)
+        if refusal is not None:
+            await self.send(websocket, {
                 'type': 'error',
-                'message': 'Phòng đã đầy (2/2 người chơi)'
-            }))
+                'message': refusal
+            })
             return
-        if getattr(room, 'password_hash', None):
-            provided = (data.get('password') or '').strip()
-            if not provided:
-                await websocket.send(json.dumps({
-                    'type': 'error',
-                    'message': 'Phòng này yêu cầu mật khẩu.'
-                }))
-                return
-            if self._hash_password(provided) != room.password_hash:
-                await websocket.send(json.dumps({
-                    'type': 'error',
-                    'message': 'Mật khẩu không đúng.'
-                }))
-                return
         # Thêm người chơi vào phòng
         player_name = self.clients[websocket]['name']
         if room.add_player(websocket, player_name):
-            self.clients[websocket]['room_id'] = room_id
-            self.ensure_series_keys(room)  # đảm bảo có key series cho người mới
+            self.matchmaker.cancel(websocket)  # tự vào phòng thì rời hàng đợi ghép trận
             # Thông báo cho tất cả trong phòng
             room_info = self.get_room_info_with_player_ids(room)
             
@@ -384,15 +1144,162 @@ class GameServer:
             })
             
             # Cập nhật danh sách phòng cho tất cả
-            await self.broadcast_rooms_update()
+            await self.broadcast_room_change(room_id)
             
-            print(f"{player_name} tham gia phòng {room_id}")
+            self.log.info('room', 'joined', room=room_id, player=player_name)
         else:
-            await websocket.send(json.dumps({
+            await self.send(websocket, {
                 'type': 'error',
                 'message': 'Không thể tham gia phòng'
-            }))
+            })
     
+    def join_refusal(self, websocket, room: GameRoom | None) -> str | None:
+        """Lý do không vào được phòng (None = vào được, chưa xét mật khẩu)"""
+        # Kiểm tra người chơi đã ở trong phòng khác chưa
+        if self.get_player_room(websocket) or self.clients[websocket].get('spectating'):
+            return 'Bạn đã ở trong phòng khác. Hãy rời phòng hiện tại trước.'
+        if not room:
+            return 'Phòng không tồn tại'
+        if room.is_full():
+            return f'Phòng đã đầy ({len(room.seats)}/{room.max_players} người chơi)'
+        return None
+
+    async def check_password(self, websocket, room: GameRoom, data: dict) -> bool:
+        """Phòng có mật khẩu: kiểm tra mật khẩu trong data (trong thread pool), sai thì báo lỗi và trả False.
+        Người vừa nhập đúng mật khẩu hiện tại của phòng thì không kiểm tra lại; mỗi kết nối chỉ được
+        sai PASSWORD_ATTEMPTS lần rồi bị từ chối mà không tốn lượt băm."""
+        if not room.password_hash:
+            return True
+        client_info = self.clients[websocket]
+        stored = room.password_hash
+        if self.passwords.is_verified(room.room_id, client_info['id'], stored):
+            return True
+        provided = (data.get('password') or '').strip()
+        if not provided:
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Phòng này yêu cầu mật khẩu.'
+            })
+            return False
+        attempts = client_info.get('password_attempts')
+        if attempts is None:
+            attempts = client_info['password_attempts'] = TokenBucket(*PASSWORD_ATTEMPTS, time.monotonic())
+        if not attempts.take(time.monotonic()):
+            self.passwords.stats['locked'] += 1
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Bạn đã nhập sai mật khẩu quá nhiều lần. Hãy thử lại sau.'
+            })
+            return False
+        ok = await self.passwords.verify(provided, stored)
+        if not ok:
+            if ok is None:
+                attempts.refund()
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Mật khẩu không đúng.' if ok is False else 'Máy chủ đang bận, hãy thử lại sau.'
+            })
+            return False
+        attempts.refund()       # chỉ lần sai mới tính
+        self.passwords.remember(room.room_id, client_info['id'], stored)
+        return True
+
+    async def handle_spectate(self, websocket: websockets.WebSocketServerProtocol, data: dict):
+        """Xem một phòng mà không chiếm chỗ (không tính vào is_full)"""
+        if self.get_player_room(websocket):
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Bạn đang chơi trong một phòng. Hãy rời phòng trước khi xem phòng khác.'
+            })
+            return
+        room = self.get_room(data.get('room_id'))
+        if not room or room.bot is not None:
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Phòng không tồn tại'
+            })
+            return
+        if not await self.check_password(websocket, room, data):
+            return
+        if self.get_player_room(websocket):
+            return      # đã được ghép trận trong lúc kiểm tra mật khẩu
+        if self.get_room(room.room_id) is not room:
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Phòng không tồn tại'
+            })
+            return
+        # Đang chờ ghép trận thì rời hàng đợi: người xem không được ghép vào phòng khác
+        if self.matchmaker.cancel(websocket):
+            await self.send(websocket, {'type': 'match_cancelled'})
+        self.stop_spectating(websocket)
+        self.clients[websocket]['spectating'] = room.room_id
+        if not room.spectators:
+            room.spectators = set()
+        room.spectators.add(websocket)
+        self.publish_to_spectators(room, {
+            'type': 'spectating',
+            'room': self.get_room_info_with_player_ids(room)
+        }, {}, (websocket,), group=None)
+
+    async def handle_stop_spectating(self, websocket: websockets.WebSocketServerProtocol):
+        self.stop_spectating(websocket)
+
+    def stop_spectating(self, websocket):
+        client_info = self.clients.get(websocket)
+        room_id = client_info.get('spectating') if client_info else None
+        if room_id:
+            client_info['spectating'] = None
+            room = self.get_room(room_id)
+            if room and room.spectators:
+                room.spectators.discard(websocket)
+
+    def spectator_snapshot(self, websocket):
+        """Frame đồng bộ lại cho người xem bị lỡ nhịp: toàn bộ phòng đang xem"""
+        client_info = self.clients.get(websocket)
+        room = self.get_room(client_info.get('spectating')) if client_info else None
+        if room is None:
+            return None
+        return self.frame_for(websocket, {'type': 'room_updated', 'room': self.get_room_info_with_player_ids(room)}, {})
+
+    def publish_to_spectators(self, room: GameRoom, message: dict, frames: dict, recipients=None,
+                              group: str | None = 'room'):
+        """Giao message cho task chia frame của phòng; người gọi không chờ người xem nào.
+        recipients=None: mọi người đang xem phòng lúc chia.
+        group='room': người xem chậm có thể bị bỏ frame này (nhận lại cả phòng); None = phải tới nơi."""
+        if room.audience is None:
+            room.audience = deque()
+        room.audience.append((message, frames, recipients, group))
+        if room.audience_task is None:
+            room.audience_task = asyncio.create_task(self.fan_out_to_spectators(room))
+
+    async def fan_out_to_spectators(self, room: GameRoom):
+        """Chia frame (đã mã hóa một lần) vào hàng đợi riêng của từng người xem, theo lượt
+        SPECTATOR_FANOUT_CHUNK người để khán giả đông không giữ event loop của người chơi"""
+        try:
+            while room.audience:
+                message, frames, recipients, group = room.audience.popleft()
+                targets = list(room.spectators if recipients is None else recipients)
+                for start in range(0, len(targets), SPECTATOR_FANOUT_CHUNK):
+                    if start:
+                        await asyncio.sleep(0)
+                    for ws in targets[start:start + SPECTATOR_FANOUT_CHUNK]:
+                        if recipients is None and ws not in room.spectators:
+                            continue   # đã thôi xem trong lúc chia
+                        self.queue_to_spectator(ws, message, frames, group)
+        finally:
+            room.audience_task = None
+            if not room.audience:
+                room.audience = None
+
+    def queue_to_spectator(self, websocket, message: dict, frames: dict, group: str | None):
+        """Xếp frame vào hàng đợi riêng của người xem (không chờ socket)"""
+        outbox = self.outbox_of(websocket)
+        if outbox is None:
+            return
+        self.spectator_frames += 1
+        outbox.put(self.frame_for(websocket, message, frames), group, message['type'])
+
     async def handle_leave_room(self, websocket: websockets.WebSocketServerProtocol):
         """Rời phòng"""
         room_id = self.get_player_room(websocket)
@@ -403,15 +1310,16 @@ class GameServer:
         player_name = self.clients[websocket]['name']
         
         room.remove_player(websocket)
-        self.clients[websocket]['room_id'] = None
-        # TODO:
-        # Nếu đang trong 1 ván, hủy timer để tránh task “mồ côi”
-        if getattr(room, 'round_task', None):
-            try:
-                room.round_task.cancel()
-            except Exception:
-                pass
-            room.round_task = None
+        playing = room.game_state == 'playing'
+        if len(room.seats) < 2:
+            # Không đủ người để tiếp tục ván: hủy hạn chót và quay về chờ
+            self._cancel_round_timer(room)
+            if playing:
+                room.clear_round()
+                room.game_state = 'waiting'
+                playing = False
+        if room.bot is not None and len(room.seats) == 1 and room.bot in room.seats:
+            self.remove_bot(room)
 
         # Thông báo cho những người còn lại
         room_info = self.get_room_info_with_player_ids(room)
@@ -421,17 +1329,70 @@ class GameServer:
             'player_name': player_name,
             'room': room_info
         })
-        
-        # Cập nhật danh sách phòng cho tất cả
-        await self.broadcast_rooms_update()
+        # Những người còn lại đều đã chọn: kết thúc ván ngay thay vì chờ hết giờ
+        if playing and room.all_chosen():
+            await self.process_game_result(room_id)
         
         # Nếu phòng trống, xóa phòng
-        if len(room.players) == 0:
+        if not room.seats:
             self.remove_room(room_id)
-            await self.broadcast_rooms_update()
+
+        # Cập nhật danh sách phòng cho tất cả (room_changed hoặc room_removed)
+        await self.broadcast_room_change(room_id)
         
-        print(f"{player_name} rời phòng {room_id}")
+        self.log.info('room', 'left', room=room_id, player=player_name)
     
+    async def handle_play_bot(self, websocket: websockets.WebSocketServerProtocol):
+        """Tạo phòng riêng đấu với bot của server (không hiện trên sảnh chờ)"""
+        if self.get_player_room(websocket) or self.clients[websocket].get('spectating'):
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Bạn đã ở trong phòng khác. Hãy rời phòng hiện tại trước.'
+            })
+            return
+        self.matchmaker.cancel(websocket)
+        room_id = self.create_room(BOT_ROOM_NAME, 2)
+        room = self.get_room(room_id)
+        bot = room.bot = BotPlayer(self.get_next_bot_id())
+        self.clients[bot] = {'id': bot.player_id, 'room_id': None, 'name': BOT_NAME, 'bot': True}
+        self.bot_rooms += 1
+        room.add_player(websocket, self.clients[websocket]['name'])
+        room.add_player(bot, BOT_NAME)
+        room.set_ready(bot)
+        self.mark_snapshot(room_id)
+        await self.send(websocket, {
+            'type': 'room_created',
+            'room': self.get_room_info_with_player_ids(room)
+        })
+        self.log.info('room', 'bot_created', room=room_id, player=self.clients[websocket]['name'])
+
+    def remove_bot(self, room: GameRoom):
+        """Người chơi đã rời phòng bot: gỡ bot để phòng trống và bị xóa"""
+        bot = room.bot
+        room.remove_player(bot)
+        self._bot_turns.pop(room.room_id, None)
+        if bot in self.clients:
+            self.index.remove_client(bot)
+            del self.clients[bot]
+            self.bot_rooms -= 1
+
+    async def handle_get_room(self, websocket: websockets.WebSocketServerProtocol):
+        """Gửi lại toàn bộ phòng hiện tại (client lỡ một diff / lệch version)"""
+        room = self.get_room(self.get_player_room(websocket))
+        if room:
+            await self.send(websocket, {
+                'type': 'room_updated',
+                'room': self.get_room_info_with_player_ids(room)
+            })
+        elif self.clients[websocket].get('spectating'):
+            # Người xem: đi cùng đường với các diff đang chờ chia để giữ thứ tự
+            room = self.get_room(self.clients[websocket]['spectating'])
+            if room:
+                self.publish_to_spectators(room, {
+                    'type': 'room_updated',
+                    'room': self.get_room_info_with_player_ids(room)
+                }, {}, (websocket,), group=None)
+
     async def handle_ready(self, websocket):
         """Người chơi sẵn sàng"""
         room_id = self.get_player_room(websocket)
@@ -439,32 +1400,32 @@ class GameServer:
             return
 
         room = self.get_room(room_id)
-        room.ready_players.add(websocket)
+        room.set_ready(websocket)
 
-        # Thông báo ai vừa ready
-        room_info = self.get_room_info_with_player_ids(room)
+        # Thông báo ai vừa ready (chỉ gửi cờ ready thay đổi)
         await self.broadcast_to_room(room_id, {
             'type': 'player_ready',
             'player_name': self.clients[websocket]['name'],
-            'room': room_info
+            **self.room_diff(room, ready={self.clients[websocket]['id']: True})
         })
 
-        # ✅ Chỉ khi tất cả cùng sẵn sàng mới bắt đầu
-        if room.can_start_game():
+        # ✅ Chỉ khi tất cả cùng sẵn sàng mới bắt đầu (handler khác có thể đã bắt đầu trong lúc chờ gửi)
+        if room.can_start_game() and room.game_state != 'playing':
             if room.series_over:
                 self.reset_series(room)
 
             room.game_state = 'playing'
+            await self.broadcast_room_change(room_id)
             is_first_game = all(
-                room.scores[p]['wins'] == 0 and
-                room.scores[p]['losses'] == 0 and
-                room.scores[p]['draws'] == 0
-                for p in room.players
+                seat.wins == 0 and
+                seat.losses == 0 and
+                seat.draws == 0
+                for seat in room.seats.values()
             )
 
             await self.broadcast_to_room(room_id, {
                 'type': 'game_start',
-                'room': self.get_room_info_with_player_ids(room),
+                **self.room_diff(room, game_state='playing'),
                 'is_first_game': is_first_game,
                 'both_ready': True,
                 'series': {
@@ -472,10 +1433,11 @@ class GameServer:
                     'wins': self.series_wins_by_id(room),
                     'over': room.series_over,
                     'winner_id': None
-                }
+                },
+                'round_seconds': room.round_seconds
             })
-            # 🕒 Bắt đầu timer server-side 10s
-            self._start_round_timer(room, 10)
+            # 🕒 Bắt đầu timer server-side cho ván
+            self._start_round_timer(room)
 
     
     async def handle_choice(self, websocket: websockets.WebSocketServerProtocol, choice: str):
@@ -485,121 +1447,169 @@ class GameServer:
             return
         
         room = self.get_room(room_id)
-        if room.game_state != 'playing':
+        if room.game_state != 'playing' or choice not in CHOICE_CHARS:
             return
         
-        room.choices[websocket] = choice
+        room.choose(websocket, choice)
+        self.mark_snapshot(room_id)
         player_name = self.clients[websocket]['name']
         
-        # Thông báo cho phòng
-        await self.broadcast_to_room(room_id, {
-            'type': 'player_chose',
-            'player_name': player_name
-        })
+        # Thông báo cho phòng (phòng đông chỉ xác nhận cho người vừa chọn)
+        chose = {'type': 'player_chose', 'player_name': player_name}
+        if len(room.players) > CHOSE_BROADCAST_MAX:
+            await self.send_many((websocket,), chose)
+        else:
+            await self.broadcast_to_room(room_id, chose)
         
         # Kiểm tra nếu tất cả đã chọn
-        if len(room.choices) == len(room.players):
+        if room.all_chosen():
             await self.process_game_result(room_id)
     
-    async def process_game_result(self, room_id: str):
+    async def process_game_result(self, room_id: str, timed_out: bool = False):
         """Xử lý kết quả game (cộng điểm + Bo3)"""
         room = self.get_room(room_id)
         if not room:
             return
+        self.m_rounds.inc('timeout' if timed_out else 'all_chosen')
 
         # Hủy timer nếu còn chạy
-        if getattr(room, 'round_task', None):
-            try:
-                room.round_task.cancel()
-            except Exception:
-                pass
-            room.round_task = None
+        self._cancel_round_timer(room)
 
-        # Nhóm lựa chọn theo loại
-        choices_by_type = {}
-        for player, choice in room.choices.items():
-            if choice not in choices_by_type:
-                choices_by_type[choice] = []
-            choices_by_type[choice].append(player)
-
-        # So sánh và tính kết quả
-        results = self.compare_choices(choices_by_type)
+        # Đếm lựa chọn -> nước thắng -> kết quả của từng người
+        counts, winning_choice, results = self.resolve_round(room.choices())
 
         # Cập nhật điểm số bảng tổng (thắng/thua/hòa)
         self.update_scores(room, results)
+        self.mark_snapshot(room_id)
+        stats = self.player_stats if room.bot is None else None   # ván với bot không vào bảng xếp hạng
+        if room.bot is not None:
+            self.observe_bot_round(room)
+        if stats is not None:
+            named = {p: self.stats_name(p) for p in results}
+            stats.record_round({named[p]: r for p, r in results.items() if named[p]})
 
         # ---- Bo3: Cộng điểm series cho người THẮNG (không cộng khi hòa) ----
-        self.ensure_series_keys(room)
         for p, r in results.items():
             if r == 'win':
-                room.series_wins[p] = room.series_wins.get(p, 0) + 1
+                room.seats[p].series_wins += 1
     
         # Kiểm tra kết thúc series
         target = (room.series_best_of + 1) // 2  # Bo3 -> 2; Bo5 -> 3
         winner_ws = None
-        for p, w in room.series_wins.items():
-            if w >= target:
+        for p, seat in room.seats.items():
+            if seat.series_wins >= target:
                 room.series_over = True
                 winner_ws = p
                 break
+        if winner_ws is not None and stats is not None and self.stats_name(winner_ws):
+            losers = [self.stats_name(p) for p in room.players if p is not winner_ws]
+            stats.record_series(self.stats_name(winner_ws), [name for name in losers if name])
+        if self.match_log is not None:
+            self.log_round(room, results, timed_out, winner_ws)
+
+        if room.max_players > 2:
+            message = self.round_result(room, counts, winning_choice, results, winner_ws)
+        else:
+            message = self.game_result(room, results, winner_ws)
+
+        # Reset cho vòng tiếp theo (không reset series ở đây!) trước khi gửi:
+        # trong lúc chờ gửi, client có thể đã bấm "ván mới"
+        room.clear_round()
+        room.game_state = 'waiting'
+
+        await self.broadcast_to_room(room_id, message)
+        await self.broadcast_room_change(room_id)
+
+        if self.log.wants('info', 'game'):
+            self.log.emit('info', 'game', 'round_result', {'room': room_id, 'players': len(results),
+                                                           'winner': winning_choice, 'counts': counts,
+                                                           'timed_out': timed_out})
 
-        # Payload gửi xuống client (thêm nhánh 'series')
-        game_result = {
+    def game_result(self, room: GameRoom, results: dict, winner_ws) -> dict:
+        """Kết quả ván phòng 2 người: lựa chọn / kết quả / điểm theo tên từng người"""
+        return {
             'type': 'game_result',
-            'choices': {self.clients[p]['name']: c for p, c in room.choices.items()},
+            'choices': {self.clients[p]['name']: seat.choice for p, seat in room.seats.items()
+                        if seat.choice is not None},
             'results': {self.clients[p]['name']: r for p, r in results.items()},
-            'scores': {self.clients[p]['name']: {
-                'wins': room.scores[p]['wins'], 'losses': room.scores[p]['losses'], 'draws': room.scores[p]['draws']
-            } for p in room.players},
+            'scores': {self.clients[p]['name']: seat.score() for p, seat in room.seats.items()},
             'series': {
                 'best_of': room.series_best_of,
                 'wins': self.series_wins_by_id(room),             # {player_id: wins}
                 'over': room.series_over,
                 'winner_id': self.clients[winner_ws]['id'] if winner_ws else None
-            }
+            },
+            # Điểm mới đã nằm trong 'scores'; phòng chỉ đổi trạng thái và bỏ cờ ready
+            **self.room_diff(room, game_state='waiting',
+                             ready={self.clients[p]['id']: False for p, seat in room.seats.items()
+                                    if seat.ready and p is not room.bot})
         }
 
-        await self.broadcast_to_room(room_id, game_result)
-
-        # Cập nhật thông tin phòng (client cần player_id)
-        await self.broadcast_to_room(room_id, {
-            'type': 'room_updated',
-            'room': self.get_room_info_with_player_ids(room)
-        })
-
-        # Reset cho vòng tiếp theo (không reset series ở đây!)
-        room.choices.clear()
-        room.ready_players.clear()
-        room.game_state = 'waiting'
-
-        print(f"Kết quả phòng {room_id}: {game_result['results']}")
+    def round_result(self, room: GameRoom, counts: dict, winning_choice: str | None, results: dict,
+                     winner_ws) -> dict:
+        """Kết quả ván phòng nhiều người trong một frame gọn, như nhau cho mọi người nhận:
+        số người chọn mỗi nước, nước thắng, và lựa chọn / kết quả mỗi người là 1 ký tự theo
+        thứ tự room.players ('-' = không tham gia ván). Điểm không gửi lại: client đang ở
+        from_version tự cộng theo 'results', lỡ version thì xin get_room như các diff khác."""
+        seats = room.seats.values()
+        return {
+            'type': 'round_result',
+            'counts': counts,
+            'winning_choice': winning_choice,
+            'choices': ''.join([CHOICE_CHARS[seat.choice] if seat.choice is not None else '-' for seat in seats]),
+            'results': ''.join([RESULT_CHARS[results[p]] if p in results else '-' for p in room.players]),
+            'series': {
+                'best_of': room.series_best_of,
+                'over': room.series_over,
+                'winner_id': self.clients[winner_ws]['id'] if winner_ws else None
+            },
+            **self.room_diff(room, game_state='waiting', ready_all=False)
+        }
 
     
+    def log_round(self, room: GameRoom, results: dict, timed_out: bool, winner_ws):
+        """Ghi mỗi người chơi của ván vừa xong thành một bản ghi cố định (liền nhau)"""
+        log = self.match_log
+        round_id = log.new_round()
+        ts = time.time()
+        started = room.round_started_at
+        duration_ms = int((asyncio.get_running_loop().time() - started) * 1000) if started else 0
+        room_key = int(room.room_id, 16)
+        flags = (FLAG_SERIES_OVER if room.series_over else 0) | (FLAG_TIMED_OUT if timed_out else 0)
+        for p, result in results.items():
+            info = self.clients[p]
+            seat = room.seats[p]
+            log.append(ts, round_id, room_key, info['id'], duration_ms, name_key(info['name']),
+                       CHOICE_CODES.get(seat.choice, 0), seat.auto, RESULT_CODES[result],
+                       seat.series_wins, room.series_best_of,
+                       flags | (FLAG_SERIES_WINNER if p is winner_ws else 0))
+
     async def handle_new_game_request(self, websocket):
         """Xử lý yêu cầu chơi lại"""
         room_id = self.get_player_room(websocket)
         if not room_id:
             return
         room = self.get_room(room_id)
-        room.ready_players.add(websocket)
+        room.set_ready(websocket)
     
         # Thông báo người đã bấm Chơi lại
         player_name = self.clients[websocket]['name']
         await self.broadcast_to_room(room_id, {
             'type': 'player_ready_for_new_game',
             'player_name': player_name,
-            'room': self.get_room_info_with_player_ids(room)
+            **self.room_diff(room, ready={self.clients[websocket]['id']: True})
         })
 
-        # ✅ Khi cả hai đều bấm Chơi lại
-        if len(room.ready_players) == len(room.players):
+        # ✅ Khi cả hai đều bấm Chơi lại (và chưa có handler nào bắt đầu ván trong lúc chờ gửi)
+        if room.ready_count == len(room.seats) and room.game_state != 'playing':
             if room.series_over:
                 self.reset_series(room)
 
             room.game_state = 'playing'
+            await self.broadcast_room_change(room_id)
             await self.broadcast_to_room(room_id, {
                 'type': 'game_start',
-                'room': self.get_room_info_with_player_ids(room),
+                **self.room_diff(room, game_state='playing'),
                 'is_first_game': False,
                 'both_ready': True,
                 'series': {
@@ -607,55 +1617,592 @@ class GameServer:
                     'wins': self.series_wins_by_id(room),
                     'over': room.series_over,
                     'winner_id': None
-                }
+                },
+                'round_seconds': room.round_seconds
             })
             # 🕒 Timer cho ván mới
-            self._start_round_timer(room, 10)
+            self._start_round_timer(room)
 
 
     
+    async def handle_quick_match(self, websocket: websockets.WebSocketServerProtocol):
+        """Vào hàng đợi ghép trận; ghép được thì tạo phòng và bắt đầu series ngay"""
+        if self.get_player_room(websocket) or self.clients[websocket].get('spectating'):
+            await self.send(websocket, {
+                'type': 'error',
+                'message': 'Bạn đã ở trong phòng khác. Hãy rời phòng hiện tại trước.'
+            })
+            return
+        if websocket in self.matchmaker:
+            return
+
+        now = asyncio.get_running_loop().time()
+        partner = self.matchmaker.push(websocket, skill_of(self.clients[websocket].get('record')), now)
+        if partner is None:
+            await self.send(websocket, {
+                'type': 'match_queued',
+                'queue_depth': len(self.matchmaker)
+            })
+            if self._match_task is None or self._match_task.done():
+                self._match_task = asyncio.create_task(self.run_matchmaker())
+            return
+
+        self.m_match_wait.observe(now - partner.enqueued_at)
+        self.m_match_wait.observe(0.0)
+        await self.start_quick_match(partner.player, websocket)
+
+    async def handle_cancel_quick_match(self, websocket: websockets.WebSocketServerProtocol):
+        if self.matchmaker.cancel(websocket):
+            await self.send(websocket, {'type': 'match_cancelled'})
+
+    async def run_matchmaker(self):
+        """Định kỳ ghép lại những người còn chờ theo khoảng trình độ đã nới rộng"""
+        loop = asyncio.get_running_loop()
+        while len(self.matchmaker):
+            await asyncio.sleep(MATCH_SWEEP_INTERVAL)
+            now = loop.time()
+            pairs = self.matchmaker.sweep(now)
+            if not pairs:
+                continue
+            for a, b in pairs:
+                self.m_match_wait.observe(now - a.enqueued_at)
+                self.m_match_wait.observe(now - b.enqueued_at)
+            results = await asyncio.gather(*(self.start_quick_match(a.player, b.player) for a, b in pairs),
+                                           return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    self.log.error('error', 'match_failed', error=repr(result))
+
+    async def start_quick_match(self, first, second):
+        """Tạo phòng cho cặp vừa ghép, coi cả hai đã sẵn sàng và bắt đầu ván đầu của series"""
+        players = (first, second)
+        names = [self.clients[ws]['name'] for ws in players]
+        room_id = self.create_room(f"Ghép trận: {names[0]} vs {names[1]}", 2)
+        room = self.get_room(room_id)
+        for ws, name in zip(players, names):
+            room.add_player(ws, name)
+            room.set_ready(ws)
+        room.game_state = 'playing'
+
+        room_info = self.get_room_info_with_player_ids(room)
+        await self.broadcast_to_room(room_id, {
+            'type': 'match_found',
+            'room': room_info
+        })
+        await self.broadcast_room_change(room_id)
+        await self.broadcast_to_room(room_id, {
+            'type': 'game_start',   # phòng đầy đủ vừa gửi trong match_found
+            'is_first_game': True,
+            'both_ready': True,
+            'series': {
+                'best_of': room.series_best_of,
+                'wins': self.series_wins_by_id(room),
+                'over': room.series_over,
+                'winner_id': None
+            },
+            'round_seconds': room.round_seconds
+        })
+        self._start_round_timer(room)
+        self.log.info('room', 'matched', room=room_id, players=names)
+
+    async def handle_get_leaderboard(self, websocket: websockets.WebSocketServerProtocol, data: dict):
+        """Bảng xếp hạng, đọc hoàn toàn từ cache trong RAM"""
+        try:
+            limit = int(data.get('limit') or LEADERBOARD_SIZE)
+        except (TypeError, ValueError):
+            limit = LEADERBOARD_SIZE
+        limit = max(1, min(TOP_K, limit))
+        stats = self.player_stats
+        name = self.stats_name(websocket)
+        await self.send(websocket, {
+            'type': 'leaderboard',
+            'players': stats.leaderboard(limit) if stats else [],
+            'me': stats.get(name) if stats and name else None
+        })
+
+    async def handle_get_match_history(self, websocket: websockets.WebSocketServerProtocol, data: dict):
+        """Các ván gần nhất của người chơi (theo tên), phân trang bằng con trỏ `before`"""
+        try:
+            limit = int(data.get('limit') or HISTORY_PAGE_SIZE)
+            before = data.get('before')
+            before = int(before) if before is not None else None
+        except (TypeError, ValueError):
+            limit, before = HISTORY_PAGE_SIZE, None
+        limit = max(1, min(HISTORY_PAGE_MAX, limit))
+        rounds, next_cursor = [], None
+        log = self.match_log
+        if log is not None:
+            positions, next_cursor = log.history(self.clients[websocket]['name'], limit, before)
+            # Đọc file trên thread của nhật ký, không chặn event loop
+            for own, records in await log.rounds(positions):
+                entry = decode(own)
+                entry['opponents'] = [
+                    {k: v for k, v in decode(r).items() if k in HISTORY_OPPONENT_FIELDS}
+                    for r in records if r[F_PLAYER] != own[F_PLAYER]
+                ]
+                rounds.append(entry)
+        await self.send(websocket, {
+            'type': 'match_history',
+            'rounds': rounds,
+            'next_cursor': next_cursor
+        })
+
     async def handle_set_name(self, websocket: websockets.WebSocketServerProtocol, name: str):
         """Đặt tên người chơi"""
+        name = clean_name(name)
+        if name is None:
+            await self.send(websocket, {
+                'type': 'error',
+                'message': f'Tên không hợp lệ (1-{PLAYER_NAME_MAX} ký tự)'
+            })
+            return
         self.clients[websocket]['name'] = name
         
         # Cập nhật tên trong phòng nếu đang ở phòng
         room_id = self.get_player_room(websocket)
         if room_id:
             room = self.get_room(room_id)
-            if websocket in room.scores:
-                room.scores[websocket]['name'] = name
+            seat = room.seats.get(websocket)
+            if seat is not None:
+                seat.name = name
                 await self.broadcast_to_room(room_id, {
                     'type': 'player_renamed',
                     'player_name': name,
-                    'room': room.get_room_info()
+                    **self.room_diff(room, renamed={self.clients[websocket]['id']: name})
                 })
+                await self.broadcast_room_change(room_id)
     
+    def is_binary(self, websocket) -> bool:
+        client_info = self.clients.get(websocket)
+        return client_info is not None and client_info.get('binary', False)
+
+    async def send(self, websocket, message: dict):
+        """Gửi một message theo codec của kết nối (JSON text hoặc nhị phân).
+        Chỉ xếp vào hàng đợi gửi của kết nối; không chờ socket."""
+        self.post(websocket, message)
+
+    def post(self, websocket, message: dict):
+        """Như send() nhưng gọi được từ code đồng bộ"""
+        outbox = self.outbox_of(websocket)
+        if outbox is not None:
+            outbox.put(wire.encode(message) if self.is_binary(websocket) else json.dumps(message),
+                       None, message.get('type'))
+
+    def outbox_of(self, websocket) -> Outbox | None:
+        """Hàng đợi gửi của kết nối (tạo khi gửi lần đầu); None nếu kết nối đã rời,
+        đang chờ kết nối lại, hoặc là bot"""
+        client_info = self.clients.get(websocket)
+        if client_info is None or client_info.get('bot'):
+            return None
+        outbox = client_info.get('outbox')
+        if outbox is None:
+            socket = client_info.get('socket', websocket)
+            if socket is None:
+                return None
+            outbox = client_info['outbox'] = Outbox(
+                socket, self.send_queue, self.slow_client_grace, self.resync, on_overflow=self.drop_slow_client,
+                on_error=self.report_send_failure, stats=self.send_stats, session=websocket)
+        return outbox
+
+    def drop_slow_client(self, outbox: Outbox):
+        """Kết nối không nhận kịp cả frame bắt buộc: ngắt để khỏi giữ hàng đợi (client tự kết nối lại)"""
+        client_info = self.clients.get(outbox.session)
+        self.log.warning('send', 'slow_client_dropped', player_id=client_info['id'] if client_info else None,
+                         queue=self.send_queue, grace=self.slow_client_grace)
+        asyncio.ensure_future(outbox.websocket.close(code=1008, reason='nhận quá chậm'))
+
+    def lobby_snapshot(self, websocket):
+        """Frame đồng bộ lại sảnh chờ (theo bộ lọc của client) thay cho các rooms_delta đã bỏ"""
+        client_info = self.clients.get(websocket)
+        if client_info is None:
+            return None
+        return self.frame_for(websocket, self.lobby.snapshot(client_info.get('lobby_filter')), {})
+
+    def frame_for(self, websocket, message: dict, frames: dict):
+        """Frame của message theo codec của kết nối; frames giữ bản đã mã hóa để dùng lại"""
+        binary = self.is_binary(websocket)
+        frame = frames.get(binary)
+        if frame is None:
+            frame = frames[binary] = wire.encode(message) if binary else json.dumps(message)
+        return frame
+
+    async def send_many(self, recipients, message: dict, frames: dict | None = None, group: str | None = None):
+        """Mã hóa message một lần cho mỗi codec rồi xếp vào hàng đợi gửi của từng người nhận.
+        Một socket chậm không chặn những người nhận còn lại (lỗi gửi được ghi lại ở task ghi).
+        frames: bản đã mã hóa theo codec (có thể dùng chung với người xem).
+        group: nhóm frame được phép bỏ / gộp khi hàng đợi của người nhận đầy (None = phải tới nơi)."""
+        recipients = list(recipients)
+        if not recipients:
+            return
+        self.m_fanout.observe(len(recipients))
+        frames = {} if frames is None else frames
+        kind = message.get('type')
+        for ws in recipients:
+            outbox = self.outbox_of(ws)
+            if outbox is not None:
+                outbox.put(self.frame_for(ws, message, frames), group, kind)
+
+    def report_send_failure(self, websocket, message_type: str, err: BaseException):
+        """Ghi lại lỗi gửi của từng người nhận"""
+        self.m_send_failures.inc(message_type if message_type else 'unknown')
+        client_info = self.clients.get(websocket)
+        player_id = client_info['id'] if client_info else None
+        if isinstance(err, websockets.exceptions.ConnectionClosed):
+            self.log.info('send', 'connection_closed', player_id=player_id, type=message_type)
+        else:
+            self.log.error('error', 'send_failed', player_id=player_id, type=message_type, error=repr(err))
+
     async def broadcast_to_room(self, room_id: str, message: dict):
         """Gửi tin nhắn cho tất cả trong phòng"""
         room = self.get_room(room_id)
-        if room:
-            for player in room.players:
-                try:
-                    await player.send(json.dumps(message))
-                except:
-                    pass
+        if not room:
+            return
+        frames = {}
+        await self.send_many(room.players, message, frames)
+        # Người xem nhận cùng frame sau khi người chơi đã được gửi xong, qua task chia frame
+        # và hàng đợi riêng: khán giả đông hay chậm không làm chậm người chơi
+        if room.spectators:
+            self.publish_to_spectators(room, message, frames)
     
-    async def broadcast_rooms_update(self):
-        rooms_list = self.get_rooms_list()
-        for client in list(self.clients.keys()):
+    async def broadcast_room_change(self, room_id: str):
+        """Đánh dấu phòng cần cập nhật trên sảnh chờ.
+        Các thay đổi trong cửa sổ lobby_window được gộp thành một frame rooms_delta."""
+        self.lobby_stats['events'] += 1
+        self._lobby_dirty.add(room_id)
+        self.mark_snapshot(room_id)
+        if self.lobby_window <= 0:
+            await self.flush_lobby()
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._lobby_last_mark = now
+        if self._lobby_timer is None:
+            self._lobby_first_mark = now
+            self._lobby_timer = loop.call_at(now + self.lobby_window, self._on_lobby_timer)
+
+    def _lobby_deadline(self) -> float:
+        # Chờ thêm khi còn thay đổi liên tục, nhưng không quá lobby_max_staleness
+        return min(self._lobby_last_mark + self.lobby_window,
+                   self._lobby_first_mark + self.lobby_max_staleness)
+
+    def _on_lobby_timer(self):
+        loop = asyncio.get_running_loop()
+        deadline = self._lobby_deadline()
+        if loop.time() < deadline:
+            self._lobby_timer = loop.call_at(deadline, self._on_lobby_timer)
+            return
+        self._lobby_timer = None
+        asyncio.ensure_future(self.flush_lobby())
+
+    async def flush_lobby(self):
+        """Gửi ngay mọi thay đổi sảnh chờ đang chờ trong một frame rooms_delta"""
+        if self._lobby_timer is not None:
+            self._lobby_timer.cancel()
+            self._lobby_timer = None
+        dirty, self._lobby_dirty = self._lobby_dirty, set()
+        if not dirty:
+            return
+        from_version = self.lobby.version
+        changes = []
+        transitions = []    # (room_id, tóm tắt cũ, tóm tắt mới) cho các view có lọc
+        for room_id in dirty:
+            old = self.lobby.rooms.get(room_id)
             try:
-                await client.send(json.dumps({'type': 'rooms_list', 'rooms': rooms_list}))
-            except:
-                pass
+                delta = self.lobby.publish(room_id, self.current_lobby_summary(room_id))
+            except Exception as e:
+                # Một phòng hỏng không được làm mất cả lô của mọi phòng khác
+                self.log.error('error', 'lobby_publish_failed', room=room_id, error=repr(e))
+                continue
+            if delta:
+                changes.append(delta)
+                transitions.append((room_id, old, self.lobby.rooms.get(room_id)))
+        pending = self.lobby_stats['events'] - self.lobby_stats['broadcasts'] - self.lobby_stats['saved']
+        if not changes:
+            self.lobby_stats['saved'] += pending
+            return
+        self.lobby_stats['broadcasts'] += 1
+        self.lobby_stats['saved'] += pending - 1
+        try:
+            await self.deliver_lobby_changes(from_version, changes, transitions)
+        except Exception as e:
+            # Lô đã vào lịch sử sảnh chờ: client thấy lệch version sẽ tự tải lại
+            self.log.error('error', 'lobby_deliver_failed', version=self.lobby.version, error=repr(e))
+
+    def current_lobby_summary(self, room_id: str) -> dict | None:
+        """Tóm tắt hiện tại của phòng để công bố lên sảnh (None = phòng không còn)"""
+        room = self.get_room(room_id)
+        return self.get_lobby_summary(room) if room and room.bot is None else None
+
+    async def deliver_lobby_changes(self, from_version: int, changes: List[dict], transitions: list):
+        """Gửi một lô thay đổi sảnh chờ tới client"""
+        # Gom client theo bộ lọc: mỗi view chỉ mã hóa một frame
+        views: Dict[tuple, list] = {}
+        filters: Dict[tuple, dict] = {}
+        for ws, client_info in self.clients.items():
+            if client_info.get('bot'):
+                continue
+            flt = client_info.get('lobby_filter')
+            key = filter_key(flt)
+            views.setdefault(key, []).append(ws)
+            filters[key] = flt
+        for key, recipients in views.items():
+            flt = filters[key]
+            view_changes = changes if not flt else self._filter_changes(transitions, flt)
+            if flt and not view_changes:
+                continue
+            await self.send_many(recipients, {
+                'type': 'rooms_delta',
+                'from_version': from_version,
+                'version': self.lobby.version,
+                'changes': view_changes
+            }, group='lobby')
+
+    def _filter_changes(self, transitions: list, flt: dict) -> List[dict]:
+        """Chuyển các thay đổi sảnh chờ thành delta của một view có lọc:
+        phòng vào view -> room_added, rời view -> room_removed."""
+        out = []
+        for room_id, old, new in transitions:
+            was_in, now_in = matches(old, flt), matches(new, flt)
+            if now_in:
+                out.append({'type': 'room_changed' if was_in else 'room_added', 'room': new})
+            elif was_in:
+                out.append({'type': 'room_removed', 'room_id': room_id})
+        return out
+
+    async def monitor_loop_lag(self, interval: float = LOOP_LAG_INTERVAL):
+        """Đo độ trễ event loop: ngủ `interval` giây rồi xem thực tế trễ bao lâu"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.m_loop_lag.observe(max(0.0, loop.time() - expected))
+
+    async def process_request(self, path: str, request_headers):
+        """Phục vụ /metrics (HTTP thường) trên cùng cổng; các đường dẫn khác đi tiếp WebSocket"""
+        if path.split('?', 1)[0] != METRICS_PATH:
+            return None
+        body = self.metrics.render().encode('utf-8')
+        return HTTPStatus.OK, [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')], body
+
+    def mark_snapshot(self, room_id: str):
+        """Phòng đã đổi: ghi lại ở lần snapshot tăng dần kế tiếp"""
+        if self.snapshots is not None:
+            self._snapshot_dirty.add(room_id)
+
+    def room_state(self, room: GameRoom, now: float) -> tuple:
+        """Trạng thái phòng dạng tuple cho snapshot (xem snapshot.py)"""
+        remaining = None
+        if room.round_timer is not None and room.game_state == 'playing':
+            remaining = room.round_timer.deadline * self.round_timers.tick - now
+        seats = []
+        for p, seat in room.seats.items():
+            client_info = self.clients[p]
+            record = client_info.get('record')
+            seats.append((client_info['id'], seat.name, client_info.get('token'), p is room.bot,
+                          seat.wins, seat.losses, seat.draws, seat.series_wins,
+                          seat.ready, seat.choice, seat.auto,
+                          (record['wins'], record['losses'], record['draws']) if record else None))
+        return (room.room_id, room.room_name, room.max_players, room.round_seconds, room.series_best_of,
+                room.game_state, room.series_over, room.version, room.password_hash, remaining, seats)
+
+    async def save_snapshot(self, full: bool = False, chunk: int | None = SNAPSHOT_CHUNK):
+        """Ghi các phòng đã đổi (khối tăng dần), hoặc mọi phòng khi `full` / các khối tăng dần đã lớn hơn
+        khối đầy đủ. Mã hóa trên event loop (từng lượt `chunk` phòng, None = một lượt), ghi file trong thread."""
+        store = self.snapshots
+        loop = asyncio.get_running_loop()
+        data = bytearray()
+        if full or store.needs_compaction():
+            kind, removed, write = BLOCK_FULL, [], store.replace
+            # Phòng đổi trong lúc đang mã hóa được đánh dấu lại và vào khối tăng dần kế tiếp
+            self._snapshot_dirty = set()
+            room_ids = list(self.rooms)
+            count = 0
+            for start in range(0, len(room_ids), chunk or len(room_ids) or 1):
+                if start:
+                    await asyncio.sleep(0)
+                now = loop.time()
+                for room_id in room_ids[start:start + chunk] if chunk else room_ids:
+                    room = self.rooms.get(room_id)
+                    if room is not None and self.encode_snapshot_room(data, room, now):
+                        count += 1
+        else:
+            dirty, self._snapshot_dirty = self._snapshot_dirty, set()
+            if not dirty:
+                return
+            kind, removed, write = BLOCK_DELTA, [], store.append
+            now = loop.time()
+            count = 0
+            for room_id in dirty:
+                room = self.rooms.get(room_id)
+                if room is None:
+                    removed.append(room_id)
+                elif self.encode_snapshot_room(data, room, now):
+                    count += 1
+        try:
+            block = encode_block(kind, data, count, removed, self.player_counter)
+            self._snapshot_write = loop.run_in_executor(None, write, block)
+            await asyncio.shield(self._snapshot_write)
+        except Exception as e:
+            if kind == BLOCK_DELTA:
+                self._snapshot_dirty |= dirty     # ghi lại ở lần sau
+            self.log.error('error', 'snapshot_failed', kind=kind, error=repr(e))
+
+    def encode_snapshot_room(self, data: bytearray, room: GameRoom, now: float) -> bool:
+        """Mã hóa một phòng vào `data`; lỗi (vd. dữ liệu phòng không hợp lệ) thì ghi log và bỏ riêng phòng đó
+        để các phòng khác vẫn được lưu"""
+        mark = len(data)
+        try:
+            encode_room(data, self.room_state(room, now))
+        except Exception as e:
+            del data[mark:]
+            self.log.error('error', 'snapshot_room_failed', room=room.room_id, error=repr(e))
+            return False
+        return True
+
+    async def run_snapshots(self):
+        """Định kỳ ghi các phòng đã đổi: crash chỉ mất tối đa snapshot_interval giây"""
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.save_snapshot()
+            except Exception as e:
+                self.log.error('error', 'snapshot_failed', error=repr(e))
+
+    def start_snapshots(self):
+        if self.snapshots is not None and self.snapshot_interval > 0 and self._snapshot_task is None:
+            self._snapshot_task = asyncio.create_task(self.run_snapshots())
+
+    async def load_snapshot(self, grace: float) -> tuple | None:
+        """Đọc file snapshot (trong thread) và dựng lại phòng: (số phòng, thời điểm lưu) hoặc None.
+        Tắt GC trong lúc nạp: hàng trăm nghìn object mới làm các lượt gen2 quét lại toàn bộ
+        heap liên tục; nạp xong thì freeze để các lượt GC sau không quét lại chúng."""
+        gc.disable()
+        try:
+            loaded = await asyncio.get_running_loop().run_in_executor(None, self.snapshots.load)
+            if loaded is None:
+                return None
+            saved_at, player_counter, rooms = loaded
+            restored = self.restore_rooms(rooms.values(), player_counter, grace)
+        finally:
+            gc.enable()
+        gc.freeze()
+        return restored, saved_at
+
+    def restore_rooms(self, rooms, player_counter: int, grace: float) -> int:
+        """Dựng lại các phòng từ snapshot trước khi nhận kết nối. Mỗi người chơi được giữ chỗ `grace` giây
+        như một phiên mất kết nối: client quay lại bằng resume token cũ thì về đúng chỗ, điểm và series."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self.player_counter = max(self.player_counter, player_counter)
+        restored = 0
+        for (room_id, room_name, max_players, round_seconds, best_of, game_state, series_over, version,
+             password_hash, remaining, seats) in rooms:
+            if room_id in self.rooms or not seats:
+                continue
+            room = GameRoom(room_id, room_name, max_players, password_hash=password_hash, index=self.index)
+            room.round_seconds = round_seconds
+            room.series_best_of = best_of
+            room.series_over = series_over
+            for (player_id, name, token, bot, wins, losses, draws, series_wins, ready, choice, auto,
+                 record) in seats:
+                if bot:
+                    # Id bot không cần giữ qua lần khởi động lại (snapshot cũ còn lưu id trong dải người chơi)
+                    player = room.bot = BotPlayer(self.get_next_bot_id())
+                    self.clients[player] = {'id': player.player_id, 'room_id': None, 'name': name, 'bot': True}
+                    self.bot_rooms += 1
+                else:
+                    player = RestoredSeat(player_id)
+                    client_info = self.clients[player] = {
+                        'id': player_id,
+                        'room_id': None,
+                        'name': name,
+                        'record': dict(zip(('wins', 'losses', 'draws'), record or (0, 0, 0))),
+                        'binary': False,
+                        'socket': None,
+                        'active': time.monotonic()
+                    }
+                    if token:
+                        client_info['token'] = token
+                        self.sessions[token] = player
+                    client_info['expiry'] = self.session_timers.schedule(now, grace, player)
+                    self.session_stats['held'] += 1
+                room.add_player(player, name)
+                seat = room.seats[player]
+                seat.wins, seat.losses, seat.draws, seat.series_wins = wins, losses, draws, series_wins
+                if ready:
+                    room.set_ready(player)
+                if choice is not None:
+                    room.choose(player, choice, auto)
+            room.version = version
+            room.game_state = game_state
+            self.rooms[room_id] = room
+            if game_state == 'playing' and remaining is not None:
+                self._start_round_timer(room, max(remaining, self.round_timers.tick))
+            if room.bot is None:
+                self.lobby.publish(room_id, self.get_lobby_summary(room))
+            restored += 1
+        if len(self.session_timers) and (self._session_task is None or self._session_task.done()):
+            self._session_task = asyncio.create_task(self.reap_sessions())
+        return restored
+
+    async def shutdown(self):
+        """Dừng server êm: ghi snapshot đầy đủ, gửi nốt các cập nhật sảnh chờ còn treo"""
+        if self.snapshots is not None:
+            if self._snapshot_task is not None:
+                self._snapshot_task.cancel()
+            if self._snapshot_write is not None:
+                await asyncio.gather(self._snapshot_write, return_exceptions=True)
+            # Ghi trước mọi bước dọn dẹp khác: phòng và phiên vẫn còn nguyên. Lỗi thì chỉ ghi log,
+            # các bước đóng stats / nhật ký ván / log phía sau vẫn phải chạy
+            started = time.perf_counter()
+            try:
+                await self.save_snapshot(full=True, chunk=None)
+            except Exception as e:
+                self.log.error('error', 'snapshot_failed', error=repr(e))
+            else:
+                print(f"💾 Snapshot: {len(self.rooms)} phòng -> {self.snapshots.path} "
+                      f"({self.snapshots.base_bytes:,} byte, {time.perf_counter() - started:.2f}s)")
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+        if self._match_task is not None:
+            self._match_task.cancel()
+        if self._bot_task is not None:
+            self._bot_task.cancel()
+        if self._session_task is not None:
+            self._session_task.cancel()
+        if self._idle_task is not None:
+            self._idle_task.cancel()
+        self.passwords.close()
+        await self.flush_lobby()
+        if self.player_stats is not None:
+            await self.player_stats.close()
+        if self.match_log is not None:
+            await self.match_log.close()
+        stats = self.lobby_stats
+        print(f"📊 Sảnh chờ: {stats['events']} thay đổi, {stats['broadcasts']} lần broadcast, "
+              f"tiết kiệm {stats['saved']} lần")
+        log_stats = self.log.stats()
+        if log_stats['dropped'] or log_stats['sampled_out']:
+            print(f"📝 Log: bỏ {log_stats['dropped']} bản ghi do hàng đợi đầy, {log_stats['sampled_out']} do lấy mẫu")
+        self.log.close()
 
     
     async def cleanup_client(self, websocket: websockets.WebSocketServerProtocol):
         """Dọn dẹp khi client ngắt kết nối"""
+        self.matchmaker.cancel(websocket)
+        self.stop_spectating(websocket)
         # Rời phòng nếu đang ở trong phòng
         await self.handle_leave_room(websocket)
         
-        # Xóa khỏi danh sách clients
+        # Xóa khỏi danh sách clients (và các chỉ mục ngược)
         if websocket in self.clients:
+            client_info = self.clients[websocket]
+            outbox = client_info.get('outbox')
+            if outbox is not None:
+                outbox.close()
+            self.sessions.pop(client_info.get('token'), None)
+            self.session_timers.cancel(client_info.get('expiry'))
+            self.index.remove_client(websocket)
             del self.clients[websocket]
 
 # Khởi tạo server
@@ -664,27 +2211,117 @@ game_server = GameServer()
 async def handler(websocket, path):
     await game_server.handle_client(websocket, path)
 
-async def main():
-    host = "localhost" 
-    port = 8082
+async def main(host: str = "localhost", port: int = 8082, stats_db: str | None = STATS_DB,
+               match_log_dir: str | None = MATCH_LOG_DIR, send_queue: int = SEND_QUEUE,
+               slow_client_grace: float = SLOW_CLIENT_GRACE, lobby_policy: str = LOBBY_POLICY,
+               max_frame: int = MAX_FRAME_BYTES, rate_disconnect: int = RATE_DISCONNECT,
+               resume_grace: float = RESUME_GRACE, log: EventLog | None = None,
+               snapshot_path: str | None = SNAPSHOT_PATH, snapshot_interval: float = SNAPSHOT_INTERVAL,
+               room_idle_timeout: float = ROOM_IDLE_TIMEOUT, idle_timeout: float = IDLE_TIMEOUT):
     print("🚀 Server Kéo Búa Bao đang khởi động...")
     print(f"📍 Địa chỉ: ws://{host}:{port}")
     print("⏳ Đang chờ kết nối...")
     print("🎮 Hỗ trợ 2 người chơi/phòng")
+    game_server.set_send_policy(send_queue, slow_client_grace, lobby_policy)
+    game_server.rate_disconnect = rate_disconnect
+    game_server.resume_grace = resume_grace
+    game_server.room_idle_timeout = room_idle_timeout
+    game_server.idle_timeout = idle_timeout
+    if log is not None:
+        game_server.log = log
+    if stats_db:
+        game_server.player_stats = StatsStore(stats_db, log=game_server.log)
+        await game_server.player_stats.open()
+        print(f"🏆 Thành tích: {stats_db} ({len(game_server.player_stats.totals)} người chơi)")
+    if match_log_dir:
+        game_server.match_log = MatchLog(match_log_dir)
+        await game_server.match_log.open()
+        print(f"📜 Nhật ký ván đấu: {match_log_dir} (ván kế tiếp #{game_server.match_log.next_round})")
+    if snapshot_path:
+        game_server.snapshots = SnapshotStore(snapshot_path)
+        game_server.snapshot_interval = snapshot_interval
+        started = time.perf_counter()
+        loaded = await game_server.load_snapshot(max(resume_grace, RESTORE_GRACE))
+        if loaded is not None:
+            restored, saved_at = loaded
+            print(f"💾 Snapshot: nạp lại {restored} phòng (lưu {time.time() - saved_at:.0f}s trước) "
+                  f"trong {time.perf_counter() - started:.2f}s")
+        game_server.start_snapshots()
+    game_server.start_idle_reaper()
 
-    async with websockets.serve(handler, host, port):
+    async with websockets.serve(handler, host, port, process_request=game_server.process_request,
+                                subprotocols=[wire.SUBPROTOCOL], max_size=max_frame):
+        print(f"📈 Metrics: http://{host}:{port}{METRICS_PATH}")
         print("👉 Nhấn Ctrl+C để dừng server")
+        lag_task = asyncio.create_task(game_server.monitor_loop_lag())
+        stop = asyncio.get_running_loop().create_future()
+        if os.name != 'nt':
+            # SIGTERM (vd: systemd, benchmark) cũng đi qua đường tắt êm để ghi nốt thành tích
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.cancel)
         try:
-            await asyncio.Future()  # chạy vô hạn
+            await stop  # chạy vô hạn
         except asyncio.CancelledError:
             # Bị hủy khi Ctrl+C / đóng loop -> bỏ qua để thoát êm
             pass
         finally:
+            lag_task.cancel()
+            await game_server.shutdown()
             print("🛑 Server đã tắt.")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Server Kéo Búa Bao")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="số process worker (chế độ chia shard); 0 = một process như cũ")
+    parser.add_argument("--stats-db", default=STATS_DB,
+                        help="file SQLite lưu thành tích / bảng xếp hạng; để trống để tắt")
+    parser.add_argument("--match-log", default=MATCH_LOG_DIR,
+                        help="thư mục nhật ký ván đấu (nhị phân); để trống để tắt")
+    parser.add_argument("--send-queue", type=int, default=SEND_QUEUE,
+                        help="số frame tối đa chờ gửi cho mỗi kết nối")
+    parser.add_argument("--slow-client-grace", type=float, default=SLOW_CLIENT_GRACE,
+                        help="giây được vượt --send-queue bằng frame bắt buộc trước khi bị ngắt")
+    parser.add_argument("--lobby-policy", choices=LOBBY_POLICIES, default=LOBBY_POLICY,
+                        help="cập nhật sảnh chờ khi hàng đợi đầy: conflate = gửi lại sảnh mới nhất, drop = bỏ")
+    parser.add_argument("--resume-grace", type=float, default=RESUME_GRACE,
+                        help="giây giữ chỗ trong phòng cho client mất kết nối chờ kết nối lại; 0 = tắt")
+    parser.add_argument("--max-frame", type=int, default=MAX_FRAME_BYTES,
+                        help="kích thước tối đa (byte) một tin nhắn client; lớn hơn thì đóng kết nối")
+    parser.add_argument("--rate-disconnect", type=int, default=RATE_DISCONNECT,
+                        help=f"số tin nhắn vượt giới hạn tốc độ trong {RATE_STRIKE_WINDOW:g}s thì ngắt kết nối; 0 = không ngắt")
+    parser.add_argument("--log-level", choices=tuple(LEVELS), default=LOG_LEVEL,
+                        help="mức log tối thiểu")
+    parser.add_argument("--log-file", default='',
+                        help="ghi log (JSON lines) vào file này; để trống = stdout")
+    parser.add_argument("--log-sample", type=parse_sampling, default=LOG_SAMPLING,
+                        help="tỉ lệ giữ lại theo nhóm log, vd: chat=0.1,game=0.5 (nhóm: chat, game, room, client, send, rate, error)")
+    parser.add_argument("--log-queue", type=int, default=LOG_QUEUE,
+                        help="số bản ghi log tối đa chờ ghi; đầy thì bỏ và đếm")
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH,
+                        help="file snapshot phòng (ghi khi tắt, nạp lại khi khởi động); để trống để tắt; "
+                             "chỉ dùng ở chế độ 1 process")
+    parser.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="giây giữa hai lần ghi tăng dần các phòng đã đổi; 0 = chỉ ghi khi tắt")
+    parser.add_argument("--room-idle-timeout", type=float, default=ROOM_IDLE_TIMEOUT,
+                        help="giây mọi người chơi trong phòng đều không hoạt động thì giải tán phòng; 0 = tắt")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT,
+                        help="giây kết nối ngoài phòng không hoạt động (ping không tính) thì đóng; 0 = tắt")
+    args = parser.parse_args()
+    log_options = {'path': args.log_file or None, 'level': args.log_level, 'sampling': args.log_sample,
+                   'queue_size': args.log_queue}
     try:
-        asyncio.run(main())
+        if args.workers > 0:
+            from sharding import run_sharded
+            asyncio.run(run_sharded(args.host, args.port, args.workers, args.stats_db, args.match_log,
+                                    args.send_queue, args.slow_client_grace, args.lobby_policy,
+                                    args.max_frame, args.rate_disconnect, args.resume_grace, log_options))
+        else:
+            asyncio.run(main(args.host, args.port, args.stats_db, args.match_log,
+                             args.send_queue, args.slow_client_grace, args.lobby_policy,
+                             args.max_frame, args.rate_disconnect, args.resume_grace, EventLog(**log_options),
+                             args.snapshot, args.snapshot_interval, args.room_idle_timeout, args.idle_timeout))
     except KeyboardInterrupt:
         # Bắt Ctrl+C ở lớp ngoài để không in traceback
         print("\n🛑 Đã dừng server (Ctrl+C).")
@@ -0,0 +1,422 @@
+"""Chế độ nhiều process: mỗi worker sở hữu một shard phòng, một router đứng trước.
+
+- Phòng thuộc shard `int(room_id, 16) % số_worker`; worker chỉ sinh room_id của shard mình,
+  nên router biết ngay worker nào giữ phòng mà không cần tra bảng.
+- Router nhận kết nối của client, tự trả lời get_rooms / subscribe_rooms / ping từ sảnh chờ
+  tổng hợp, và chuyển tiếp (proxy) các tin nhắn trong phòng tới worker sở hữu phòng.
+- Worker gửi thay đổi sảnh chờ của mình về router qua kênh IPC cục bộ
+  (Unix socket, hoặc TCP localhost trên Windows), mỗi dòng là một JSON.
+
+Chạy:  python server.py --workers 4
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import tempfile
+import time
+
+import websockets
+
+from server import (GameServer, METRICS_PATH, MESSAGE_TYPES, SEND_QUEUE, SLOW_CLIENT_GRACE,
+                    LOBBY_POLICY, MAX_FRAME_BYTES, RATE_DISCONNECT, RESUME_GRACE, LOG_FRAME_BYTES,
+                    PLAYER_NAME_MAX, clean_name)
+from eventlog import EventLog
+from stats_store import StatsStore
+from match_log import MatchLog
+from ratelimit import peek_type
+import wire
+
+SHARD_LOBBY_WINDOW = 0.02     # worker gộp thay đổi sảnh chờ trước khi gửi về router
+ATTACH_PREFIX = '{"type": "attach"'
+TYPE_PREFIX = '{"type": "'
+IPC_RETRY_SECONDS = 0.2
+MATCH_SHARD = 0               # hàng đợi quick_match chung nằm ở một worker để mọi người ghép được với nhau
+
+
+def shard_of(room_id: str, shards: int) -> int | None:
+    try:
+        return int(room_id, 16) % shards
+    except (TypeError, ValueError):
+        return None
+
+
+def frame_type(frame: str | bytes) -> str | None:
+    """Lấy 'type' của frame server gửi mà không cần json.loads
+    (mọi message của server đều bắt đầu bằng khóa 'type')."""
+    if isinstance(frame, bytes):
+        return wire.frame_type(frame)
+    if frame.startswith(TYPE_PREFIX):
+        end = frame.find('"', len(TYPE_PREFIX))
+        if end > 0:
+            return frame[len(TYPE_PREFIX):end]
+    return None
+
+
+class ShardWorker(GameServer):
+    """GameServer chạy trong process worker: chỉ nhận kết nối từ router."""
+    def __init__(self, shard: int, shards: int, token: str):
+        # Giới hạn tốc độ và giữ chỗ khi mất kết nối đã làm ở router (phía client); kết nối tới worker chỉ là proxy
+        super().__init__(lobby_window=SHARD_LOBBY_WINDOW, rate_limits=None, resume_grace=0)
+        self.shard = shard
+        self.shards = shards
+        self.token = token
+        self.ipc_writer = None
+
+    def new_room_id(self) -> str:
+        # Chỉ sinh room_id thuộc shard của mình (trung bình `shards` lần thử)
+        while True:
+            room_id = super().new_room_id()
+            if shard_of(room_id, self.shards) == self.shard:
+                return room_id
+
+    async def handle_message(self, websocket, message):
+        if isinstance(message, str) and message.startswith(ATTACH_PREFIX):
+            self.attach(websocket, json.loads(message))
+            return
+        await super().handle_message(websocket, message)
+
+    def attach(self, websocket, data: dict):
+        """Router gán danh tính (player_id, tên) của client thật cho kết nối proxy"""
+        if data.get('token') != self.token or websocket not in self.clients:
+            return
+        client_info = self.clients[websocket]
+        client_info['id'] = data['player_id']
+        client_info['name'] = data.get('name') or client_info['name']
+
+    async def deliver_lobby_changes(self, from_version, changes, transitions):
+        # Worker không gửi sảnh chờ cho client; router tổng hợp và phát lại
+        if self.ipc_writer is None:
+            return
+        lines = [json.dumps({'room_id': room_id, 'summary': new}) for room_id, _, new in transitions]
+        self.ipc_writer.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        await self.ipc_writer.drain()
+
+    async def connect_ipc(self, ipc_address):
+        while True:
+            try:
+                if isinstance(ipc_address, str):
+                    reader, writer = await asyncio.open_unix_connection(ipc_address)
+                else:
+                    reader, writer = await asyncio.open_connection(*ipc_address)
+                break
+            except OSError:
+                await asyncio.sleep(IPC_RETRY_SECONDS)
+        hello = [json.dumps({'shard': self.shard})]
+        hello += [json.dumps({'room_id': rid, 'summary': s}) for rid, s in self.lobby.rooms.items()]
+        writer.write(('\n'.join(hello) + '\n').encode('utf-8'))
+        await writer.drain()
+        self.ipc_writer = writer
+        return reader
+
+
+async def _run_worker(shard: int, shards: int, port: int, ipc_address, token: str, stats_db: str | None,
+                      match_log_dir: str | None, log_options: dict | None):
+    worker = ShardWorker(shard, shards, token)
+    if log_options:
+        # Cùng cấu hình log với router; ghi chung file thì mỗi lô là một lần write (chế độ append)
+        worker.log = EventLog(**log_options)
+    if stats_db:
+        # Mọi worker ghi chung một file (phép cộng dồn), top-K nạp lại từ DB sau mỗi lần ghi
+        worker.player_stats = StatsStore(stats_db, shared=True, log=worker.log)
+        await worker.player_stats.open()
+    if match_log_dir:
+        # Nhật ký ván đấu chỉ có một người ghi: mỗi worker một thư mục con
+        worker.match_log = MatchLog(os.path.join(match_log_dir, f'shard-{shard}'))
+        await worker.match_log.open()
+    async with websockets.serve(worker.handle_client, '127.0.0.1', port, max_size=None,
+                                subprotocols=[wire.SUBPROTOCOL]):
+        reader = await worker.connect_ipc(ipc_address)
+        print(f"🧩 Worker {shard}/{shards} sẵn sàng tại ws://127.0.0.1:{port}")
+        try:
+            # Router không gửi gì qua IPC; EOF nghĩa là router đã tắt (kể cả bị kill) -> worker tự thoát
+            await reader.read()
+        finally:
+            await worker.shutdown()
+
+
+def worker_main(shard: int, shards: int, port: int, ipc_address, token: str, stats_db: str | None = None,
+                match_log_dir: str | None = None, log_options: dict | None = None):
+    try:
+        asyncio.run(_run_worker(shard, shards, port, ipc_address, token, stats_db, match_log_dir, log_options))
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardRouter(GameServer):
+    """Router phía trước: giữ sảnh chờ tổng hợp, chuyển tiếp tin nhắn phòng tới worker."""
+    def __init__(self, worker_ports: list, token: str):
+        super().__init__()
+        self.worker_ports = worker_ports
+        self.shards = len(worker_ports)
+        self.token = token
+        self.remote_rooms = {}         # room_id -> tóm tắt phòng do worker gửi về
+        self.ipc_writers = set()       # kết nối IPC của các worker (đóng = báo worker tắt)
+        self._next_shard = 0
+
+    # ---- Sảnh chờ tổng hợp từ các worker ----
+    def current_lobby_summary(self, room_id: str):
+        return self.remote_rooms.get(room_id)
+
+    async def on_worker_connected(self, reader, writer):
+        """Nhận luồng thay đổi sảnh chờ (JSON lines) của một worker"""
+        shard = None
+        self.ipc_writers.add(writer)
+        try:
+            hello = await reader.readline()
+            shard = json.loads(hello)['shard']
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                update = json.loads(line)
+                room_id = update['room_id']
+                if update['summary'] is None:
+                    self.remote_rooms.pop(room_id, None)
+                else:
+                    self.remote_rooms[room_id] = update['summary']
+                await self.broadcast_room_change(room_id)
+        finally:
+            # Worker mất kết nối: gỡ các phòng của shard đó khỏi sảnh
+            if shard is not None:
+                for room_id in [r for r in self.remote_rooms if shard_of(r, self.shards) == shard]:
+                    del self.remote_rooms[room_id]
+                    await self.broadcast_room_change(room_id)
+            self.ipc_writers.discard(writer)
+            writer.close()
+
+    # ---- Chuyển tiếp tin nhắn ----
+    def pick_shard(self) -> int:
+        shard = self._next_shard
+        self._next_shard = (self._next_shard + 1) % self.shards
+        return shard
+
+    async def upstream(self, websocket, shard: int):
+        """Kết nối proxy của client tới worker `shard` (mở khi cần)"""
+        client_info = self.clients[websocket]
+        upstreams = client_info.setdefault('upstreams', {})
+        conn = upstreams.get(shard)
+        if conn is None:
+            # Proxy dùng cùng codec với client để worker mã hóa sẵn, router chỉ chuyển nguyên frame
+            conn = await websockets.connect(f"ws://127.0.0.1:{self.worker_ports[shard]}", max_size=None,
+                                            subprotocols=[wire.SUBPROTOCOL] if client_info['binary'] else None)
+            await conn.send(json.dumps({'type': 'attach', 'token': self.token,
+                                        'player_id': client_info['id'], 'name': client_info['name']}))
+            upstreams[shard] = conn
+            asyncio.create_task(self.pump(websocket, shard, conn))
+        return conn
+
+    async def pump(self, websocket, shard: int, conn):
+        """Chuyển nguyên frame từ worker về client (không parse JSON)"""
+        try:
+            async for frame in conn:
+                kind = frame_type(frame)
+                if kind == 'player_id':
+                    continue  # router đã gửi player_id của chính nó
+                if websocket not in self.clients:
+                    break
+                client_info = self.clients[websocket]
+                if kind in ('room_created', 'player_joined', 'match_found'):
+                    client_info['room_shard'] = shard
+                    client_info.pop('creating_on', None)
+                elif kind == 'error' and client_info.get('creating_on') == shard:
+                    # Tạo phòng thất bại: bỏ shard đã ghim để join_room sau đó đi đúng worker
+                    del client_info['creating_on']
+                    if client_info.get('room_shard') == shard:
+                        client_info['room_shard'] = None
+                # Xếp vào hàng đợi gửi của client: client chậm không giữ kết nối proxy của worker.
+                # Client đang chờ kết nối lại: bỏ frame, khi quay lại sẽ nhận lại cả phòng (get_room)
+                outbox = self.outbox_of(websocket)
+                if outbox is not None:
+                    outbox.put(frame, None, kind)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            # Worker đóng kết nối proxy (vd: worker chết) -> client không còn ở phòng đó
+            client_info = self.clients.get(websocket)
+            if client_info and client_info.get('upstreams', {}).get(shard) is conn:
+                del client_info['upstreams'][shard]
+                if client_info.get('room_shard') == shard:
+                    client_info['room_shard'] = None
+
+    async def forward(self, websocket, shard: int, message: str):
+        conn = await self.upstream(websocket, shard)
+        await conn.send(message)
+
+    async def handle_message(self, websocket, message):
+        peeked = peek_type(message)
+        if not self.admit(websocket, peeked):
+            return
+        started = time.perf_counter()
+        message_type = 'invalid'
+        try:
+            data = json.loads(message) if isinstance(message, str) else wire.decode(message)
+            message_type = data.get('type')
+            if message_type != peeked and not self.admit(websocket, message_type, charge_total=False):
+                return
+            client_info = self.clients[websocket]
+            room_shard = client_info.get('room_shard')
+
+            if message_type == 'get_rooms':
+                await self.handle_get_rooms(websocket, data)
+            elif message_type == 'subscribe_rooms':
+                await self.handle_subscribe_rooms(websocket, data)
+            elif message_type == 'ping':
+                await self.send(websocket, {'type': 'pong', 't': data.get('t')})
+            elif message_type == 'set_name':
+                name = clean_name(data.get('name'))
+                if name is None:
+                    await self.send(websocket, {
+                        'type': 'error',
+                        'message': f'Tên không hợp lệ (1-{PLAYER_NAME_MAX} ký tự)'
+                    })
+                    return
+                client_info['name'] = name
+                for conn in list(client_info.get('upstreams', {}).values()):
+                    await conn.send(message)
+            elif message_type in ('create_room', 'play_bot'):
+                # Đang ở trong phòng thì gửi tới worker đó để nhận đúng lỗi như chế độ 1 process
+                if room_shard is None:
+                    # Ghim shard ngay: ready / choice gửi trước khi room_created về vẫn tới đúng worker
+                    # (cùng kết nối proxy nên worker nhận sau create_room)
+                    room_shard = client_info['room_shard'] = client_info['creating_on'] = self.pick_shard()
+                await self.forward(websocket, room_shard, message)
+            elif message_type == 'join_room':
+                shard = room_shard if room_shard is not None else shard_of(data.get('room_id'), self.shards)
+                await self.forward(websocket, shard if shard is not None else 0, message)
+            elif message_type == 'spectate':
+                shard = shard_of(data.get('room_id'), self.shards)
+                if client_info.get('spectate_shard') not in (None, shard):
+                    await self.forward(websocket, client_info['spectate_shard'], json.dumps({'type': 'stop_spectating'}))
+                client_info['spectate_shard'] = shard if shard is not None else 0
+                if client_info['spectate_shard'] != MATCH_SHARD and MATCH_SHARD in client_info.get('upstreams', {}):
+                    # Hàng đợi ghép trận nằm ở MATCH_SHARD: worker xem phòng không tự hủy được vé ở đó
+                    await self.forward(websocket, MATCH_SHARD, json.dumps({'type': 'cancel_quick_match'}))
+                await self.forward(websocket, client_info['spectate_shard'], message)
+            elif message_type == 'stop_spectating':
+                shard = client_info.pop('spectate_shard', None)
+                if shard is not None:
+                    await self.forward(websocket, shard, message)
+            elif message_type == 'leave_room':
+                if room_shard is not None:
+                    client_info['room_shard'] = None
+                    conn = client_info['upstreams'].pop(room_shard, None)
+                    if conn:
+                        await conn.send(message)
+                        asyncio.create_task(conn.close())
+            elif message_type == 'get_leaderboard':
+                # Worker nào cũng đọc cùng một DB thành tích
+                await self.forward(websocket, room_shard if room_shard is not None else self.pick_shard(), message)
+            elif message_type == 'get_match_history':
+                # Lịch sử nằm ở worker đã chạy phòng; trả về phần của phòng hiện tại (hoặc shard ghép trận)
+                await self.forward(websocket, room_shard if room_shard is not None else MATCH_SHARD, message)
+            elif message_type in ('quick_match', 'cancel_quick_match'):
+                await self.forward(websocket, room_shard if room_shard is not None else MATCH_SHARD, message)
+            elif message_type in ('ready', 'choice', 'new_game', 'chat'):
+                if room_shard is not None:
+                    await self.forward(websocket, room_shard, message)
+            elif message_type == 'get_room':
+                await self.handle_get_room(websocket)
+            elif message_type != 'attach':
+                self.log.warning('error', 'unknown_message', type=message_type)
+        except (json.JSONDecodeError, wire.FrameError):
+            self.m_rejected.inc('invalid', 'unknown')
+            self.log.warning('error', 'invalid_frame', frame=message[:LOG_FRAME_BYTES])
+        except Exception as e:
+            self.log.error('error', 'handler_failed', type=message_type, error=repr(e))
+        finally:
+            label = message_type if message_type in MESSAGE_TYPES else 'unknown'
+            self.m_handler_seconds.observe(time.perf_counter() - started, label)
+
+    async def handle_get_room(self, websocket):
+        """Phòng đang chơi / đang xem nằm ở worker: nhờ worker đó gửi lại cả phòng"""
+        client_info = self.clients[websocket]
+        shard = client_info.get('room_shard')
+        if shard is None:
+            shard = client_info.get('spectate_shard')
+        if shard is not None:
+            await self.forward(websocket, shard, json.dumps({'type': 'get_room'}))
+
+    async def cleanup_client(self, websocket):
+        client_info = self.clients.get(websocket)
+        if client_info:
+            self.sessions.pop(client_info.get('token'), None)
+            self.session_timers.cancel(client_info.get('expiry'))
+            # Đóng proxy -> worker tự dọn (rời phòng) như khi client ngắt kết nối
+            for conn in list(client_info.get('upstreams', {}).values()):
+                await conn.close()
+            if client_info.get('outbox') is not None:
+                client_info['outbox'].close()
+            self.index.remove_client(websocket)
+            del self.clients[websocket]
+
+
+def _ipc_address(port: int, workers: int):
+    if hasattr(socket, 'AF_UNIX') and os.name != 'nt':
+        return os.path.join(tempfile.gettempdir(), f'rps-lobby-{os.getpid()}.sock')
+    return ('127.0.0.1', port + workers + 1)
+
+
+async def run_sharded(host: str, port: int, workers: int, stats_db: str | None = None,
+                      match_log_dir: str | None = None, send_queue: int = SEND_QUEUE,
+                      slow_client_grace: float = SLOW_CLIENT_GRACE, lobby_policy: str = LOBBY_POLICY,
+                      max_frame: int = MAX_FRAME_BYTES, rate_disconnect: int = RATE_DISCONNECT,
+                      resume_grace: float = RESUME_GRACE, log_options: dict | None = None):
+    token = secrets.token_hex(16)
+    worker_ports = [port + 1 + i for i in range(workers)]
+    router = ShardRouter(worker_ports, token)
+    # Router là phía nói chuyện với client; kết nối proxy tới worker là cục bộ
+    router.set_send_policy(send_queue, slow_client_grace, lobby_policy)
+    router.rate_disconnect = rate_disconnect
+    router.resume_grace = resume_grace
+    if log_options:
+        router.log = EventLog(**log_options)
+    ipc_address = _ipc_address(port, workers)
+    if isinstance(ipc_address, str):
+        if os.path.exists(ipc_address):
+            os.unlink(ipc_address)
+        ipc_server = await asyncio.start_unix_server(router.on_worker_connected, ipc_address)
+    else:
+        ipc_server = await asyncio.start_server(router.on_worker_connected, *ipc_address)
+
+    ctx = multiprocessing.get_context('spawn')
+    processes = [ctx.Process(target=worker_main,
+                             args=(i, workers, worker_ports[i], ipc_address, token, stats_db, match_log_dir, log_options),
+                             daemon=True)
+                 for i in range(workers)]
+    for proc in processes:
+        proc.start()
+
+    print("🚀 Server Kéo Búa Bao (chế độ shard) đang khởi động...")
+    print(f"📍 Địa chỉ: ws://{host}:{port}  —  {workers} worker: cổng {worker_ports[0]}..{worker_ports[-1]}")
+    async with ipc_server, websockets.serve(router.handle_client, host, port, max_size=max_frame,
+                                            subprotocols=[wire.SUBPROTOCOL],
+                                            process_request=router.process_request):
+        print(f"📈 Metrics (router): http://{host}:{port}{METRICS_PATH}")
+        print("👉 Nhấn Ctrl+C để dừng server")
+        stop = asyncio.get_running_loop().create_future()
+        if os.name != 'nt':
+            # SIGTERM (vd: từ benchmark) cũng đi qua đường tắt bình thường để dừng worker
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.cancel)
+        try:
+            await stop
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await router.shutdown()
+            # Đóng IPC để worker tự tắt êm (ghi nốt thành tích), quá hạn mới terminate
+            writers = list(router.ipc_writers)
+            for writer in writers:
+                writer.close()
+            await asyncio.gather(*(writer.wait_closed() for writer in writers), return_exceptions=True)
+            for proc in processes:
+                proc.join(timeout=5)
+                if proc.is_alive():
+                    proc.terminate()
+                    proc.join(timeout=5)
+            if isinstance(ipc_address, str) and os.path.exists(ipc_address):
+                os.unlink(ipc_address)
+            print("🛑 Server đã tắt.")
@@ -0,0 +1,207 @@
+"""Snapshot trạng thái phòng để khởi động lại nhanh (rolling deploy) và giới hạn mất mát khi crash.
+
+File gồm các khối nối tiếp nhau: một khối đầy đủ (mọi phòng) rồi các khối tăng dần (phòng đã đổi /
+bị xóa kể từ lần ghi trước). Mỗi khối có header (BLOCK: loại, số phòng, số phòng xóa, độ dài, thời
+điểm, bộ đếm player_id, crc32); khối ghi dở hoặc hỏng (crash giữa chừng) bị bỏ cùng mọi khối sau nó.
+Khối đầy đủ được ghi ra file tạm rồi os.replace, khối tăng dần ghi nối (append).
+
+Một phòng: ROOM (cố định) + room_id, tên, hash mật khẩu (độ dài + bytes), rồi mỗi chỗ ngồi SEAT
+(cố định) + tên, resume token. Module chỉ mã hóa / giải mã tuple, không biết GameRoom:
+    phòng     = (room_id, tên, max_players, round_seconds, best_of, game_state, series_over, version,
+                 hash mật khẩu | None, giây còn lại của ván | None, [chỗ ngồi])
+    chỗ ngồi  = (player_id, tên, token | None, là bot, thắng, thua, hòa, series_wins, ready, lựa chọn | None,
+                 tự chọn, thành tích tích lũy (thắng, thua, hòa))
+"""
+import os
+import struct
+import time
+import zlib
+
+MAGIC = b'RPSS'
+BLOCK = struct.Struct('<4sBIIIdII')   # magic, loại, số phòng, số phòng xóa, độ dài, thời điểm, player_counter, crc32
+ROOM = struct.Struct('<HHBBBIIH')     # max_players, round_seconds, best_of, game_state, cờ, version, ms còn lại, số chỗ
+SEAT = struct.Struct('<IIIIHBBIII')   # player_id, thắng, thua, hòa, series_wins, cờ, lựa chọn, thành tích (3)
+BLOCK_FULL = 1
+BLOCK_DELTA = 2
+
+GAME_STATES = ('waiting', 'playing', 'finished')
+STATE_CODES = {s: i for i, s in enumerate(GAME_STATES)}
+CHOICES = (None, 'rock', 'paper', 'scissors')
+CHOICE_CODES = {c: i for i, c in enumerate(CHOICES)}
+ROOM_SERIES_OVER = 1
+ROOM_TIMER = 2                # có hạn chót ván đang chạy
+SEAT_BOT = 1
+SEAT_READY = 2
+SEAT_AUTO = 4
+SEAT_RECORD = 8               # có thành tích tích lũy (người thật)
+
+
+def _put_str(out: bytearray, fmt: str, value: str | None):
+    data = value.encode('utf-8') if value else b''
+    out += struct.pack(fmt, len(data))
+    out += data
+
+
+def encode_room(out: bytearray, room: tuple):
+    (room_id, name, max_players, round_seconds, best_of, game_state, series_over, version,
+     password_hash, remaining, seats) = room
+    flags = (ROOM_SERIES_OVER if series_over else 0) | (ROOM_TIMER if remaining is not None else 0)
+    out += ROOM.pack(max_players, round_seconds, best_of, STATE_CODES[game_state], flags, version,
+                     int(max(0.0, remaining or 0.0) * 1000), len(seats))
+    _put_str(out, '<B', room_id)
+    _put_str(out, '<H', name)
+    _put_str(out, '<B', password_hash)
+    for (player_id, seat_name, token, bot, wins, losses, draws, series_wins, ready, choice, auto,
+         record) in seats:
+        flags = ((SEAT_BOT if bot else 0) | (SEAT_READY if ready else 0) | (SEAT_AUTO if auto else 0)
+                 | (SEAT_RECORD if record is not None else 0))
+        out += SEAT.pack(player_id, wins, losses, draws, min(series_wins, 0xFFFF), flags, CHOICE_CODES[choice],
+                         *(record or (0, 0, 0)))
+        _put_str(out, '<H', seat_name)
+        _put_str(out, '<B', token)
+
+
+def _get_str(data, pos: int, size: int) -> tuple:
+    n = int.from_bytes(data[pos:pos + size], 'little')
+    pos += size
+    return str(data[pos:pos + n], 'utf-8'), pos + n
+
+
+def decode_room(data, pos: int) -> tuple:
+    """Giải mã một phòng tại `pos`; trả về (tuple phòng, vị trí kế tiếp)"""
+    max_players, round_seconds, best_of, state, flags, version, remaining_ms, n_seats = ROOM.unpack_from(data, pos)
+    pos += ROOM.size
+    room_id, pos = _get_str(data, pos, 1)
+    name, pos = _get_str(data, pos, 2)
+    password_hash, pos = _get_str(data, pos, 1)
+    seats = []
+    for _ in range(n_seats):
+        player_id, wins, losses, draws, series_wins, seat_flags, choice, rw, rl, rd = SEAT.unpack_from(data, pos)
+        pos += SEAT.size
+        seat_name, pos = _get_str(data, pos, 2)
+        token, pos = _get_str(data, pos, 1)
+        seats.append((player_id, seat_name, token or None, bool(seat_flags & SEAT_BOT), wins, losses, draws,
+                      series_wins, bool(seat_flags & SEAT_READY), CHOICES[choice], bool(seat_flags & SEAT_AUTO),
+                      (rw, rl, rd) if seat_flags & SEAT_RECORD else None))
+    room = (room_id, name, max_players, round_seconds, best_of, GAME_STATES[state], bool(flags & ROOM_SERIES_OVER),
+            version, password_hash or None, remaining_ms / 1000 if flags & ROOM_TIMER else None, seats)
+    return room, pos
+
+
+def encode_block(kind: int, rooms_data: bytes, room_count: int, removed: list, player_counter: int) -> bytes:
+    """Ghép khối: `rooms_data` là các phòng đã mã hóa liền nhau, `removed` là room_id đã xóa"""
+    payload = bytearray(rooms_data)
+    for room_id in removed:
+        _put_str(payload, '<B', room_id)
+    header = BLOCK.pack(MAGIC, kind, room_count, len(removed), len(payload), time.time(), player_counter,
+                        zlib.crc32(payload))
+    return header + payload
+
+
+def read_blocks(data: bytes):
+    """Duyệt các khối còn nguyên vẹn: (loại, thời điểm, player_counter, [phòng], [room_id đã xóa], vị trí kết thúc)"""
+    view = memoryview(data)
+    pos = 0
+    try:
+        while pos + BLOCK.size <= len(data):
+            magic, kind, room_count, removed_count, length, saved_at, player_counter, crc = BLOCK.unpack_from(data, pos)
+            start = pos + BLOCK.size
+            if magic != MAGIC or start + length > len(data) or zlib.crc32(view[start:start + length]) != crc:
+                return
+            rooms = []
+            p = start
+            for _ in range(room_count):
+                room, p = decode_room(view, p)
+                rooms.append(room)
+            removed = []
+            for _ in range(removed_count):
+                room_id, p = _get_str(view, p, 1)
+                removed.append(room_id)
+            pos = start + length
+            yield kind, saved_at, player_counter, rooms, removed, pos
+    finally:
+        view.release()
+
+
+class RestoredSeat:
+    """Chỗ của người chơi nạp từ snapshot, đứng thay websocket đã mất (chỉ cần hashable) cho tới khi
+    client kết nối lại bằng resume token hoặc hết hạn giữ chỗ."""
+    __slots__ = ('player_id',)
+
+    def __init__(self, player_id: int):
+        self.player_id = player_id
+
+    def __repr__(self):
+        return f'RestoredSeat({self.player_id})'
+
+
+class SnapshotStore:
+    """File snapshot của một process (chế độ 1 process)."""
+    def __init__(self, path: str):
+        self.path = path
+        self.base_bytes = 0         # kích thước khối đầy đủ gần nhất
+        self.delta_bytes = 0        # tổng kích thước các khối tăng dần nối sau nó
+        self.stats = {'full': 0, 'delta': 0, 'bytes': 0}
+
+    def load(self) -> tuple | None:
+        """Đọc file: (thời điểm, player_counter, {room_id: phòng}) hoặc None nếu chưa có / hỏng từ đầu"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        rooms = None
+        saved_at = 0.0
+        counter = 0
+        end = 0
+        blocks = read_blocks(data)
+        for kind, saved_at, player_counter, block_rooms, removed, block_end in blocks:
+            if kind == BLOCK_FULL:
+                rooms = {}
+                self.base_bytes, self.delta_bytes = block_end - end, 0
+            elif rooms is None:
+                break               # khối tăng dần mà không có khối đầy đủ phía trước
+            else:
+                self.delta_bytes += block_end - end
+            for room in block_rooms:
+                rooms[room[0]] = room
+            for room_id in removed:
+                rooms.pop(room_id, None)
+            counter = max(counter, player_counter)
+            end = block_end
+        blocks.close()
+        if rooms is None:
+            return None
+        if end != len(data):
+            # Bỏ phần đuôi hỏng để các khối tăng dần sau nối vào chỗ còn nguyên vẹn
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+        return saved_at, counter, rooms
+
+    def replace(self, block: bytes):
+        """Ghi khối đầy đủ thay cho cả file (file tạm + os.replace: crash giữa chừng vẫn còn file cũ)"""
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(block)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError:
+            self.base_bytes = 0     # file cũ không còn khớp các phòng đã bỏ khỏi hàng chờ: lần sau ghi đầy đủ
+            raise
+        self.base_bytes, self.delta_bytes = len(block), 0
+        self.stats['full'] += 1
+        self.stats['bytes'] += len(block)
+
+    def append(self, block: bytes):
+        """Nối khối tăng dần (không fsync: process crash vẫn còn trong page cache)"""
+        with open(self.path, 'ab') as f:
+            f.write(block)
+        self.delta_bytes += len(block)
+        self.stats['delta'] += 1
+        self.stats['bytes'] += len(block)
+
+    def needs_compaction(self) -> bool:
+        """Các khối tăng dần đã lớn hơn khối đầy đủ: lần sau ghi lại đầy đủ cho file gọn và nạp nhanh"""
+        return self.base_bytes == 0 or self.delta_bytes > self.base_bytes
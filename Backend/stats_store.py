@@ -0,0 +1,206 @@
+"""Lưu thành tích người chơi (thắng / thua / hòa, series) vào SQLite và bảng xếp hạng.
+
+- Ghi trễ theo lô (write-behind): process_game_result chỉ cộng vào bộ đệm trong RAM;
+  một task gom các thay đổi và ghi cả lô trong một transaction trên thread riêng,
+  nên event loop không bao giờ chờ đĩa. Crash chỉ mất tối đa `flush_interval` giây
+  (hoặc `max_pending` người chơi) thay đổi chưa ghi.
+- Đọc luôn từ cache: tổng thành tích của mọi người chơi được nạp lúc khởi động và
+  cập nhật ngay trong RAM; top-K được giữ sẵn cho get_leaderboard.
+- Mỗi lần ghi là phép cộng dồn (`wins = wins + ?`), nên nhiều process (chế độ shard)
+  có thể ghi chung một file; khi đó `shared=True` nạp lại top-K từ DB sau mỗi lần ghi.
+"""
+import asyncio
+import sqlite3
+import time
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+
+from eventlog import EventLog
+
+FIELDS = ('wins', 'losses', 'draws', 'series_won', 'series_lost')
+RESULT_FIELDS = {'win': 0, 'lose': 1, 'draw': 2}   # kết quả ván -> vị trí trong FIELDS
+FLUSH_INTERVAL = 1.0          # giây; giới hạn lượng dữ liệu mất khi crash
+MAX_PENDING = 5000            # số người chơi có thay đổi chưa ghi trước khi ghi sớm
+TOP_K = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS player_stats (
+    name        TEXT PRIMARY KEY,
+    wins        INTEGER NOT NULL DEFAULT 0,
+    losses      INTEGER NOT NULL DEFAULT 0,
+    draws       INTEGER NOT NULL DEFAULT 0,
+    series_won  INTEGER NOT NULL DEFAULT 0,
+    series_lost INTEGER NOT NULL DEFAULT 0,
+    updated_at  REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS player_stats_rank ON player_stats (wins DESC, series_won DESC, name);
+"""
+UPSERT = """
+INSERT INTO player_stats (name, wins, losses, draws, series_won, series_lost, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(name) DO UPDATE SET
+    wins = wins + excluded.wins,
+    losses = losses + excluded.losses,
+    draws = draws + excluded.draws,
+    series_won = series_won + excluded.series_won,
+    series_lost = series_lost + excluded.series_lost,
+    updated_at = excluded.updated_at
+"""
+
+
+def rank_key(name: str, totals: list) -> tuple:
+    # Chỉ dùng các số chỉ tăng (thắng, series thắng) để thứ hạng của một người chỉ đi lên
+    return (-totals[0], -totals[3], name)
+
+
+class TopK:
+    """K người đứng đầu, sắp xếp theo rank_key. Khóa của một người chỉ tốt lên,
+    nên người ngoài top chỉ có thể chen vào chứ không ai phải được kéo từ dưới lên."""
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.keys = []              # rank_key đã sắp xếp
+        self.key_of = {}            # name -> rank_key đang nằm trong self.keys
+
+    def update(self, name: str, key: tuple):
+        old = self.key_of.get(name)
+        if old is not None:
+            del self.keys[bisect_left(self.keys, old)]
+        elif len(self.keys) >= self.k and key >= self.keys[-1]:
+            return
+        insort(self.keys, key)
+        self.key_of[name] = key
+        if len(self.keys) > self.k:
+            del self.key_of[self.keys.pop()[2]]
+
+    def names(self, limit: int) -> list:
+        return [key[2] for key in self.keys[:limit]]
+
+
+class StatsStore:
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL,
+                 max_pending: int = MAX_PENDING, top_k: int = TOP_K, shared: bool = False,
+                 log: EventLog | None = None):
+        self.path = path
+        self.log = log if log is not None else EventLog()
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.shared = shared
+        self.totals = {}            # name -> [wins, losses, draws, series_won, series_lost]
+        self.pending = {}           # name -> phần cộng thêm chưa ghi (cùng thứ tự FIELDS)
+        self.top = TopK(top_k)
+        self.stats = {'flushes': 0, 'rows': 0, 'errors': 0}
+        # Một thread duy nhất giữ kết nối SQLite -> các lần ghi tự tuần tự
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stats-db')
+        self._db = None
+        self._flush_task = None
+        self._wake = None
+
+    # ---- Phía thread DB ----
+    def _open(self):
+        self._db = sqlite3.connect(self.path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        return self._db.execute(f"SELECT name, {', '.join(FIELDS)} FROM player_stats").fetchall()
+
+    def _write(self, batch: dict):
+        now = time.time()
+        with self._db:
+            self._db.executemany(UPSERT, [(name, *delta, now) for name, delta in batch.items()])
+        if self.shared:
+            return self._db.execute(
+                f"SELECT name, {', '.join(FIELDS)} FROM player_stats "
+                "ORDER BY wins DESC, series_won DESC, name LIMIT ?", (self.top.k,)).fetchall()
+        return None
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ---- Phía event loop ----
+    async def open(self):
+        """Nạp toàn bộ thành tích vào cache và bắt đầu task ghi định kỳ"""
+        rows = await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        self._load_rows(rows)
+        self._wake = asyncio.Event()
+        self._flush_task = asyncio.create_task(self.run_flusher())
+
+    def _load_rows(self, rows):
+        for name, *values in rows:
+            totals = self.totals[name] = values
+            self.top.update(name, rank_key(name, totals))
+
+    def _add(self, name: str, field: int, amount: int = 1):
+        totals = self.totals.get(name)
+        if totals is None:
+            totals = self.totals[name] = [0] * len(FIELDS)
+        totals[field] += amount
+        delta = self.pending.get(name)
+        if delta is None:
+            delta = self.pending[name] = [0] * len(FIELDS)
+        delta[field] += amount
+        if field in (0, 3):
+            self.top.update(name, rank_key(name, totals))
+        if len(self.pending) >= self.max_pending and self._wake is not None:
+            self._wake.set()
+
+    def record_round(self, results: dict):
+        """results: {tên người chơi: 'win' | 'lose' | 'draw'}"""
+        for name, result in results.items():
+            self._add(name, RESULT_FIELDS[result])
+
+    def record_series(self, winner: str, losers: list):
+        self._add(winner, 3)
+        for name in losers:
+            self._add(name, 4)
+
+    def get(self, name: str) -> dict | None:
+        totals = self.totals.get(name)
+        return dict(zip(FIELDS, totals)) if totals is not None else None
+
+    def leaderboard(self, limit: int) -> list:
+        return [{'rank': i + 1, 'name': name, **self.get(name)}
+                for i, name in enumerate(self.top.names(limit))]
+
+    async def run_flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Ghi một lô; lỗi thì trả phần chưa ghi lại bộ đệm để lần sau thử tiếp"""
+        if not self.pending or self._db is None:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            top_rows = await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            self.log.error('error', 'stats_write_failed', players=len(batch), error=repr(e))
+            for name, delta in batch.items():
+                pending = self.pending.setdefault(name, [0] * len(FIELDS))
+                for i, amount in enumerate(delta):
+                    pending[i] += amount
+            return
+        self.stats['flushes'] += 1
+        self.stats['rows'] += len(batch)
+        if top_rows is not None:
+            # Chế độ shard: top-K lấy từ DB chung (gồm cả kết quả của các process khác)
+            self.top = TopK(self.top.k)
+            for name, *values in top_rows:
+                if name not in self.pending:
+                    self.totals[name] = values
+                self.top.update(name, rank_key(name, self.totals[name]))
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=True)
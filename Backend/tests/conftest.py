@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from server import GameServer  # noqa: E402
+from eventlog import EventLog  # noqa: E402
+import wire  # noqa: E402
+
+
+class FakeSocket:
+    """Socket giả: giữ các frame đã nhận (đã giải mã, JSON hoặc wire), thời điểm nhận và mã đóng kết nối"""
+    def __init__(self):
+        self.frames = []
+        self.sent_at = []
+        self.closed_with = None
+
+    async def send(self, frame):
+        self.frames.append(json.loads(frame) if isinstance(frame, str) else wire.decode(frame))
+        self.sent_at.append(time.perf_counter())
+
+    async def close(self, code=1000, reason=''):
+        self.closed_with = code
+
+    def of_type(self, message_type: str) -> list:
+        return [f for f in self.frames if f['type'] == message_type]
+
+
+class FrozenSocket(FakeSocket):
+    """Không bao giờ đọc cho tới khi gate được mở"""
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    async def send(self, frame):
+        await self.gate.wait()
+        await super().send(frame)
+
+
+@pytest.fixture
+def make_server():
+    """Tạo GameServer cho test (sảnh chờ gửi ngay, không giới hạn tốc độ, bỏ log); tự đóng khi test xong"""
+    servers = []
+
+    def make(**options) -> GameServer:
+        options.setdefault('lobby_window', 0)
+        options.setdefault('rate_limits', None)
+        if options.get('log') is None:
+            options['log'] = EventLog(os.devnull)
+        gs = GameServer(**options)
+        servers.append(gs)
+        return gs
+
+    yield make
+    for gs in servers:
+        gs.passwords.close()
+        gs.log.close()
+
+
+@pytest.fixture
+def server(make_server) -> GameServer:
+    return make_server()
+
+
+@pytest.fixture
+def connect():
+    """connect(gs, frozen=False, **client_info): đăng ký một kết nối giả như handle_client"""
+    def connect(gs: GameServer, frozen: bool = False, **client_info) -> FakeSocket:
+        ws = FrozenSocket() if frozen else FakeSocket()
+        pid = gs.get_next_player_id()
+        gs.clients[ws] = {'id': pid, 'room_id': None, 'name': f'Player_{pid}', **client_info}
+        return ws
+    return connect
+
+
+@pytest.fixture
+def say():
+    """say(gs, ws, message): gửi một tin nhắn rồi nhường một lượt event loop như server thật"""
+    async def say(gs: GameServer, ws, message: dict):
+        await gs.handle_message(ws, json.dumps(message))
+        await asyncio.sleep(0)
+    return say
+
+
+@pytest.fixture
+def settle():
+    """Chạy hết các task ghi / broadcast đang chờ"""
+    async def settle(rounds: int = 10):
+        for _ in range(rounds):
+            await asyncio.sleep(0)
+    return settle
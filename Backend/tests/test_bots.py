@@ -0,0 +1,47 @@
+"""Id của bot lấy từ dải riêng, không trùng id người chơi (kể cả id do router gán cho worker)."""
+import asyncio
+import json
+import os
+
+from server import BOT_ID_BASE
+from sharding import ShardWorker
+from eventlog import EventLog
+import wire
+
+
+def room_ids(gs, ws):
+    room = gs.get_room(gs.get_player_room(ws))
+    return [(p['name'], p['player_id']) for p in gs.get_room_info_with_player_ids(room)['players']]
+
+
+def test_bot_id_does_not_collide_with_router_ids(connect):
+    async def run():
+        worker = ShardWorker(0, 1, 'secret')
+        worker.log.close()
+        worker.log = EventLog(os.devnull)
+        sockets = [connect(worker) for _ in range(3)]
+        # Router gán id của chính nó: cùng dải 1, 2, 3... với bộ đếm của worker
+        for router_id, ws in enumerate(sockets, start=1):
+            await worker.handle_message(ws, json.dumps({'type': 'attach', 'token': 'secret',
+                                                        'player_id': router_id, 'name': f'Human{router_id}'}))
+            await worker.handle_message(ws, json.dumps({'type': 'play_bot'}))
+        seen = set()
+        for ws in sockets:
+            (human, human_id), (bot, bot_id) = room_ids(worker, ws)
+            assert bot == 'Bot' and bot_id != human_id
+            assert worker.player_counter < bot_id < BOT_ID_BASE
+            seen.add(bot_id)
+        assert len(seen) == len(sockets)
+        worker.log.close()
+    asyncio.run(run())
+
+
+def test_bot_id_fits_binary_frames(server, connect):
+    async def run():
+        ws = connect(server, binary=True)
+        await server.handle_message(ws, json.dumps({'type': 'play_bot'}))
+        room = server.get_room(server.get_player_room(ws))
+        frame = wire.encode({'type': 'room_updated', 'room': server.get_room_info_with_player_ids(room)})
+        players = wire.decode(frame)['room']['players']
+        assert [p['player_id'] for p in players] == [server.clients[ws]['id'], room.bot.player_id]
+    asyncio.run(run())
@@ -0,0 +1,45 @@
+"""Lấy mẫu nhật ký ở các đường nóng (kết quả ván, chat): bản ghi bị bỏ không được dựng."""
+import asyncio
+import json
+
+from server import GameServer
+from eventlog import EventLog
+
+
+def play_rounds(gs: GameServer, connect, rounds: int):
+    async def run():
+        a, b = connect(gs), connect(gs)
+        await gs.handle_message(a, json.dumps({'type': 'create_room', 'room_name': 'x'}))
+        await gs.handle_message(b, json.dumps({'type': 'join_room', 'room_id': gs.get_player_room(a)}))
+        for r in range(rounds):
+            for ws in (a, b):
+                await gs.handle_message(ws, json.dumps({'type': 'ready' if r == 0 else 'new_game'}))
+            await gs.handle_message(a, json.dumps({'type': 'chat', 'message': 'hi'}))
+            await gs.handle_message(a, json.dumps({'type': 'choice', 'choice': 'rock'}))
+            await gs.handle_message(b, json.dumps({'type': 'choice', 'choice': 'paper'}))
+        gs.log.close()
+    asyncio.run(run())
+
+
+def events(path) -> list:
+    return [json.loads(line)['event'] for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_hot_paths_respect_sampling(tmp_path, make_server, connect):
+    play_rounds(make_server(log=EventLog(str(tmp_path / 'all.log'))), connect, 10)
+    kept = events(tmp_path / 'all.log')
+    assert kept.count('round_result') == 10 and kept.count('chat') == 10
+
+    log = EventLog(str(tmp_path / 'sampled.log'), sampling={'game': 0.0, 'chat': 0.0})
+    play_rounds(make_server(log=log), connect, 10)
+    kept = events(tmp_path / 'sampled.log')
+    assert 'round_result' not in kept and 'chat' not in kept and 'created' in kept
+    assert log.sampled_out == 20
+
+
+def test_round_result_fields(tmp_path, make_server, connect):
+    play_rounds(make_server(log=EventLog(str(tmp_path / 'events.log'))), connect, 1)
+    lines = [json.loads(line) for line in (tmp_path / 'events.log').read_text(encoding='utf-8').splitlines()]
+    record = next(r for r in lines if r['event'] == 'round_result')
+    assert record['cat'] == 'game' and record['players'] == 2 and record['winner'] == 'paper'
+    assert record['counts'] == {'rock': 1, 'paper': 1, 'scissors': 0} and record['timed_out'] is False
@@ -0,0 +1,66 @@
+"""Dọn phòng / kết nối bỏ không: chỉ dọn thứ đã im lặng quá hạn, không đụng phòng đang chơi."""
+import asyncio
+import json
+import time
+
+from server import IDLE_CLOSE_CODE
+
+
+async def room_of(gs, connect, **create):
+    a, b = connect(gs), connect(gs)
+    await gs.handle_message(a, json.dumps({'type': 'create_room', 'room_name': 'r', **create}))
+    room = gs.get_room(gs.get_player_room(a))
+    await gs.handle_message(b, json.dumps({'type': 'join_room', 'room_id': room.room_id}))
+    return room, a, b
+
+
+def test_idle_room_is_closed_and_active_room_kept(make_server, connect, settle):
+    async def run():
+        gs = make_server()
+        gs.room_idle_timeout, gs.idle_timeout = 60, 0
+        idle, a, b = await room_of(gs, connect)
+        busy, c, _ = await room_of(gs, connect)
+        later = time.monotonic() + 61
+        gs.clients[c]['active'] = later          # một người còn hoạt động là đủ giữ phòng
+        assert await gs.sweep_idle(later) == (1, 0)
+        await settle()
+        assert gs.get_room(idle.room_id) is None and gs.get_room(busy.room_id) is busy
+        assert gs.get_player_room(a) is None and a.of_type('room_closed') and b.of_type('room_closed')
+        assert not c.of_type('room_closed')
+
+    asyncio.run(run())
+
+
+def test_room_waiting_on_round_deadline_is_kept(make_server, connect):
+    async def run():
+        gs = make_server()
+        gs.room_idle_timeout, gs.idle_timeout = 60, 0
+        room, a, b = await room_of(gs, connect, round_seconds=30)
+        for ws in (a, b):
+            await gs.handle_message(ws, json.dumps({'type': 'ready'}))
+        assert room.round_timer is not None
+        later = time.monotonic() + 61
+        assert await gs.sweep_idle(later) == (0, 0) and gs.get_room(room.room_id) is room
+        # Hết ván (hạn chót đã xử lý) mà vẫn không ai hoạt động: lượt quét sau dọn phòng
+        gs._cancel_round_timer(room)
+        assert await gs.sweep_idle(later) == (1, 0) and gs.get_room(room.room_id) is None
+
+    asyncio.run(run())
+
+
+def test_idle_connection_outside_rooms_is_closed(make_server, connect, settle):
+    async def run():
+        gs = make_server()
+        gs.room_idle_timeout, gs.idle_timeout = 0, 60
+        room, a, _ = await room_of(gs, connect)
+        lobby, watcher = connect(gs), connect(gs)
+        await gs.handle_message(watcher, json.dumps({'type': 'spectate', 'room_id': room.room_id}))
+        for ws in (a, lobby, watcher):
+            gs.clients[ws]['socket'] = ws
+            gs.clients[ws]['active'] = time.monotonic()
+        assert await gs.sweep_idle(time.monotonic() + 61) == (0, 1)
+        await settle()
+        assert lobby.closed_with == IDLE_CLOSE_CODE
+        assert a.closed_with is None and watcher.closed_with is None
+
+    asyncio.run(run())
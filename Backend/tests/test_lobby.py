@@ -0,0 +1,41 @@
+"""Tên phòng từ client và lô cập nhật sảnh chờ."""
+import asyncio
+import json
+
+import server
+
+
+def test_room_name_is_checked(make_server, connect, settle):
+    async def run():
+        gs = make_server()
+        a, b, c = connect(gs), connect(gs), connect(gs)
+        await gs.handle_message(a, json.dumps({'type': 'create_room', 'room_name': 123}))
+        await settle()
+        assert gs.get_player_room(a) is None and not gs.rooms
+        assert a.frames[-1] == {'type': 'error', 'message': 'Tên phòng không hợp lệ'}
+        await gs.handle_message(b, json.dumps({'type': 'create_room', 'room_name': '  ' + 'x' * 100}))
+        await gs.handle_message(c, json.dumps({'type': 'create_room', 'room_name': '   '}))
+        await settle()
+        assert gs.get_room(gs.get_player_room(b)).room_name == 'x' * server.ROOM_NAME_MAX
+        assert gs.get_room(gs.get_player_room(c)).room_name.startswith('Phòng ')
+        assert len(gs.lobby.rooms) == 2
+    asyncio.run(run())
+
+
+def test_bad_summary_does_not_drop_the_batch(make_server, connect, settle):
+    async def run():
+        gs = make_server(lobby_window=0.01)
+        watcher = connect(gs)
+        good = gs.create_room('Tốt', 2)
+        bad = gs.create_room('Hỏng', 2)
+        gs.get_room(bad).room_name = 123          # không đi qua handler
+        await gs.broadcast_room_change(good)
+        await gs.broadcast_room_change(bad)
+        await asyncio.sleep(0.05)
+        await settle()
+        assert good in gs.lobby.rooms and bad not in gs.lobby.rooms
+        deltas = [f for f in watcher.frames if f['type'] == 'rooms_delta']
+        assert [c['room']['room_id'] for d in deltas for c in d['changes']] == [good]
+        # Chỉ mục truy vấn không bị lệch bởi lần công bố hỏng
+        assert gs.lobby.query.joinable == {good}
+    asyncio.run(run())
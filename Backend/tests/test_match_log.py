@@ -0,0 +1,59 @@
+"""Nhật ký ván đấu: ghi file và đọc lịch sử chạy trên thread riêng, không chặn event loop."""
+import asyncio
+import json
+import threading
+
+from match_log import MatchLog, MatchLogReader
+
+
+async def play(gs, connect, rounds: int):
+    a, b = connect(gs, name='An'), connect(gs, name='Bình')
+    await gs.handle_message(a, json.dumps({'type': 'create_room', 'room_name': 'x'}))
+    await gs.handle_message(b, json.dumps({'type': 'join_room', 'room_id': gs.get_player_room(a)}))
+    for r in range(rounds):
+        for ws in (a, b):
+            await gs.handle_message(ws, json.dumps({'type': 'ready' if r == 0 else 'new_game'}))
+        await gs.handle_message(a, json.dumps({'type': 'choice', 'choice': 'rock'}))
+        await gs.handle_message(b, json.dumps({'type': 'choice', 'choice': 'paper'}))
+    return a, b
+
+
+def test_writes_run_off_the_event_loop(tmp_path, server, connect):
+    async def run():
+        server.match_log = log = MatchLog(str(tmp_path), segment_records=5, buffer_records=3)
+        await log.open()
+        threads = set()
+        write = log._write
+
+        def tracked(data):
+            threads.add(threading.current_thread())
+            write(data)
+        log._write = tracked
+        await play(server, connect, 6)
+        await log.close()
+        assert threads and threading.current_thread() not in threads
+
+    asyncio.run(run())
+    reader = MatchLogReader(str(tmp_path))
+    assert len(list(reader.scan(player='An'))) == 6 and len(reader.segments()) == 3
+
+
+def test_history_reads_buffered_and_written_rounds(tmp_path, server, connect, settle):
+    async def run():
+        # Segment 5 bản ghi, buffer 3: lịch sử trải qua segment đã đóng, file đang ghi và buffer
+        server.match_log = log = MatchLog(str(tmp_path), segment_records=5, buffer_records=3)
+        await log.open()
+        a, b = await play(server, connect, 6)
+        assert log._buffered
+        await server.handle_message(a, json.dumps({'type': 'get_match_history', 'limit': 10}))
+        await settle()
+        history = a.of_type('match_history')[-1]
+        assert [r['round_id'] for r in history['rounds']] == [6, 5, 4, 3, 2, 1]
+        for entry in history['rounds']:
+            assert entry['name'] == 'An' and entry['result'] == 'lose'
+            (opponent,) = entry['opponents']
+            assert (opponent['name'], opponent['player_id'], opponent['choice']) == \
+                ('Bình', server.clients[b]['id'], 'paper')
+        await log.close()
+
+    asyncio.run(run())
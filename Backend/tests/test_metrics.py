@@ -0,0 +1,27 @@
+"""/metrics trên cùng cổng WebSocket."""
+import asyncio
+import warnings
+
+import websockets
+
+
+def test_metrics_endpoint_without_deprecation_warning(server):
+    async def run():
+        gs = server
+
+        async def handler(websocket, path):
+            await gs.handle_client(websocket, path)
+
+        async with websockets.serve(handler, '127.0.0.1', 0, process_request=gs.process_request) as srv:
+            port = srv.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            head = await reader.readuntil(b'\r\n\r\n')
+            assert head.startswith(b'HTTP/1.1 200')
+            writer.close()
+            async with websockets.connect(f'ws://127.0.0.1:{port}/') as ws:
+                assert '"player_id"' in await ws.recv()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        asyncio.run(run())
@@ -0,0 +1,29 @@
+"""Tên người chơi từ client: là khóa của thành tích nên phải được kiểm tra trước khi dùng."""
+import asyncio
+import json
+
+from server import PLAYER_NAME_MAX, clean_name
+from bots import BOT_NAME
+
+
+def test_clean_name():
+    assert clean_name('  An  ') == 'An'
+    assert clean_name('x' * 100) == 'x' * PLAYER_NAME_MAX
+    for bad in (None, 123, ['An'], {'a': 1}, '', '   ', 'An\nBình', '\x00', BOT_NAME):
+        assert clean_name(bad) is None
+
+
+def test_set_name_rejects_bad_names(make_server, connect, settle):
+    async def run():
+        gs = make_server()
+        ws = connect(gs)
+        for bad in (123, None, '', 'a\tb', {'x': 1}):
+            await gs.handle_message(ws, json.dumps({'type': 'set_name', 'name': bad}))
+            assert gs.clients[ws]['name'] == 'Player_1'
+        await gs.handle_message(ws, json.dumps({'type': 'set_name'}))
+        await gs.handle_message(ws, json.dumps({'type': 'set_name', 'name': ' ' + 'y' * 50}))
+        await settle()
+        assert gs.clients[ws]['name'] == 'y' * PLAYER_NAME_MAX
+        errors = ws.of_type('error')
+        assert len(errors) == 6 and all(f['message'].startswith('Tên không hợp lệ') for f in errors)
+    asyncio.run(run())
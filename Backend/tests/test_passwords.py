@@ -0,0 +1,46 @@
+"""Mật khẩu phòng: băm / kiểm tra scrypt, pool có giới hạn và LRU các lần kiểm tra đúng."""
+import asyncio
+import hashlib
+
+from passwords import PasswordPool, hash_password, verify_password
+
+
+def test_hash_and_verify_round_trip():
+    stored = hash_password('bí mật', n=2 ** 10)
+    assert stored.startswith('scrypt$1024$') and stored != hash_password('bí mật', n=2 ** 10)   # salt riêng
+    assert verify_password('bí mật', stored)
+    assert not verify_password('bi mat', stored)
+    # Hash cũ (sha256 không salt) vẫn kiểm tra được; hash hỏng thì luôn sai
+    legacy = hashlib.sha256(b'pw').hexdigest()
+    assert verify_password('pw', legacy) and not verify_password('pw2', legacy)
+    for broken in ('scrypt$x$8$1$00$00', 'md5$1$2$3$00$00', 'scrypt$1024$8$1$zz$00'):
+        assert not verify_password('pw', broken)
+
+
+def test_pool_rejects_work_beyond_max_pending():
+    async def run():
+        pool = PasswordPool(workers=1, max_pending=2, cache_size=8)
+        try:
+            results = await asyncio.gather(*(pool.hash('pw') for _ in range(3)))
+            assert results[2] is None and all(results[:2])
+            assert pool.stats['busy'] == 1 and pool.stats['hashed'] == 2 and pool.pending == 0
+            assert await pool.verify('pw', results[0]) is True
+            assert await pool.verify('sai', results[0]) is False
+            assert pool.stats['verified'] == 1 and pool.stats['wrong'] == 1
+        finally:
+            pool.close()
+
+    asyncio.run(run())
+
+
+def test_verified_cache_is_lru():
+    pool = PasswordPool(workers=1, max_pending=2, cache_size=2)
+    pool.remember('r1', 1, 'h1')
+    pool.remember('r2', 2, 'h2')
+    assert pool.is_verified('r1', 1, 'h1')          # r1 vừa dùng: r2 là cũ nhất
+    pool.remember('r3', 3, 'h3')
+    assert not pool.is_verified('r2', 2, 'h2')
+    assert pool.is_verified('r1', 1, 'h1') and pool.is_verified('r3', 3, 'h3')
+    # Phòng đổi mật khẩu: lần kiểm tra cũ không còn giá trị
+    assert not pool.is_verified('r1', 1, 'h1-mới')
+    assert pool.stats['cached'] == 3
@@ -0,0 +1,59 @@
+"""Chỉ mục websocket -> phòng không bao giờ lệch khỏi rooms / clients dưới chuỗi thao tác ngẫu nhiên."""
+import asyncio
+import json
+import random
+
+from server import GameServer
+
+
+def check(gs: GameServer):
+    expected = {player: room_id for room_id, room in gs.rooms.items() for player in room.players}
+    assert gs.index.room_by_ws == expected
+    for websocket, client_info in gs.clients.items():
+        assert client_info['room_id'] == expected.get(websocket)
+        assert gs.get_player_room(websocket) == expected.get(websocket)
+    for room in gs.rooms.values():
+        info = gs.get_room_info_with_player_ids(room)
+        assert [p['player_id'] for p in info['players']] == [gs.clients[p]['id'] for p in room.players]
+        assert [p['name'] for p in info['players']] == [gs.clients[p]['name'] for p in room.players]
+
+
+async def random_walk(gs: GameServer, connect, seed: int, steps: int):
+    rnd = random.Random(seed)
+    sockets = [connect(gs) for _ in range(20)]
+
+    async def say(ws, message):
+        await gs.handle_message(ws, json.dumps(message))
+
+    for _ in range(steps):
+        ws = rnd.choice(sockets)
+        op = rnd.random()
+        if op < 0.2:
+            await say(ws, {'type': 'create_room', 'room_name': 'r', 'max_players': rnd.choice((2, 3))})
+        elif op < 0.45 and gs.rooms:
+            await say(ws, {'type': 'join_room', 'room_id': rnd.choice(list(gs.rooms))})
+        elif op < 0.6:
+            await say(ws, {'type': 'leave_room'})
+        elif op < 0.7:
+            await say(ws, {'type': 'set_name', 'name': rnd.choice(('An', 'Bình', 'Chi'))})
+        elif op < 0.8:
+            await gs.cleanup_client(ws)
+            sockets.remove(ws)
+            sockets.append(connect(gs))
+        elif op < 0.9:
+            await say(ws, {'type': 'ready'})
+        else:
+            await say(ws, {'type': 'choice', 'choice': rnd.choice(('rock', 'paper', 'scissors'))})
+        check(gs)
+    for ws in list(gs.clients):
+        await gs.cleanup_client(ws)
+    check(gs)
+    assert not gs.rooms and not gs.index.room_by_ws
+    for task in (gs._timer_task, gs._bot_task, gs._session_task, gs._match_task):
+        if task is not None:
+            task.cancel()
+
+
+def test_index_never_drifts(make_server, connect):
+    for seed in range(5):
+        asyncio.run(random_walk(make_server(), connect, seed, 1500))
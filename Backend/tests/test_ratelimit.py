@@ -0,0 +1,70 @@
+"""Giới hạn tốc độ: token bucket nạp lại theo thời gian, giới hạn theo loại, báo lỗi / ngắt kết nối khi spam."""
+import asyncio
+import json
+
+import wire
+from ratelimit import RateLimiter, TokenBucket, peek_type
+
+
+def test_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=1.0, burst=2, now=0.0)
+    assert bucket.take(0.0) and bucket.take(0.0) and not bucket.take(0.0)
+    assert not bucket.take(0.5)          # mới nạp được nửa token
+    assert bucket.take(1.0)
+    # Nghỉ lâu cũng chỉ dồn tối đa `burst` token
+    assert bucket.take(100.0) and bucket.take(100.0) and not bucket.take(100.0)
+
+
+def test_per_type_limit_leaves_other_types_alone():
+    limiter = RateLimiter({None: (100.0, 100), 'chat': (1.0, 2)}, now=0.0)
+    assert [limiter.allow('chat', 0.0) for _ in range(3)] == [True, True, False]
+    assert limiter.allow('ping', 0.0) and limiter.allow(None, 0.0)
+    assert limiter.allow('chat', 1.0)
+
+
+def test_total_limit_covers_every_type():
+    limiter = RateLimiter({None: (1.0, 2)}, now=0.0)
+    assert [limiter.allow(t, 0.0) for t in ('ping', 'chat', None)] == [True, True, False]
+
+
+def test_peek_type():
+    assert peek_type('{"type": "chat", "message": "hi"}') == 'chat'
+    assert peek_type(wire.encode({'type': 'ready'})) == 'ready'          # frame nhị phân bọc JSON
+    # Frame nhị phân có cấu trúc riêng: không có 'type' dạng chữ ở đầu
+    assert peek_type(bytes([wire.T_GAME_RESULT]) + b'{"type": "chat"}') is None
+    for malformed in ('', '{', '{"type":', '{"type": 42}', '{"name": "x", "type": "chat"}',
+                      '{"type": "' + 'a' * 40 + '"}', 'not json', b'', b'\x00', b'\x00\xff\xfe{"type"'):
+        assert peek_type(malformed) is None, malformed
+
+
+def test_spam_is_warned_once_then_disconnected(make_server, connect, settle):
+    async def run():
+        gs = make_server(rate_limits={None: (1000.0, 1000), 'chat': (0.001, 1)}, rate_disconnect=3)
+        ws = connect(gs)
+        chat = json.dumps({'type': 'chat', 'message': 'hi'})
+        for _ in range(3):
+            await gs.handle_message(ws, chat)
+            await settle()
+        assert len(ws.of_type('error')) == 1 and ws.closed_with is None
+        await gs.handle_message(ws, chat)
+        await settle()
+        assert ws.closed_with == 1008 and len(ws.of_type('error')) == 1
+        # Loại khác vẫn qua
+        await gs.handle_message(ws, json.dumps({'type': 'ping', 't': 1}))
+        await settle()
+        assert ws.of_type('pong')
+
+    asyncio.run(run())
+
+
+def test_malformed_frames_are_dropped(make_server, connect, settle):
+    async def run():
+        gs = make_server(rate_limits={None: (1000.0, 1000)})
+        ws = connect(gs)
+        for frame in ('{"type": "chat", oops', 'not json', b'\x00{"type"', b'\xff\x01'):
+            await gs.handle_message(ws, frame)
+        await gs.handle_message(ws, json.dumps({'type': 'ping', 't': 1}))
+        await settle()
+        assert [f['type'] for f in ws.frames] == ['pong'] and ws.closed_with is None
+
+    asyncio.run(run())
@@ -0,0 +1,135 @@
+"""Kết nối lại bằng resume token: về đúng chỗ ngồi và điểm; token hết hạn / sai thì vào như người mới."""
+import asyncio
+import json
+
+from conftest import FakeSocket
+
+
+class LiveSocket(FakeSocket):
+    """Socket giả cho handle_client: tin nhắn client lấy từ hàng đợi, close() kết thúc vòng đọc"""
+    subprotocol = None
+
+    def __init__(self):
+        super().__init__()
+        self.inbox = asyncio.Queue()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def close(self, code=1000, reason=''):
+        await super().close(code, reason)
+        self.inbox.put_nowait(None)
+
+
+async def join(gs, path: str = '/'):
+    ws = LiveSocket()
+    task = asyncio.create_task(gs.handle_client(ws, path))
+    await asyncio.sleep(0.01)
+    return ws, task
+
+
+async def tell(ws, message: dict):
+    ws.inbox.put_nowait(json.dumps(message))
+    await asyncio.sleep(0.01)
+
+
+async def hang_up(gs):
+    """Đóng mọi kết nối còn mở, chờ handle_client xử lý xong rồi tắt server"""
+    for info in list(gs.clients.values()):
+        if info.get('socket') is not None:
+            await info['socket'].close()
+    await asyncio.sleep(0.01)
+    await gs.shutdown()
+
+
+def session_of(gs, player_id: int):
+    return next(session for session, info in gs.clients.items() if info['id'] == player_id)
+
+
+async def played_room(gs):
+    """Hai người chơi một ván (a thắng); trả về socket, task và khóa phiên của a"""
+    (a, task), (b, _) = await join(gs), await join(gs)
+    await tell(a, {'type': 'create_room', 'room_name': 'x'})
+    session = session_of(gs, a.of_type('player_id')[0]['player_id'])
+    await tell(b, {'type': 'join_room', 'room_id': gs.get_player_room(session)})
+    for ws in (a, b):
+        await tell(ws, {'type': 'ready'})
+    await tell(a, {'type': 'choice', 'choice': 'rock'})
+    await tell(b, {'type': 'choice', 'choice': 'scissors'})
+    return a, task, b, session
+
+
+def test_resume_restores_seat_and_score(make_server):
+    async def run():
+        gs = make_server(resume_grace=5)
+        a, task, b, session = await played_room(gs)
+        hello = a.of_type('player_id')[0]
+        room = gs.get_room(gs.get_player_room(session))
+        score = room.seats[session].score()
+        assert score['wins'] == 1
+
+        await a.close()
+        await task
+        assert session in room.seats and gs.clients[session]['socket'] is None
+
+        again, _ = await join(gs, '/?resume=' + hello['resume_token'])
+        (welcome,) = again.of_type('player_id')
+        assert welcome['resumed'] and welcome['player_id'] == hello['player_id']
+        assert welcome['resume_token'] != hello['resume_token']
+        assert again.of_type('room_updated')[0]['room']['room_id'] == room.room_id
+        assert gs.get_player_room(session) == room.room_id and room.seats[session].score() == score
+
+        # Chơi tiếp qua kết nối mới
+        for ws in (again, b):
+            await tell(ws, {'type': 'new_game'})
+        await tell(again, {'type': 'choice', 'choice': 'paper'})
+        await tell(b, {'type': 'choice', 'choice': 'rock'})
+        assert room.seats[session].score()['wins'] == 2 and again.of_type('game_result')
+        await hang_up(gs)
+
+    asyncio.run(run())
+
+
+def test_invalid_or_used_token_is_rejected(make_server):
+    async def run():
+        gs = make_server(resume_grace=5)
+        a, task, _, session = await played_room(gs)
+        token = a.of_type('player_id')[0]['resume_token']
+        await a.close()
+        await task
+        await join(gs, '/?resume=' + token)
+
+        for path in ('/?resume=' + token, '/?resume=not-a-token'):
+            stranger, _ = await join(gs, path)
+            (welcome,) = stranger.of_type('player_id')
+            assert 'resumed' not in welcome and welcome['player_id'] != gs.clients[session]['id']
+            assert gs.get_player_room(session_of(gs, welcome['player_id'])) is None
+        assert gs.session_stats['unknown_token'] == 2
+        await hang_up(gs)
+
+    asyncio.run(run())
+
+
+def test_expired_session_frees_the_seat(make_server):
+    async def run():
+        gs = make_server(resume_grace=0.3)
+        a, task, b, session = await played_room(gs)
+        token = a.of_type('player_id')[0]['resume_token']
+        room = gs.get_room(gs.get_player_room(session))
+        await a.close()
+        await task
+        await asyncio.sleep(1.2)         # hạn giữ chỗ + một tick của timer wheel
+        assert session not in gs.clients and session not in room.seats
+        assert gs.session_stats['expired'] == 1 and b.of_type('player_left')
+
+        late, _ = await join(gs, '/?resume=' + token)
+        assert 'resumed' not in late.of_type('player_id')[0]
+        await hang_up(gs)
+
+    asyncio.run(run())
@@ -0,0 +1,157 @@
+"""Hạn chót ván trong timer wheel: tự chọn khi hết giờ như task riêng mỗi ván trước đây."""
+import asyncio
+import json
+import random
+import time
+
+from server import GameServer, CHOICES
+from timer_wheel import TimerWheel
+
+
+def test_wheel_matches_sleep_per_timer():
+    """Mỗi timer hết hạn ở lần advance đầu tiên có now >= hạn chót, không bao giờ sớm hơn"""
+    rnd = random.Random(7)
+    start = 500_000.0                 # đồng hồ monotonic của máy đã chạy vài ngày
+    wheel = TimerWheel(0.1, now=start)
+    now = start
+    due = {}                          # key -> (thời điểm hết hạn, entry)
+    fired = {}
+    for step in range(10_000):
+        op = rnd.random()
+        if op < 0.3:
+            delay = rnd.choice((0.05, 0.3, 3, 10, 60, 500, 5000)) * rnd.random()
+            due[step] = (now + delay, wheel.schedule(now, delay, step))
+        elif op < 0.4 and due:
+            key = rnd.choice(list(due))
+            assert wheel.cancel(due.pop(key)[1])
+        else:
+            now += rnd.choice((0.01, 0.1, 0.7, 5, 30))
+            for entry in wheel.advance(now):
+                deadline, _ = due.pop(entry.key)
+                assert deadline <= now + 1e-9
+                fired[entry.key] = now
+            # ... và mọi timer đã quá hạn trước `now - tick` đều đã hết hạn
+            assert all(deadline > now - wheel.tick - 1e-9 for deadline, _ in due.values())
+        assert len(wheel) == len(due)
+    assert fired
+
+
+def test_first_advance_does_not_walk_from_zero():
+    """Bánh xe tạo với now=0 (hoặc để rỗng lâu) không được đi từng tick qua khoảng trống"""
+    for wheel in (TimerWheel(0.1), TimerWheel(0.1, now=time.monotonic())):
+        now = 7 * 86400.0                       # 7 ngày uptime
+        wheel.advance(now - 3600)               # rỗng: chỉ nhảy
+        entry = wheel.schedule(now, 10, 'room')
+        assert wheel.current == int(now / 0.1)
+        started = time.perf_counter()
+        assert wheel.advance(now + 9.9) == []
+        assert wheel.advance(now + 10) == [entry]
+        assert time.perf_counter() - started < 0.05
+        # Rỗng một giờ rồi hẹn lại
+        later = now + 3600
+        entry = wheel.schedule(later, 3, 'room')
+        assert wheel.advance(later + 3) == [entry]
+
+
+async def playing_room(gs: GameServer, connect, round_seconds: int = 3):
+    a, b = connect(gs), connect(gs)
+    await gs.handle_message(a, json.dumps({'type': 'create_room', 'room_name': 'r', 'round_seconds': round_seconds}))
+    room_id = gs.get_player_room(a)
+    await gs.handle_message(b, json.dumps({'type': 'join_room', 'room_id': room_id}))
+    for ws in (a, b):
+        await gs.handle_message(ws, json.dumps({'type': 'ready'}))
+    room = gs.get_room(room_id)
+    assert room.game_state == 'playing' and room.round_timer is not None
+    return room, a, b
+
+
+def test_timeout_auto_picks_for_players_who_did_not_choose(server, connect, settle):
+    async def run():
+        gs = server
+        room, a, b = await playing_room(gs, connect)
+        await gs.handle_message(a, json.dumps({'type': 'choice', 'choice': 'rock'}))
+        loop = asyncio.get_running_loop()
+        started = room.round_started_at
+        await asyncio.sleep(2.8)
+        await settle()
+        assert not a.of_type('game_result') and room.game_state == 'playing'
+        await asyncio.sleep(0.4)
+        await settle()
+        results = a.of_type('game_result')
+        assert len(results) == 1 and results == b.of_type('game_result')
+        choices = results[0]['choices']
+        assert choices[gs.clients[a]['name']] == 'rock'
+        assert choices[gs.clients[b]['name']] in CHOICES
+        assert loop.time() - started >= 3
+        assert room.game_state == 'waiting' and room.round_timer is None and not len(gs.round_timers)
+    asyncio.run(run())
+
+
+def test_timer_cancelled_when_round_ends_or_player_leaves(server, connect, settle):
+    async def run():
+        gs = server
+        room, a, b = await playing_room(gs, connect)
+        await gs.handle_message(a, json.dumps({'type': 'choice', 'choice': 'rock'}))
+        await gs.handle_message(b, json.dumps({'type': 'choice', 'choice': 'paper'}))
+        await settle()
+        assert len(a.of_type('game_result')) == 1 and not len(gs.round_timers)
+        other, c, d = await playing_room(gs, connect)
+        await gs.handle_message(c, json.dumps({'type': 'leave_room'}))
+        await asyncio.sleep(3.3)
+        await settle()
+        # Không có kết quả tự chọn muộn nào sau khi ván đã xong / người chơi đã rời
+        assert len(a.of_type('game_result')) == 1 and not d.of_type('game_result')
+        assert not len(gs.round_timers)
+    asyncio.run(run())
+
+
+async def three_player_round(gs: GameServer, connect, round_seconds: int = 3):
+    players = [connect(gs) for _ in range(3)]
+    await gs.handle_message(players[0], json.dumps({'type': 'create_room', 'room_name': 'r', 'max_players': 3,
+                                                    'round_seconds': round_seconds}))
+    room_id = gs.get_player_room(players[0])
+    for ws in players[1:]:
+        await gs.handle_message(ws, json.dumps({'type': 'join_room', 'room_id': room_id}))
+    for ws in players:
+        await gs.handle_message(ws, json.dumps({'type': 'ready'}))
+    room = gs.get_room(room_id)
+    assert room.game_state == 'playing' and len(room.seats) == 3
+    return room, players
+
+
+def test_leaving_mid_round_keeps_the_deadline_for_the_others(server, connect, settle):
+    async def run():
+        gs = server
+        room, (a, b, c) = await three_player_round(gs, connect)
+        await gs.handle_message(a, json.dumps({'type': 'choice', 'choice': 'rock'}))
+        await gs.handle_message(c, json.dumps({'type': 'leave_room'}))
+        assert room.game_state == 'playing' and room.round_timer is not None
+        await asyncio.sleep(3.3)
+        await settle()
+        results = a.of_type('round_result')
+        assert len(results) == 1 and results == b.of_type('round_result') and not c.of_type('round_result')
+        # Người đã rời không còn trong ván; b được tự chọn
+        assert results[0]['choices'][0] == 'r' and len(results[0]['choices']) == 2
+        assert sum(results[0]['counts'].values()) == 2
+        assert room.game_state == 'waiting' and not len(gs.round_timers)
+    asyncio.run(run())
+
+
+def test_leaving_mid_round_ends_it_when_the_others_have_chosen(server, connect, settle):
+    async def run():
+        gs = server
+        room, (a, b, c) = await three_player_round(gs, connect)
+        await gs.handle_message(a, json.dumps({'type': 'choice', 'choice': 'rock'}))
+        await gs.handle_message(b, json.dumps({'type': 'choice', 'choice': 'paper'}))
+        await gs.handle_message(c, json.dumps({'type': 'leave_room'}))
+        await settle()
+        results = a.of_type('round_result')
+        assert len(results) == 1 and results[0]['results'] == 'lw'
+        assert room.game_state == 'waiting' and room.round_timer is None and not len(gs.round_timers)
+        # Còn một người: ván dừng, phòng quay về chờ
+        await gs.handle_message(a, json.dumps({'type': 'new_game'}))
+        await gs.handle_message(b, json.dumps({'type': 'new_game'}))
+        assert room.game_state == 'playing'
+        await gs.handle_message(b, json.dumps({'type': 'leave_room'}))
+        assert room.game_state == 'waiting' and room.round_timer is None and not len(gs.round_timers)
+    asyncio.run(run())
@@ -0,0 +1,157 @@
+"""Chế độ shard: router chuyển tin nhắn tới đúng worker; chạy thật (router + worker trong process riêng)
+thì codec nhị phân đi xuyên qua router."""
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+import websockets
+
+import wire
+from eventlog import EventLog
+from sharding import ShardRouter, shard_of
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def free_ports(count: int) -> int:
+    """Cổng đầu của `count` cổng liền nhau đang trống (router, các worker, IPC)"""
+    for _ in range(50):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            base = probe.getsockname()[1]
+        if base + count > 65535:
+            continue
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as s:
+                    s.bind(('127.0.0.1', port))
+        except OSError:
+            continue
+        return base
+    raise RuntimeError('không tìm được cổng trống')
+
+
+async def wait_listening(port: int):
+    for _ in range(300):
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+    raise RuntimeError(f'cổng {port} không mở')
+
+
+async def connect(port: int):
+    return await websockets.connect(f'ws://127.0.0.1:{port}', subprotocols=[wire.SUBPROTOCOL])
+
+
+async def recv_until(ws, message_type: str) -> bytes:
+    while True:
+        frame = await asyncio.wait_for(ws.recv(), 10)
+        assert isinstance(frame, bytes), frame
+        if wire.decode(frame)['type'] == message_type:
+            return frame
+
+
+def send(ws, message: dict):
+    return ws.send(wire.encode(message))
+
+
+def test_binary_codec_through_router():
+    port = free_ports(4)
+    proc = subprocess.Popen([sys.executable, 'server.py', '--host', '127.0.0.1', '--port', str(port),
+                             '--workers', '1', '--stats-db', '', '--match-log', '', '--log-file', os.devnull],
+                            cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    async def run():
+        await wait_listening(port)
+        await wait_listening(port + 1)      # worker 0
+        a = await connect(port)
+        b = await connect(port)
+        try:
+            assert a.subprotocol == wire.SUBPROTOCOL
+            await recv_until(a, 'player_id')
+            await send(a, {'type': 'create_room', 'room_name': 'shard'})
+            room_id = wire.decode(await recv_until(a, 'room_created'))['room']['room_id']
+            await send(b, {'type': 'join_room', 'room_id': room_id})
+            await recv_until(b, 'player_joined')
+            for ws in (a, b):
+                await send(ws, {'type': 'ready'})
+            # Hai client đi qua hai kết nối proxy khác nhau: chờ ván bắt đầu rồi mới chọn
+            for ws in (a, b):
+                await recv_until(ws, 'game_start')
+            await send(a, {'type': 'choice', 'choice': 'rock'})
+            await send(b, {'type': 'choice', 'choice': 'scissors'})
+            # Frame game_result do worker mã hóa theo schema nhị phân, router chuyển nguyên
+            frame = await recv_until(b, 'game_result')
+            assert frame[0] == wire.T_GAME_RESULT
+        finally:
+            await a.close()
+            await b.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+class Upstream:
+    """Kết nối proxy giả tới worker: trả lần lượt các frame cho sẵn"""
+    def __init__(self, *frames):
+        self.frames = list(frames)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.frames:
+            raise StopAsyncIteration
+        return self.frames.pop(0)
+
+
+def test_create_room_pins_the_shard_until_it_fails(connect):
+    async def run():
+        router = ShardRouter([0, 0, 0], 'secret')
+        router.log.close()
+        router.log = EventLog(os.devnull)
+        forwarded = []
+
+        async def forward(websocket, shard, message):
+            forwarded.append((shard, json.loads(message)['type']))
+        router.forward = forward
+        ws = connect(router, binary=False)
+        # ready / choice gửi trước khi room_created về phải tới cùng worker với create_room
+        for message in ({'type': 'create_room', 'room_name': 'x'}, {'type': 'ready'},
+                        {'type': 'choice', 'choice': 'rock'}):
+            await router.handle_message(ws, json.dumps(message))
+        shard = forwarded[0][0]
+        assert forwarded == [(shard, 'create_room'), (shard, 'ready'), (shard, 'choice')]
+
+        # Worker báo lỗi: bỏ ghim, join_room đi theo room_id
+        await router.pump(ws, shard, Upstream(json.dumps({'type': 'error', 'message': 'Tên phòng không hợp lệ'})))
+        assert router.clients[ws].get('room_shard') is None
+        room_id = next(f'{i:08x}' for i in range(1, 10) if shard_of(f'{i:08x}', 3) != shard)
+        await router.handle_message(ws, json.dumps({'type': 'join_room', 'room_id': room_id}))
+        assert forwarded[-1] == (shard_of(room_id, 3), 'join_room')
+
+        # Tạo thành công: giữ shard
+        await router.handle_message(ws, json.dumps({'type': 'leave_room'}))
+        await router.handle_message(ws, json.dumps({'type': 'play_bot'}))
+        shard = forwarded[-1][0]
+        await router.pump(ws, shard, Upstream(json.dumps({'type': 'room_created', 'room': {}})))
+        await router.pump(ws, shard, Upstream(json.dumps({'type': 'error', 'message': 'khác'})))
+        assert router.clients[ws]['room_shard'] == shard
+        router.passwords.close()
+        router.log.close()
+
+    asyncio.run(run())
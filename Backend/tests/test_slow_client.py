@@ -0,0 +1,79 @@
+"""Client không đọc (socket treo) không làm chậm người khác: hàng đợi gửi riêng từng kết nối có giới hạn,
+sảnh chờ bị gộp / bỏ, người chơi treo quá SLOW_CLIENT_GRACE thì bị ngắt."""
+import asyncio
+import statistics
+import time
+
+PAIRS = 20
+ROUNDS = 8
+SEND_QUEUE = 16
+
+
+async def play(gs, connect, say, frozen: bool):
+    """Chạy ROUNDS ván ở PAIRS phòng; trả về (độ trễ game_result từng ván (giây), client treo)"""
+    pairs = []
+    for _ in range(PAIRS):
+        a, b = connect(gs), connect(gs)
+        await say(gs, a, {'type': 'create_room', 'room_name': 'x'})
+        await say(gs, b, {'type': 'join_room', 'room_id': gs.get_player_room(a)})
+        pairs.append((a, b))
+    churn = connect(gs)
+    watcher = player = partner = None
+    if frozen:
+        watcher = connect(gs, frozen=True)       # chỉ ở sảnh chờ
+        player, partner = connect(gs, frozen=True), connect(gs)
+        await say(gs, player, {'type': 'create_room', 'room_name': 'f'})
+        await say(gs, partner, {'type': 'join_room', 'room_id': gs.get_player_room(player)})
+    await asyncio.sleep(0.01)
+
+    latencies = []
+    for r in range(ROUNDS):
+        start = 'ready' if r == 0 else 'new_game'
+        for a, b in pairs:
+            await say(gs, a, {'type': start})
+            await say(gs, b, {'type': start})
+        if frozen:
+            for ws in (player, partner):
+                await say(gs, ws, {'type': start})
+                await say(gs, ws, {'type': 'choice', 'choice': 'rock'})
+        marks = []
+        for a, b in pairs:
+            await say(gs, a, {'type': 'choice', 'choice': 'rock'})
+            marks.append((b, len(b.frames), time.perf_counter()))
+            await say(gs, b, {'type': 'choice', 'choice': 'paper'})
+        # Tạo / rời phòng làm sảnh chờ đổi liên tục, kể cả cho client treo
+        await say(gs, churn, {'type': 'create_room', 'room_name': 'churn'})
+        await say(gs, churn, {'type': 'leave_room'})
+        await asyncio.sleep(0.005)
+        for b, seen, at in marks:
+            got = next(i for i in range(seen, len(b.frames)) if b.frames[i]['type'] == 'game_result')
+            latencies.append(b.sent_at[got] - at)
+    for a, b in pairs:
+        assert [f['type'] for f in a.frames].count('game_result') == ROUNDS
+    return latencies, watcher, player
+
+
+def test_frozen_client_does_not_slow_others(make_server, connect, say):
+    async def run():
+        gs = make_server(send_queue=SEND_QUEUE, slow_client_grace=0.2)
+        base, _, _ = await play(gs, connect, say, frozen=False)
+        await gs.shutdown()
+
+        gs = make_server(send_queue=SEND_QUEUE, slow_client_grace=0.2)
+        latencies, watcher, player = await play(gs, connect, say, frozen=True)
+        # Trung vị để một lần GC không làm test chập chờn; không ván nào phải chờ socket treo
+        assert statistics.median(latencies) < 3 * statistics.median(base) + 0.005
+        assert max(latencies) < gs.slow_client_grace
+        # Hàng đợi của client treo có giới hạn; sảnh chờ bị bỏ / gộp thay vì dồn lại
+        assert len(gs.clients[watcher]['outbox']) <= SEND_QUEUE * 4
+        assert gs.send_stats['dropped_lobby'] > 0
+        # Người chơi treo vượt quá hạn thì bị ngắt; người chỉ xem sảnh thì không
+        await asyncio.sleep(0.3)
+        assert player.closed_with == 1008 and gs.send_stats['disconnects'] == 1
+        assert watcher.closed_with is None
+        # Mở lại: nhận sảnh chờ mới nhất thay cho các cập nhật đã bỏ
+        watcher.gate.set()
+        await asyncio.sleep(0.05)
+        assert 'rooms_list' in [f['type'] for f in watcher.frames]
+        await gs.shutdown()
+    asyncio.run(run())
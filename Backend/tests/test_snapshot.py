@@ -0,0 +1,58 @@
+"""Snapshot lỗi ở một phòng không được làm hỏng cả lần ghi, và shutdown() vẫn phải đóng mọi thứ."""
+import asyncio
+import json
+
+from server import GameServer
+from eventlog import EventLog
+from snapshot import SnapshotStore
+from stats_store import StatsStore
+
+
+async def build(gs: GameServer, connect, tmp_path) -> GameServer:
+    gs.snapshots = SnapshotStore(str(tmp_path / 'rooms.snapshot'))
+    for name in ('good', 'bad'):
+        await gs.handle_message(connect(gs), json.dumps({'type': 'create_room', 'room_name': name}))
+    return gs
+
+
+def events(path) -> list:
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_unencodable_room_is_skipped(tmp_path, make_server, connect):
+    async def run():
+        gs = await build(make_server(log=EventLog(str(tmp_path / 'events.log'))), connect, tmp_path)
+        bad = next(room for room in gs.rooms.values() if room.room_name == 'bad')
+        bad.room_name = 123      # dữ liệu hỏng lọt qua kiểm tra ở handler
+        await gs.save_snapshot(full=True, chunk=1)
+        gs.mark_snapshot(bad.room_id)
+        await gs.save_snapshot()
+        gs.log.close()
+
+        restored = make_server(log=EventLog(str(tmp_path / 'restored.log')))
+        restored.snapshots = SnapshotStore(str(tmp_path / 'rooms.snapshot'))
+        await restored.load_snapshot(5)
+        assert [room.room_name for room in restored.rooms.values()] == ['good']
+        await restored.shutdown()
+        return bad.room_id
+
+    bad_id = asyncio.run(run())
+    failed = [r for r in events(tmp_path / 'events.log') if r['event'] == 'snapshot_room_failed']
+    assert len(failed) == 2 and all(r['room'] == bad_id for r in failed)
+
+
+def test_shutdown_closes_everything_when_snapshot_fails(tmp_path, make_server, connect):
+    async def run():
+        gs = await build(make_server(log=EventLog(str(tmp_path / 'events.log'))), connect, tmp_path)
+        gs.player_stats = StatsStore(str(tmp_path / 'stats.db'), log=gs.log)
+        await gs.player_stats.open()
+
+        def broken(*args):
+            raise ValueError('player_counter ngoài khoảng')
+        gs.snapshots.replace = broken
+        await gs.shutdown()
+        assert gs.player_stats._db is None
+        assert gs.log.thread is None
+
+    asyncio.run(run())
+    assert any(r['event'] == 'snapshot_failed' for r in events(tmp_path / 'events.log'))
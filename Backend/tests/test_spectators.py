@@ -0,0 +1,88 @@
+"""Người xem: không chiếm chỗ, nhận kết quả ván như người chơi nhưng không ready / chọn được."""
+import asyncio
+import json
+
+
+async def drained(room):
+    """Chờ task chia frame cho người xem của phòng chạy xong"""
+    while room.audience_task is not None:
+        await asyncio.sleep(0.01)
+
+
+async def watched_room(gs, connect, **create):
+    a, b, watcher = connect(gs), connect(gs), connect(gs)
+    await gs.handle_message(a, json.dumps({'type': 'create_room', 'room_name': 'x', **create}))
+    room = gs.get_room(gs.get_player_room(a))
+    await gs.handle_message(b, json.dumps({'type': 'join_room', 'room_id': room.room_id, **create}))
+    return a, b, watcher, room
+
+
+def test_spectator_receives_round_results(server, connect, settle):
+    async def run():
+        a, b, watcher, room = await watched_room(server, connect)
+        await server.handle_message(watcher, json.dumps({'type': 'spectate', 'room_id': room.room_id}))
+        assert watcher in room.spectators and watcher not in room.seats
+        assert server.get_player_room(watcher) is None
+        for ws in (a, b):
+            await server.handle_message(ws, json.dumps({'type': 'ready'}))
+        await server.handle_message(a, json.dumps({'type': 'choice', 'choice': 'rock'}))
+        await server.handle_message(b, json.dumps({'type': 'choice', 'choice': 'scissors'}))
+        await drained(room)
+        await settle()
+        assert watcher.of_type('spectating')[0]['room']['room_id'] == room.room_id
+        # Cùng frame kết quả như người chơi (kết quả theo tên người chơi)
+        assert watcher.of_type('game_result') == a.of_type('game_result')
+        assert watcher.of_type('game_result')[0]['results'] == {
+            server.clients[a]['name']: 'win', server.clients[b]['name']: 'lose'}
+
+    asyncio.run(run())
+
+
+def test_spectator_cannot_ready_or_choose(server, connect, settle):
+    async def run():
+        a, b, watcher, room = await watched_room(server, connect)
+        await server.handle_message(watcher, json.dumps({'type': 'spectate', 'room_id': room.room_id}))
+        await server.handle_message(a, json.dumps({'type': 'ready'}))
+        await server.handle_message(watcher, json.dumps({'type': 'ready'}))
+        assert room.game_state == 'waiting'
+        await server.handle_message(b, json.dumps({'type': 'ready'}))
+        assert room.game_state == 'playing'
+        await server.handle_message(watcher, json.dumps({'type': 'choice', 'choice': 'rock'}))
+        await server.handle_message(a, json.dumps({'type': 'choice', 'choice': 'paper'}))
+        assert room.game_state == 'playing' and not room.all_chosen()
+        await server.handle_message(b, json.dumps({'type': 'choice', 'choice': 'rock'}))
+        await drained(room)
+        await settle()
+        (result,) = watcher.of_type('game_result')
+        assert result['choices'] == {server.clients[a]['name']: 'paper', server.clients[b]['name']: 'rock'}
+
+    asyncio.run(run())
+
+
+def test_spectate_needs_the_room_password(server, connect, settle):
+    async def run():
+        a, b, watcher, room = await watched_room(server, connect, password='pw')
+        await server.handle_message(watcher, json.dumps({'type': 'spectate', 'room_id': room.room_id}))
+        await server.handle_message(a, json.dumps({'type': 'spectate', 'room_id': room.room_id, 'password': 'pw'}))
+        await settle()
+        assert not room.spectators
+        assert watcher.of_type('error') and a.of_type('error')
+
+    asyncio.run(run())
+
+
+def test_spectating_leaves_the_match_queue(server, connect, settle):
+    async def run():
+        a, b, watcher, room = await watched_room(server, connect)
+        await server.handle_message(watcher, json.dumps({'type': 'quick_match'}))
+        assert watcher in server.matchmaker
+        await server.handle_message(watcher, json.dumps({'type': 'spectate', 'room_id': room.room_id}))
+        assert watcher not in server.matchmaker and watcher in room.spectators
+        # Người khác vào hàng đợi sau đó không bị ghép với người đang xem
+        other = connect(server)
+        await server.handle_message(other, json.dumps({'type': 'quick_match'}))
+        await settle()
+        assert server.get_player_room(watcher) is None and other in server.matchmaker
+        assert watcher.of_type('match_cancelled')
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+"""Ghi thành tích lỗi: báo qua nhật ký sự kiện của server và giữ phần chưa ghi cho lần sau."""
+import asyncio
+import json
+
+from stats_store import StatsStore
+from eventlog import EventLog
+
+
+def test_write_error_is_logged_and_kept(tmp_path):
+    async def run():
+        log = EventLog(str(tmp_path / 'events.log'))
+        store = StatsStore(str(tmp_path / 'stats.db'), flush_interval=60, log=log)
+        await store.open()
+        store.record_round({'An': 'win', 'Bình': 'lose'})
+        # Bảng biến mất giữa chừng -> lần ghi kế tiếp lỗi sqlite
+        await asyncio.get_running_loop().run_in_executor(
+            store._executor, store._db.execute, 'DROP TABLE player_stats')
+        await store.flush()
+        assert store.stats['errors'] == 1 and store.stats['flushes'] == 0
+        assert store.pending == {'An': [1, 0, 0, 0, 0], 'Bình': [0, 1, 0, 0, 0]}
+        store.pending.clear()
+        await store.close()
+        log.close()
+
+    asyncio.run(run())
+    records = [json.loads(line) for line in (tmp_path / 'events.log').read_text(encoding='utf-8').splitlines()]
+    assert [(r['level'], r['cat'], r['event'], r['players']) for r in records] == \
+        [('error', 'error', 'stats_write_failed', 2)]
+    assert 'no such table' in records[0]['error']
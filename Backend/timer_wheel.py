@@ -0,0 +1,91 @@
+"""Timer wheel phân cấp cho hạn chót của các ván đấu.
+
+Thay vì một asyncio.Task ngủ cho mỗi ván, mọi hạn chót nằm trong một bánh xe
+chung: thêm / hủy là O(1), và mỗi tick trả về cả lô timer đã hết hạn.
+"""
+import math
+
+
+class TimerEntry:
+    __slots__ = ('deadline', 'key', 'bucket')
+
+    def __init__(self, deadline: int, key):
+        self.deadline = deadline   # số thứ tự tick hết hạn
+        self.key = key             # dữ liệu của người gọi (vd: room_id)
+        self.bucket = None         # ô đang chứa entry (None = đã hết hạn / bị hủy)
+
+
+class TimerWheel:
+    """Bánh xe nhiều tầng: tầng 0 mỗi ô = 1 tick, tầng k mỗi ô = slots**k tick.
+    Entry ở tầng cao được hạ dần xuống tầng thấp khi tới khối thời gian của nó."""
+    def __init__(self, tick: float = 0.1, slots: int = 64, levels: int = 4, now: float = 0.0):
+        self.tick = tick
+        self.slots = slots
+        self.levels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.spans = [slots ** level for level in range(levels)]
+        self.current = int(now / tick)  # tick cuối cùng đã xử lý
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def schedule(self, now: float, delay: float, key) -> TimerEntry:
+        """Hẹn giờ `key` sau `delay` giây (tính từ `now`). Không bao giờ hết hạn sớm."""
+        if not self.size:
+            # Bánh xe rỗng: nhảy thẳng tới hiện tại thay vì để advance() đi từng tick qua khoảng trống
+            self.current = max(self.current, int(now / self.tick))
+        deadline = max(self.current + 1, math.ceil((now + delay) / self.tick))
+        entry = TimerEntry(deadline, key)
+        self._place(entry)
+        self.size += 1
+        return entry
+
+    def cancel(self, entry: TimerEntry) -> bool:
+        if entry is None or entry.bucket is None:
+            return False
+        del entry.bucket[entry]
+        entry.bucket = None
+        self.size -= 1
+        return True
+
+    def _place(self, entry: TimerEntry):
+        delta = entry.deadline - self.current
+        level = 0
+        while level < len(self.levels) - 1 and delta >= self.spans[level + 1]:
+            level += 1
+        bucket = self.levels[level][(entry.deadline // self.spans[level]) % self.slots]
+        bucket[entry] = None
+        entry.bucket = bucket
+
+    def advance(self, now: float) -> list:
+        """Chạy tới thời điểm `now`; trả về lô entry đã hết hạn (theo thứ tự hạn chót)."""
+        target = int(now / self.tick)
+        expired = []
+        if not self.size:
+            self.current = max(self.current, target)
+            return expired
+        while self.current < target and self.size:
+            self.current += 1
+            t = self.current
+            # Hạ các entry ở tầng cao khi bắt đầu khối thời gian của chúng
+            for level in range(len(self.levels) - 1, 0, -1):
+                if t % self.spans[level] == 0:
+                    bucket = self.levels[level][(t // self.spans[level]) % self.slots]
+                    if bucket:
+                        entries = list(bucket)
+                        bucket.clear()
+                        for entry in entries:
+                            self._place(entry)
+            bucket = self.levels[0][t % self.slots]
+            if bucket:
+                entries = list(bucket)
+                bucket.clear()
+                for entry in entries:
+                    if entry.deadline <= t:
+                        entry.bucket = None
+                        self.size -= 1
+                        expired.append(entry)
+                    else:
+                        self._place(entry)
+        self.current = max(self.current, target)
+        return expired
@@ -0,0 +1,326 @@
+"""Mã hóa tin nhắn WebSocket: JSON (mặc định) hoặc nhị phân gọn, chọn qua subprotocol.
+
+Client không xin subprotocol (frontend hiện tại) -> frame text JSON như cũ.
+Client xin subprotocol `rps.bin.v1` -> mọi frame (cả hai chiều) là binary:
+
+    byte đầu = mã loại tin nhắn
+    0        -> phần còn lại là JSON UTF-8 (loại chưa có schema, và mọi tin client gửi lên)
+    1, 2, 3  -> schema struct cố định của game_result / room_updated / rooms_list
+
+Schema bỏ hết tên khóa lặp lại. Mọi chuỗi (tên người chơi, room_id, game_state...)
+nằm trong một bảng chuỗi ở đầu frame, mỗi chuỗi chỉ ghi một lần và được tham chiếu
+bằng chỉ số. Message không khớp schema (thiếu / thừa khóa, giá trị ngoài miền) tự rơi
+về mã 0, nên bên giải mã luôn nhận đúng dict như json.loads(json.dumps(message)).
+
+Đo kích thước và CPU của hai codec:  python benchmarks/bench_codec.py
+"""
+import json
+import struct
+
+SUBPROTOCOL = 'rps.bin.v1'
+
+T_JSON = 0
+T_GAME_RESULT = 1
+T_ROOM_UPDATED = 2
+T_ROOMS_LIST = 3
+
+CHOICES = (None, 'rock', 'paper', 'scissors')   # mã 0 = không có
+RESULTS = (None, 'win', 'lose', 'draw')
+CHOICE_CODES = {c: i for i, c in enumerate(CHOICES) if c}
+RESULT_CODES = {r: i for i, r in enumerate(RESULTS) if r}
+NO_ID = 0xFFFFFFFF            # player_id = None / không có filter
+
+_COUNT = struct.Struct('<I')
+# game_result: loại, best_of, cờ (over, có winner), winner_id, số người, số mục series,
+# diff phòng: from_version, version, game_state mới, số cờ ready thay đổi
+_RESULT_HEAD = struct.Struct('<BBBIHHIIHH')
+_RESULT_PLAYER = struct.Struct('<HBBBIII')    # tên, lựa chọn, kết quả, có điểm, thắng, thua, hòa
+_SERIES_ENTRY = struct.Struct('<IH')          # player_id, số ván thắng trong series
+_READY_ENTRY = struct.Struct('<IB')           # player_id, cờ ready
+# room_updated: loại, room_id, room_name, game_state, max, hiện có, có mật khẩu, số người, số mục điểm, version
+_ROOM_HEAD = struct.Struct('<BHHHHHBHHI')
+_ROOM_PLAYER = struct.Struct('<HBI')          # tên, cờ (ready, có player_id), player_id
+_ROOM_SCORE = struct.Struct('<HIII')          # tên, thắng, thua, hòa
+# rooms_list: loại, version, số phòng, chỉ số chuỗi filter (NO_ID = không có)
+_LIST_HEAD = struct.Struct('<BIII')
+_LIST_ROOM = struct.Struct('<IIIHHBH')        # room_id, room_name, game_state, max, hiện có, cờ, số người
+_LIST_PLAYER = struct.Struct('<II')           # tên, player_id (NO_ID = None)
+
+TYPE_PREFIX = b'{"type": "'
+
+
+class FrameError(ValueError):
+    """Frame nhị phân hỏng hoặc không đúng schema"""
+
+
+def _pack_strings(strings: dict) -> bytes:
+    """Bảng chuỗi của một frame. `strings` là {chuỗi: chỉ số}, điền bằng
+    strings.setdefault(s, len(strings)) nên chuỗi trùng nhau chỉ ghi một lần."""
+    blobs = [s.encode('utf-8') for s in strings]
+    return struct.pack(f'<I{len(blobs)}H', len(blobs), *map(len, blobs)) + b''.join(blobs)
+
+
+def _unpack_strings(buf, offset: int):
+    (n,) = _COUNT.unpack_from(buf, offset)
+    offset += 4
+    lengths = struct.unpack_from(f'<{n}H', buf, offset)
+    offset += 2 * n
+    items = []
+    for length in lengths:
+        end = offset + length
+        items.append(str(buf[offset:end], 'utf-8'))
+        offset = end
+    if offset > len(buf):
+        raise FrameError('bảng chuỗi vượt quá frame')
+    return items, offset
+
+
+def _records(buf, offset: int, record: struct.Struct, n: int):
+    """n bản ghi cố định liền nhau bắt đầu từ offset -> (iterator, offset sau bản ghi cuối)"""
+    end = offset + n * record.size
+    if end > len(buf):
+        raise FrameError('frame bị cắt')
+    return record.iter_unpack(buf[offset:end]), end
+
+
+# ---- game_result ----
+def _encode_game_result(m: dict) -> bytes:
+    choices, results, scores, series = m['choices'], m['results'], m['scores'], m['series']
+    changes = m['room_changes']
+    if len(m) != 8 or len(series) != 4 or len(changes) != 2:
+        raise KeyError('khóa lạ')
+    strings = {}
+    ref = strings.setdefault
+    names = dict.fromkeys(choices)
+    names.update(dict.fromkeys(results))
+    names.update(dict.fromkeys(scores))
+    body = bytearray()
+    for name in names:
+        c = choices.get(name)
+        r = results.get(name)
+        s = scores.get(name)
+        if s is None:
+            body += _RESULT_PLAYER.pack(ref(name, len(strings)), CHOICE_CODES[c] if c else 0,
+                                        RESULT_CODES[r] if r else 0, 0, 0, 0, 0)
+        else:
+            if len(s) != 3:
+                raise KeyError('khóa lạ')
+            body += _RESULT_PLAYER.pack(ref(name, len(strings)), CHOICE_CODES[c] if c else 0,
+                                        RESULT_CODES[r] if r else 0, 1, s['wins'], s['losses'], s['draws'])
+    wins = series['wins']
+    for pid, w in wins.items():
+        body += _SERIES_ENTRY.pack(int(pid), w)
+    ready = changes['ready']
+    for pid, flag in ready.items():
+        body += _READY_ENTRY.pack(int(pid), 1 if flag else 0)
+    winner = series['winner_id']
+    flags = (1 if series['over'] else 0) | (2 if winner is not None else 0)
+    head = _RESULT_HEAD.pack(T_GAME_RESULT, series['best_of'], flags, winner or 0, len(names), len(wins),
+                             m['from_version'], m['version'], ref(changes['game_state'], len(strings)), len(ready))
+    return head + _pack_strings(strings) + body
+
+
+def _decode_game_result(buf) -> dict:
+    _, best_of, flags, winner, n, n_series, from_version, version, state, n_ready = \
+        _RESULT_HEAD.unpack_from(buf, 0)
+    strings, offset = _unpack_strings(buf, _RESULT_HEAD.size)
+    choices, results, scores, wins = {}, {}, {}, {}
+    entries, offset = _records(buf, offset, _RESULT_PLAYER, n)
+    for name, c, r, has_score, w, l, d in entries:
+        name = strings[name]
+        if c:
+            choices[name] = CHOICES[c]
+        if r:
+            results[name] = RESULTS[r]
+        if has_score:
+            scores[name] = {'wins': w, 'losses': l, 'draws': d}
+    entries, offset = _records(buf, offset, _SERIES_ENTRY, n_series)
+    for pid, w in entries:
+        wins[str(pid)] = w
+    entries, offset = _records(buf, offset, _READY_ENTRY, n_ready)
+    return {
+        'type': 'game_result',
+        'choices': choices,
+        'results': results,
+        'scores': scores,
+        'series': {'best_of': best_of, 'wins': wins, 'over': bool(flags & 1),
+                   'winner_id': winner if flags & 2 else None},
+        'from_version': from_version,
+        'version': version,
+        'room_changes': {'game_state': strings[state], 'ready': {str(pid): bool(f) for pid, f in entries}}
+    }
+
+
+# ---- room_updated ----
+def _encode_room_updated(m: dict) -> bytes:
+    room = m['room']
+    if len(m) != 2 or len(room) != 9:
+        raise KeyError('khóa lạ')
+    strings = {}
+    ref = strings.setdefault
+    body = bytearray()
+    players, scores = room['players'], room['scores']
+    for p in players:
+        name = p['name']
+        if 'player_id' in p:
+            if len(p) != 4 or p['player_name'] != name:
+                raise KeyError('khóa lạ')
+            body += _ROOM_PLAYER.pack(ref(name, len(strings)), (1 if p['ready'] else 0) | 2, p['player_id'])
+        else:
+            if len(p) != 2:
+                raise KeyError('khóa lạ')
+            body += _ROOM_PLAYER.pack(ref(name, len(strings)), 1 if p['ready'] else 0, 0)
+    for name, s in scores.items():
+        if len(s) != 3:
+            raise KeyError('khóa lạ')
+        body += _ROOM_SCORE.pack(ref(name, len(strings)), s['wins'], s['losses'], s['draws'])
+    room_id = ref(room['room_id'], len(strings))
+    room_name = ref(room['room_name'], len(strings))
+    state = ref(room['game_state'], len(strings))
+    head = _ROOM_HEAD.pack(T_ROOM_UPDATED, room_id, room_name, state, room['max_players'], room['current_players'],
+                           1 if room['has_password'] else 0, len(players), len(scores), room['version'])
+    return head + _pack_strings(strings) + body
+
+
+def _decode_room_updated(buf) -> dict:
+    _, room_id, room_name, state, max_players, current, has_password, n, n_scores, version = \
+        _ROOM_HEAD.unpack_from(buf, 0)
+    strings, offset = _unpack_strings(buf, _ROOM_HEAD.size)
+    players = []
+    entries, offset = _records(buf, offset, _ROOM_PLAYER, n)
+    for name, flags, pid in entries:
+        name = strings[name]
+        player = {'name': name, 'ready': bool(flags & 1)}
+        if flags & 2:
+            player['player_id'] = pid
+            player['player_name'] = name
+        players.append(player)
+    entries, offset = _records(buf, offset, _ROOM_SCORE, n_scores)
+    scores = {strings[name]: {'wins': w, 'losses': l, 'draws': d} for name, w, l, d in entries}
+    return {
+        'type': 'room_updated',
+        'room': {
+            'room_id': strings[room_id],
+            'room_name': strings[room_name],
+            'max_players': max_players,
+            'current_players': current,
+            'game_state': strings[state],
+            'players': players,
+            'scores': scores,
+            'has_password': bool(has_password),
+            'version': version
+        }
+    }
+
+
+# ---- rooms_list ----
+def _encode_rooms_list(m: dict) -> bytes:
+    flt = m.get('filter')
+    rooms = m['rooms']
+    if len(m) != (4 if 'filter' in m else 3):
+        raise KeyError('khóa lạ')
+    strings = {}
+    ref = strings.setdefault
+    room_pack, player_pack = _LIST_ROOM.pack, _LIST_PLAYER.pack
+    body = bytearray()
+    for room in rooms:
+        if len(room) != 8:
+            raise KeyError('khóa lạ')
+        players = room['players']
+        room_id = ref(room['room_id'], len(strings))
+        room_name = ref(room['room_name'], len(strings))
+        body += room_pack(room_id, room_name, ref(room['game_state'], len(strings)),
+                          room['max_players'], room['current_players'],
+                          (1 if room['has_password'] else 0) | (2 if room['is_full'] else 0), len(players))
+        for p in players:
+            pid = p['player_id']
+            if len(p) != 2:
+                raise KeyError('khóa lạ')
+            body += player_pack(ref(p['name'], len(strings)), NO_ID if pid is None else pid)
+    flt_ref = NO_ID if 'filter' not in m else ref(json.dumps(flt), len(strings))
+    return _LIST_HEAD.pack(T_ROOMS_LIST, m['version'], len(rooms), flt_ref) + _pack_strings(strings) + body
+
+
+def _decode_rooms_list(buf) -> dict:
+    _, version, n, flt_ref = _LIST_HEAD.unpack_from(buf, 0)
+    strings, offset = _unpack_strings(buf, _LIST_HEAD.size)
+    room_unpack, player_unpack = _LIST_ROOM.unpack_from, _LIST_PLAYER.unpack_from
+    room_size, player_size = _LIST_ROOM.size, _LIST_PLAYER.size
+    rooms = []
+    for _ in range(n):
+        room_id, room_name, state, max_players, current, flags, n_players = room_unpack(buf, offset)
+        offset += room_size
+        players = []
+        for _ in range(n_players):
+            name, pid = player_unpack(buf, offset)
+            offset += player_size
+            players.append({'name': strings[name], 'player_id': None if pid == NO_ID else pid})
+        rooms.append({
+            'room_id': strings[room_id],
+            'room_name': strings[room_name],
+            'max_players': max_players,
+            'current_players': current,
+            'game_state': strings[state],
+            'players': players,
+            'has_password': bool(flags & 1),
+            'is_full': bool(flags & 2)
+        })
+    message = {'type': 'rooms_list', 'version': version, 'rooms': rooms}
+    if flt_ref != NO_ID:
+        message['filter'] = json.loads(strings[flt_ref])
+    return message
+
+
+ENCODERS = {
+    'game_result': _encode_game_result,
+    'room_updated': _encode_room_updated,
+    'rooms_list': _encode_rooms_list,
+}
+DECODERS = {
+    T_GAME_RESULT: _decode_game_result,
+    T_ROOM_UPDATED: _decode_room_updated,
+    T_ROOMS_LIST: _decode_rooms_list,
+}
+TYPE_NAMES = {T_GAME_RESULT: 'game_result', T_ROOM_UPDATED: 'room_updated', T_ROOMS_LIST: 'rooms_list'}
+
+
+def encode(message: dict) -> bytes:
+    """Mã hóa nhị phân; loại không có schema (hoặc không khớp schema) -> JSON sau byte 0"""
+    encoder = ENCODERS.get(message.get('type'))
+    if encoder is not None:
+        try:
+            return encoder(message)
+        except (KeyError, TypeError, AttributeError, ValueError, struct.error):
+            pass
+    return b'\x00' + json.dumps(message).encode('utf-8')
+
+
+def decode(frame) -> dict:
+    """Giải mã một frame: text = JSON như cũ, binary = theo byte loại đầu frame"""
+    if isinstance(frame, str):
+        return json.loads(frame)
+    if not frame:
+        raise FrameError('frame rỗng')
+    code = frame[0]
+    if code == T_JSON:
+        return json.loads(frame[1:])
+    decoder = DECODERS.get(code)
+    if decoder is None:
+        raise FrameError(f'loại frame lạ: {code}')
+    try:
+        return decoder(frame)
+    except (struct.error, UnicodeDecodeError, IndexError) as e:
+        raise FrameError(f'frame hỏng: {e}') from None
+
+
+def frame_type(frame: bytes) -> str | None:
+    """Lấy 'type' của frame nhị phân mà không giải mã cả frame"""
+    if not frame:
+        return None
+    if frame[0] != T_JSON:
+        return TYPE_NAMES.get(frame[0])
+    if frame.startswith(TYPE_PREFIX, 1):
+        end = frame.find(b'"', 1 + len(TYPE_PREFIX))
+        if end > 0:
+            return frame[1 + len(TYPE_PREFIX):end].decode('utf-8', 'replace')
+    return None
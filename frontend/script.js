@@ -14,15 +14,22 @@ let countdownInterval = null;
 let timeLeft = 10;
 let hasChosenThisRound = false;
 let latestRooms = [];
+let roomsVersion = null; // version của danh sách phòng (lobby feed) client đang có
 let pingTimer = null;
 let lastPingTs = 0;
 let bgmEnabled = false;
 let sfxEnabled = true;
 let lastPvpSeries = null;
+let isInMatchQueue = false; // đang chờ server ghép trận (quick_match)
+let isSpectating = false; // đang xem phòng (không chiếm chỗ, không chơi)
+let resumeToken = null; // server giữ chỗ một lúc sau khi mất kết nối; dùng token để quay lại phiên cũ
 
 // Khởi tạo kết nối WebSocket
 function initWebSocket() {
-  ws = new WebSocket("ws://localhost:8082");
+  ws = new WebSocket(
+    "ws://localhost:8082" +
+      (resumeToken ? "/?resume=" + encodeURIComponent(resumeToken) : "")
+  );
 
   ws.onopen = () => {
     console.log("Đã kết nối với server");
@@ -36,13 +43,19 @@ function initWebSocket() {
     handleServerMessage(data);
   };
 
-  ws.onclose = () => {
+  ws.onclose = (event) => {
     console.log("Mất kết nối với server");
+    stopPing();
+    if (event.code === 4000) {
+      // Server đóng vì không hoạt động: chỉ kết nối lại khi người dùng quay lại
+      showNotification("Đã ngắt kết nối vì không hoạt động. Bấm vào trang để kết nối lại", "info");
+      document.addEventListener("click", initWebSocket, { once: true });
+      return;
+    }
     showNotification(
       "Mất kết nối với server. Đang thử kết nối lại...",
       "error"
     );
-    stopPing();
     setTimeout(initWebSocket, 3000);
   };
 
@@ -57,16 +70,48 @@ function handleServerMessage(data) {
   switch (data.type) {
     case "player_id":
       playerId = data.player_id;
+      resumeToken = data.resume_token || null;
       document.getElementById(
         "player-id"
       ).textContent = `Người chơi ${playerId}`;
+      // Server đã hủy hàng đợi ghép trận khi mất kết nối
+      if (isInMatchQueue) setMatchQueued(false);
+      if (data.resumed) {
+        // Vẫn giữ chỗ trong phòng: server gửi lại toàn bộ phòng ngay sau đây
+        showNotification("Đã kết nối lại, tiếp tục phiên trước", "success");
+      } else if (currentRoom || isSpectating) {
+        // Phiên cũ đã hết hạn: phòng / trận đang xem không còn là của mình
+        currentRoom = null;
+        isSpectating = false;
+        showMainScreen();
+        showNotification("Phiên trước đã hết hạn, bạn đã rời phòng", "info");
+      }
       break;
 
     case "rooms_list":
+      // Snapshot đầy đủ
       latestRooms = Array.isArray(data.rooms) ? data.rooms : [];
+      roomsVersion = typeof data.version === "number" ? data.version : null;
       updateRoomsList(latestRooms);
       break;
 
+    case "room_added":
+    case "room_changed":
+    case "room_removed":
+      if (applyRoomsDelta([data])) updateRoomsList(latestRooms);
+      break;
+
+    case "rooms_delta":
+      if (roomsVersion !== null && data.from_version <= roomsVersion) {
+        if (applyRoomsDelta(data.changes || [])) {
+          roomsVersion = Math.max(roomsVersion, data.version);
+          updateRoomsList(latestRooms);
+        }
+      } else if (roomsVersion === null || data.version > roomsVersion) {
+        refreshRooms();
+      }
+      break;
+
     case "room_created":
       currentRoom = data.room;
       lastPvpSeries = null; // Reset series khi tạo phòng mới
@@ -78,15 +123,75 @@ function handleServerMessage(data) {
       showNotification("Đã tạo phòng thành công!", "success");
       break;
 
+    case "spectating":
+      // Vào xem phòng: nhận toàn bộ phòng, sau đó là các diff như người chơi
+      isSpectating = true;
+      currentRoom = data.room;
+      lastPvpSeries = null;
+      showGameRoom();
+      hideReadyButton();
+      hideNewGameButton();
+      disableChoices();
+      updateGameStatus("👁 Bạn đang xem phòng này");
+      break;
+
+    case "spectate_ended":
+      // Phòng đã đóng (hết người chơi)
+      if (isSpectating) {
+        isSpectating = false;
+        currentRoom = null;
+        showMainScreen();
+        showNotification("Phòng bạn đang xem đã đóng", "info");
+        refreshRooms();
+      }
+      break;
+
+    case "leaderboard":
+      renderLeaderboard(data);
+      break;
+
+    case "match_queued":
+      setMatchQueued(true);
+      showNotification("Đang tìm đối thủ...", "info");
+      break;
+
+    case "match_cancelled":
+      setMatchQueued(false);
+      showNotification("Đã hủy tìm trận", "info");
+      break;
+
+    case "match_found":
+      // Server đã tạo phòng và sắp gửi game_start cho ván đầu
+      setMatchQueued(false);
+      currentRoom = data.room;
+      lastPvpSeries = null;
+      updateRoomInfo(data.room);
+      showGameRoom();
+      hideReadyButton();
+      showNotification("Đã tìm thấy đối thủ!", "success");
+      break;
+
     case "player_joined":
       console.log("Nhận thông báo player_joined:", data);
       currentRoom = data.room;
       updateRoomInfo(data.room);
       showGameRoom();
-      showReadyButton();
+      if (!isSpectating) showReadyButton();
       showNotification(`${data.player_name} đã tham gia phòng`, "info");
       break;
 
+    case "room_closed": {
+      // Server giải tán phòng bỏ không
+      const box = document.getElementById("series-status");
+      if (box) box.style.display = "none";
+      currentRoom = null;
+      isBotMode = false;
+      showMainScreen();
+      showNotification(data.message, "info");
+      refreshRooms();
+      break;
+    }
+
     case "player_left":
       currentRoom = data.room;
       updateRoomInfo(data.room);
@@ -94,15 +199,25 @@ function handleServerMessage(data) {
       break;
 
     case "player_ready":
-      currentRoom = data.room;
-      updateRoomInfo(data.room);
+      syncRoom(data);
+      updateRoomInfo(currentRoom);
       showNotification(`${data.player_name} đã sẵn sàng`, "info");
       break;
 
+    case "player_renamed":
+      syncRoom(data);
+      updateRoomInfo(currentRoom);
+      break;
+
     case "game_start": {
-      const { room, series } = data;
-      currentRoom = room;
-      updateRoomInfo(room);
+      // Ghép trận nhanh: phòng đầy đủ đã có trong match_found, game_start không kèm diff
+      const { series } = data;
+      syncRoom(data);
+      updateRoomInfo(currentRoom);
+      if (isSpectating) {
+        updateGameStatus("👁 Ván mới bắt đầu");
+        break;
+      }
       clearChoiceSelection();
       hideNewGameButton();
       hideReadyButton();
@@ -114,8 +229,8 @@ function handleServerMessage(data) {
         stopBGM && stopBGM();
       } catch {}
 
-      // Đếm ngược 10s
-      startCountdownTimer(10);
+      // Đếm ngược theo thời gian mỗi ván của phòng (mặc định 10s)
+      startCountdownTimer(data.round_seconds || 10);
 
       // Bo3 PvP: nếu server gửi series thì lưu + hiển thị
       if (!isBotMode && series) {
@@ -135,6 +250,8 @@ function handleServerMessage(data) {
       break;
 
     case "game_result": {
+      // Diff kèm theo: phòng về "waiting", bỏ cờ ready (điểm mới nằm trong data.scores)
+      syncRoom(data);
       // Dừng đồng hồ + hiển thị kết quả, điểm
       handleGameResult(data);
 
@@ -149,16 +266,32 @@ function handleServerMessage(data) {
             : "🔄 Chơi lại (vòng kế)";
         }
       }
+      updateRoomInfo(currentRoom);
+      break;
+    }
+
+    case "round_result": {
+      // Phòng nhiều người: một frame gọn như nhau cho mọi người, điểm tự cộng theo diff
+      const synced = syncRoom(data);
+      handleGameResult(expandRoundResult(data, synced));
+      const btn = document.getElementById("new-game-btn");
+      if (btn) {
+        btn.textContent = data.series.over
+          ? "🔄 Bắt đầu series mới"
+          : "🔄 Chơi lại (vòng kế)";
+      }
+      updateRoomInfo(currentRoom);
       break;
     }
 
     case "player_ready_for_new_game":
-      currentRoom = data.room;
-      updateRoomInfo(data.room);
+      syncRoom(data);
+      updateRoomInfo(currentRoom);
       showNotification(`${data.player_name} đã sẵn sàng chơi lại`, "info");
       break;
 
     case "room_updated":
+      // Toàn bộ phòng (trả lời get_room khi lỡ diff)
       currentRoom = data.room;
       updateRoomInfo(data.room);
       break;
@@ -184,6 +317,82 @@ function handleServerMessage(data) {
   }
 }
 
+// Áp dụng diff trạng thái phòng (room_changes) vào currentRoom theo version.
+// Lỡ version thì xin server gửi lại cả phòng (get_room -> room_updated).
+function syncRoom(data) {
+  if (!currentRoom || !data.room_changes) return false;
+  if (data.version <= currentRoom.version) return false; // diff cũ, đã có
+  if (data.from_version !== currentRoom.version) {
+    ws.send(JSON.stringify({ type: "get_room" }));
+    return false;
+  }
+  const changes = data.room_changes;
+  if (changes.game_state) currentRoom.game_state = changes.game_state;
+  for (const p of currentRoom.players) {
+    const id = String(p.player_id);
+    if ("ready_all" in changes) p.ready = changes.ready_all;
+    if (changes.ready && id in changes.ready) p.ready = changes.ready[id];
+    if (changes.renamed && id in changes.renamed) {
+      const name = changes.renamed[id];
+      if (currentRoom.scores[p.name]) {
+        currentRoom.scores[name] = currentRoom.scores[p.name];
+        delete currentRoom.scores[p.name];
+      }
+      p.name = p.player_name = name;
+    }
+  }
+  currentRoom.version = data.version;
+  return true;
+}
+
+// round_result (phòng nhiều người): lựa chọn / kết quả là 1 ký tự mỗi người theo thứ tự
+// currentRoom.players. Trả về dạng {choices, results, scores} như game_result;
+// điểm chỉ được cộng khi diff vừa áp dụng đúng version (nếu không đã xin get_room).
+function expandRoundResult(data, synced) {
+  const CHOICE = { r: "rock", p: "paper", s: "scissors" };
+  const RESULT = { w: "win", l: "lose", d: "draw" };
+  const SCORE_KEY = { w: "wins", l: "losses", d: "draws" };
+  const choices = {};
+  const results = {};
+  currentRoom.players.forEach((p, i) => {
+    const r = data.results[i];
+    if (!RESULT[r]) return;
+    choices[p.name] = CHOICE[data.choices[i]];
+    results[p.name] = RESULT[r];
+    if (synced && currentRoom.scores[p.name]) currentRoom.scores[p.name][SCORE_KEY[r]] += 1;
+  });
+  return { choices, results, scores: currentRoom.scores };
+}
+
+// Áp dụng các delta của lobby feed vào latestRooms.
+// Trả về false nếu bị lỡ version (khi đó đã xin resync từ server).
+function applyRoomsDelta(changes) {
+  for (const change of changes) {
+    // Delta của view có lọc không mang version riêng: frame đã được kiểm tra
+    const versioned = typeof change.version === "number";
+    if (versioned && roomsVersion !== null && change.version <= roomsVersion)
+      continue; // đã có
+    if (
+      roomsVersion === null ||
+      (versioned && change.version !== roomsVersion + 1)
+    ) {
+      refreshRooms();
+      return false;
+    }
+    if (change.type === "room_removed") {
+      latestRooms = latestRooms.filter((r) => r.room_id !== change.room_id);
+    } else {
+      const idx = latestRooms.findIndex(
+        (r) => r.room_id === change.room.room_id
+      );
+      if (idx >= 0) latestRooms[idx] = change.room;
+      else latestRooms.push(change.room);
+    }
+    if (versioned) roomsVersion = change.version;
+  }
+  return true;
+}
+
 // Cập nhật danh sách phòng
 function updateRoomsList(rooms) {
   const roomsList = document.getElementById("rooms-list");
@@ -196,8 +405,9 @@ function updateRoomsList(rooms) {
 
   roomsList.innerHTML = rooms
     .map((room) => {
-      const isFull = room.current_players >= 2;
-      const canJoin = !isFull && room.current_players < 2;
+      const capacity = room.max_players || 2;
+      const isFull = room.current_players >= capacity;
+      const canJoin = !isFull;
       const lockIcon = room.has_password ? "🔒" : "🔓";
 
       return `
@@ -212,7 +422,7 @@ function updateRoomsList(rooms) {
         <div class="room-status">${getGameStateText(room.game_state)}</div>
       </div>
       <div class="room-players">
-        <span>👥 ${room.current_players}/2 người chơi</span>
+        <span>👥 ${room.current_players}/${capacity} người chơi</span>
         ${
           canJoin
             ? `<button class="join-btn"
@@ -223,6 +433,10 @@ function updateRoomsList(rooms) {
                </button>`
             : '<span style="color:#dc3545;">Đã đầy</span>'
         }
+        <button class="join-btn spectate-btn"
+          onclick="event.stopPropagation(); spectateRoom('${room.room_id}', ${
+            room.has_password
+          })">👁 Xem</button>
       </div>
       <div class="room-players">
         <span>Người chơi: ${room.players.map((p) => p.name).join(", ")}</span>
@@ -260,7 +474,8 @@ function createRoom() {
     JSON.stringify({
       type: "create_room",
       room_name: roomName,
-      max_players: 2,
+      max_players:
+        parseInt(document.getElementById("max-players")?.value, 10) || 2,
       password: password || undefined,
     })
   );
@@ -278,6 +493,16 @@ function joinRoomWithPassword(roomId, hasPassword) {
   );
 }
 
+// Xem phòng (không chiếm chỗ)
+function spectateRoom(roomId, hasPassword) {
+  let pwd;
+  if (hasPassword) {
+    pwd = prompt("Phòng này có mật khẩu. Nhập mật khẩu để xem:");
+    if (pwd === null) return;
+  }
+  ws.send(JSON.stringify({ type: "spectate", room_id: roomId, password: pwd }));
+}
+
 // Tham gia phòng
 function joinRoom(roomId) {
   console.log("Đang tham gia phòng:", roomId);
@@ -295,11 +520,12 @@ function leaveRoom() {
   if (box) box.style.display = "none";
   ws.send(
     JSON.stringify({
-      type: "leave_room",
+      type: isSpectating ? "stop_spectating" : "leave_room",
     })
   );
 
   currentRoom = null;
+  isSpectating = false;
   isBotMode = false;
   showMainScreen();
   startBGMIfNeeded();
@@ -358,7 +584,10 @@ function toggleReady() {
 
 // Làm mới danh sách phòng
 function refreshRooms() {
-  ws.send(JSON.stringify({ type: "get_rooms" }));
+  // Có version rồi thì chỉ xin các delta bị lỡ; server tự gửi snapshot nếu cần
+  const msg = { type: "get_rooms" };
+  if (roomsVersion !== null) msg.since = roomsVersion;
+  ws.send(JSON.stringify(msg));
 }
 
 // Hiển thị màn hình chính
@@ -541,6 +770,10 @@ function handleGameResult(data) {
   }
 
   // UI sau khi kết thúc ván
+  if (isSpectating) {
+    updateGameStatus("👁 Đang xem: chờ ván tiếp theo");
+    return;
+  }
   showNewGameButton();
   hideReadyButton();
 
@@ -1087,6 +1320,13 @@ document.addEventListener("DOMContentLoaded", () => {
 
 // Bắt đầu chơi với máy (bot)
 function startVsBot() {
+  // Có kết nối: đấu với bot của server (học thói quen ra đòn), phòng chạy như PvP
+  if (ws && ws.readyState === WebSocket.OPEN) {
+    isBotMode = false;
+    ws.send(JSON.stringify({ type: "play_bot" }));
+    return;
+  }
+  // Mất kết nối: bot cục bộ chọn ngẫu nhiên như trước
   const me = effectivePlayerName();
   isBotMode = true;
 
@@ -1202,31 +1442,44 @@ function effectivePlayerName() {
   return (playerName && playerName.trim()) || `Người chơi ${playerId}`;
 }
 
-//Thêm hàm quickPlay
+//Thêm hàm quickPlay: server ghép trận (không cần dò danh sách phòng)
 function quickPlay() {
-  const rooms = Array.isArray(latestRooms) ? latestRooms : [];
-  const candidates = rooms
-    .filter((r) => !r.has_password) // bỏ qua phòng có mật khẩu
-    .filter((r) => Number(r.current_players) < 2)
-    .sort((a, b) => {
-      const rank = (s) => (s === "waiting" ? 0 : s === "playing" ? 1 : 2);
-      return rank(a.game_state) - rank(b.game_state);
-    });
+  ws.send(
+    JSON.stringify({ type: isInMatchQueue ? "cancel_quick_match" : "quick_match" })
+  );
+}
 
-  if (candidates.length > 0) {
-    joinRoom(candidates[0].room_id);
+// Bảng xếp hạng (server đọc từ cache, gọi lại mỗi lần mở)
+function toggleLeaderboard() {
+  const section = document.getElementById("leaderboard-section");
+  const show = section.style.display === "none";
+  section.style.display = show ? "block" : "none";
+  if (show) ws.send(JSON.stringify({ type: "get_leaderboard", limit: 10 }));
+}
+
+function renderLeaderboard(data) {
+  const list = document.getElementById("leaderboard-list");
+  list.innerHTML = "";
+  const players = data.players || [];
+  if (players.length === 0) {
+    list.innerHTML = '<li class="loading">Chưa có ai trên bảng xếp hạng.</li>';
     return;
   }
+  players.forEach((p) => {
+    const li = document.createElement("li");
+    if (p.name === playerName) li.classList.add("me");
+    li.textContent = `#${p.rank} ${p.name}`;
+    const stats = document.createElement("span");
+    stats.textContent = `${p.wins} thắng · ${p.losses} thua · ${p.draws} hòa · ${p.series_won} series`;
+    li.appendChild(stats);
+    list.appendChild(li);
+  });
+}
 
-  // Không có phòng public phù hợp -> tạo nhanh (không mật khẩu)
-  document.getElementById("room-name").value = `Phòng ${Date.now()}`;
-  // đảm bảo không gửi password
-  if (document.getElementById("use-password")) {
-    document.getElementById("use-password").checked = false;
-    const pwWrap = document.getElementById("password-wrap");
-    if (pwWrap) pwWrap.style.display = "none";
-  }
-  createRoom();
+function setMatchQueued(queued) {
+  isInMatchQueue = queued;
+  const btn = document.getElementById("quick-play-btn");
+  if (btn) btn.textContent = queued ? "⏳ Đang tìm trận... (Hủy)" : "⚡ Chơi ngay";
 }
 
 //Hàm ping
@@ -1276,11 +1529,12 @@ function updateSeriesUIPvp(series) {
   const box = document.getElementById("series-status");
   if (!box) return;
 
-  // Phòng hờ: chưa có room/players -> ẩn
+  // Phòng hờ: chưa có room/players -> ẩn; phòng nhiều người không hiện tỉ số series
   if (
     !currentRoom ||
     !Array.isArray(currentRoom.players) ||
-    currentRoom.players.length < 1
+    currentRoom.players.length < 1 ||
+    currentRoom.max_players > 2
   ) {
     box.style.display = "none";
     return;